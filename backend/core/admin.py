@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db.models import Q
+from . import search
 from .models import Category, Task, Tag, TimeEntry
 
 @admin.register(Category)
@@ -26,4 +28,11 @@ class TimeEntryAdmin(admin.ModelAdmin):
     list_filter = ['category', 'start_at', 'end_at']
     search_fields = ['category__name', 'task__name', 'note']
     readonly_fields = ['duration_seconds', 'is_running']
-    filter_horizontal = ['tags']
\ No newline at end of file
+    filter_horizontal = ['tags']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Índice de busca (nota, task) em vez de icontains em toda a tabela; a categoria segue por nome
+        if not search_term:
+            return queryset, False
+        matches = search.match_q(search_term) | Q(category__name__icontains=search_term)
+        return queryset.filter(matches), False
\ No newline at end of file
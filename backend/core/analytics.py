@@ -0,0 +1,284 @@
+"""Relatórios vetorizados sobre as entradas finalizadas.
+
+`load_window()` lê o histórico uma vez para arrays NumPy (duração, início em
+segundos locais, categoria e um bitmap de tags por entrada) e guarda o
+resultado no processo. Quando a versão `entries` muda, só as entradas que
+aparecem no log de mudanças (`core_changelog`, ver core.sync) depois do
+cursor da janela são relidas e trocadas nos arrays; a leitura completa fica
+para a primeira carga, para lotes com mais de `MAX_CHANGES` entradas e para
+tags que a janela ainda não conhece. Cada relatório filtra esses arrays com
+máscaras e agrega com `bincount`/`percentile`/somas acumuladas, sem voltar
+ao banco nem iterar linha a linha em Python.
+"""
+import threading
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from django.conf import settings
+from django.db import connection
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from . import hierarchy, sync, versioning
+
+SECONDS_PER_DAY = 86400
+PERCENTILES = (50, 75, 90, 95, 99)
+# 1970-01-01 foi quinta-feira; com segunda = 0, o dia 0 tem weekday 3
+EPOCH_WEEKDAY = 3
+WEEKDAYS = ['seg', 'ter', 'qua', 'qui', 'sex', 'sáb', 'dom']
+# Acima disso (e do limite de parâmetros do IN) é mais barato reler a janela inteira
+MAX_CHANGES = 2000
+
+_cache = {}
+_lock = threading.Lock()
+
+
+class EntryWindow:
+    """Entradas finalizadas em arrays paralelos, ordenadas por id"""
+
+    def __init__(self, ids, durations, local_seconds, category_ids, tag_ids, tag_bitmap, cursor=0):
+        self.ids = ids
+        self.durations = durations
+        self.local_seconds = local_seconds
+        self.local_days = local_seconds // SECONDS_PER_DAY
+        self.category_ids = category_ids
+        # tag_ids[i] ocupa o bit i % 64 da palavra i // 64 do bitmap
+        self.tag_ids = tag_ids
+        self.tag_bitmap = tag_bitmap
+        # Id do log de mudanças lido antes das linhas: o que vier depois ainda não está aqui
+        self.cursor = cursor
+
+    def __len__(self):
+        return len(self.ids)
+
+    def mask(self, from_day=None, to_day=None, category_ids=None, tag_id=None):
+        """Máscara booleana das entradas no período, nas categorias e com a tag"""
+        mask = np.ones(len(self), dtype=bool)
+        if from_day is not None:
+            mask &= self.local_days >= _epoch_day(from_day)
+        if to_day is not None:
+            mask &= self.local_days <= _epoch_day(to_day)
+        if category_ids is not None:
+            mask &= np.isin(self.category_ids, np.fromiter(category_ids, dtype=np.int64))
+        if tag_id is not None:
+            position = np.searchsorted(self.tag_ids, tag_id)
+            if position >= len(self.tag_ids) or self.tag_ids[position] != tag_id:
+                return np.zeros(len(self), dtype=bool)
+            word, bit = divmod(int(position), 64)
+            mask &= ((self.tag_bitmap[:, word] >> np.uint64(bit)) & np.uint64(1)) == 1
+        return mask
+
+
+def _epoch_day(day):
+    return (np.datetime64(day, 'D') - np.datetime64('1970-01-01', 'D')).astype(np.int64)
+
+
+def _local_seconds(start_at_text):
+    """Segundos desde a época no horário local (`TIME_ZONE`, com horário de verão).
+
+    Recebe `start_at` como texto em UTC (como o banco grava com USE_TZ): o
+    parse vetorizado do Arrow é muito mais rápido que criar um datetime por linha.
+    """
+    text = pc.replace_substring_regex(pa.array(start_at_text, type=pa.string()), r'[+-]\d\d(:?\d\d)?$', '')
+    utc = text.cast(pa.timestamp('us')).cast(pa.timestamp('us', tz='UTC'))
+    local = pc.local_timestamp(utc.cast(pa.timestamp('us', tz=settings.TIME_ZONE)))
+    return local.cast(pa.int64()).to_numpy(zero_copy_only=False) // 1_000_000
+
+
+def _read_rows(entry_ids=None):
+    """Colunas das entradas finalizadas (todas, ou só `entry_ids`), em ordem de id, e as ligações com tags"""
+    from .models import TimeEntry
+
+    rows = TimeEntry.objects.filter(end_at__isnull=False)
+    if entry_ids is not None:
+        rows = rows.filter(id__in=entry_ids)
+    rows = rows.order_by('id').annotate(
+        start_at_text=Cast('start_at', output_field=CharField())
+    ).values_list('id', 'duration_seconds', 'start_at_text', 'category_id')
+    columns = list(zip(*rows.iterator(chunk_size=10000))) or [(), (), (), ()]
+    ids = np.array(columns[0], dtype=np.int64)
+    durations = np.array(columns[1], dtype=np.int64)
+    local_seconds = _local_seconds(list(columns[2]))
+    category_ids = np.array(columns[3], dtype=np.int64)
+
+    if entry_ids is None:
+        through = TimeEntry.tags.through._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT timeentry_id, tag_id FROM {connection.ops.quote_name(through)}')
+            links = cursor.fetchall()
+    else:
+        links = list(TimeEntry.tags.through.objects.filter(timeentry_id__in=entry_ids).values_list('timeentry_id', 'tag_id'))
+    links = np.array(links, dtype=np.int64).reshape(-1, 2)
+    return ids, durations, local_seconds, category_ids, links
+
+
+def _tag_bitmap(ids, links, tag_ids):
+    tag_bitmap = np.zeros((len(ids), max(1, -(-len(tag_ids) // 64))), dtype=np.uint64)
+    if len(links) and len(ids):
+        rows_index = np.searchsorted(ids, links[:, 0])
+        # Ligações de entradas em execução não estão na janela
+        found = (rows_index < len(ids)) & (ids[np.minimum(rows_index, len(ids) - 1)] == links[:, 0])
+        positions = np.searchsorted(tag_ids, links[found, 1])
+        words, bits = np.divmod(positions, 64)
+        np.bitwise_or.at(tag_bitmap, (rows_index[found], words), np.left_shift(np.uint64(1), bits.astype(np.uint64)))
+    return tag_bitmap
+
+
+def _read_window():
+    cursor = sync.latest_cursor()
+    ids, durations, local_seconds, category_ids, links = _read_rows()
+    tag_ids = np.unique(links[:, 1])
+    return EntryWindow(
+        ids, durations, local_seconds, category_ids, tag_ids, _tag_bitmap(ids, links, tag_ids), cursor=cursor,
+    )
+
+
+def _refresh_window(window):
+    """Janela com as entradas alteradas desde `window.cursor` relidas, ou None se for melhor reler tudo"""
+    from .models import ChangeLog
+
+    cursor = sync.latest_cursor()
+    changed = list(
+        ChangeLog.objects.filter(id__gt=window.cursor, model='entry').values_list('object_id', flat=True)[:MAX_CHANGES + 1]
+    )
+    if len(changed) > MAX_CHANGES:
+        return None
+    if not changed:
+        window.cursor = cursor
+        return window
+    ids, durations, local_seconds, category_ids, links = _read_rows(changed)
+    if not np.isin(links[:, 1], window.tag_ids).all():
+        return None
+
+    # Apagadas, alteradas e as que deixaram de estar finalizadas saem; as relidas entram na ordem de id
+    keep = ~np.isin(window.ids, np.array(changed, dtype=np.int64))
+    merged_ids = np.concatenate((window.ids[keep], ids))
+    order = np.argsort(merged_ids, kind='stable')
+    return EntryWindow(
+        merged_ids[order],
+        np.concatenate((window.durations[keep], durations))[order],
+        np.concatenate((window.local_seconds[keep], local_seconds))[order],
+        np.concatenate((window.category_ids[keep], category_ids))[order],
+        window.tag_ids,
+        np.concatenate((window.tag_bitmap[keep], _tag_bitmap(ids, links, window.tag_ids)))[order],
+        cursor=cursor,
+    )
+
+
+def load_window():
+    """Janela de todas as entradas finalizadas, atualizada quando a versão `entries` muda"""
+    version = versioning.get_version('entries')
+    with _lock:
+        cached = _cache.get('window')
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        window = _refresh_window(cached[1]) if cached is not None else None
+        if window is None:
+            window = _read_window()
+        _cache['window'] = (version, window)
+        return window
+
+
+def select(from_day=None, to_day=None, category_id=None, include_descendants=True, tag_name=None):
+    """(janela, máscara) com os filtros das views"""
+    from .models import Tag
+
+    window = load_window()
+    category_ids = None
+    if category_id is not None:
+        category_ids = hierarchy.descendant_ids(category_id) if include_descendants else [int(category_id)]
+    tag_id = None
+    if tag_name:
+        tag_id = Tag.objects.filter(name=tag_name).values_list('id', flat=True).first()
+        if tag_id is None:
+            return window, np.zeros(len(window), dtype=bool)
+    return window, window.mask(from_day, to_day, category_ids, tag_id)
+
+
+def percentiles(window, mask):
+    durations = window.durations[mask]
+    if not len(durations):
+        return {'total_entries': 0, 'mean': 0, 'min': 0, 'max': 0, 'percentiles': {str(p): 0 for p in PERCENTILES}}
+    values = np.percentile(durations, PERCENTILES)
+    return {
+        'total_entries': int(len(durations)),
+        'mean': float(durations.mean()),
+        'min': int(durations.min()),
+        'max': int(durations.max()),
+        'percentiles': {str(p): float(value) for p, value in zip(PERCENTILES, values)},
+    }
+
+
+def heatmap(window, mask):
+    """Segundos e contagem por dia da semana (linhas, segunda primeiro) × hora local de início"""
+    local_seconds = window.local_seconds[mask]
+    weekday = (window.local_days[mask] + EPOCH_WEEKDAY) % 7
+    hour = (local_seconds % SECONDS_PER_DAY) // 3600
+    cell = weekday * 24 + hour
+    seconds = np.bincount(cell, weights=window.durations[mask], minlength=7 * 24).reshape(7, 24)
+    counts = np.bincount(cell, minlength=7 * 24).reshape(7, 24)
+    return {
+        'weekdays': WEEKDAYS,
+        'hours': list(range(24)),
+        'total_seconds': seconds.astype(np.int64).tolist(),
+        'entry_count': counts.tolist(),
+    }
+
+
+def _daily_totals(window, mask, from_day=None, to_day=None):
+    """(primeiro dia da época, segundos por dia) cobrindo o período inteiro, com zeros"""
+    days = window.local_days[mask]
+    durations = window.durations[mask]
+    first = _epoch_day(from_day) if from_day is not None else (days.min() if len(days) else None)
+    last = _epoch_day(to_day) if to_day is not None else (days.max() if len(days) else None)
+    if first is None or last is None or last < first:
+        return None, np.zeros(0)
+    inside = (days >= first) & (days <= last)
+    totals = np.bincount(days[inside] - first, weights=durations[inside], minlength=int(last - first + 1))
+    return first, totals
+
+
+def _day_label(epoch_day):
+    return str(np.datetime64('1970-01-01', 'D') + np.timedelta64(int(epoch_day), 'D'))
+
+
+def rolling(window, mask, days=7, from_day=None, to_day=None):
+    """Total por dia e média móvel dos últimos `days` dias (inclusive)"""
+    first, totals = _daily_totals(window, mask, from_day, to_day)
+    if first is None:
+        return {'window_days': days, 'days': []}
+    cumulative = np.concatenate(([0.0], np.cumsum(totals)))
+    index = np.arange(len(totals))
+    start = np.maximum(index - days + 1, 0)
+    averages = (cumulative[index + 1] - cumulative[start]) / (index - start + 1)
+    return {
+        'window_days': days,
+        'days': [
+            {'day': _day_label(first + offset), 'total_seconds': int(total), 'rolling_avg_seconds': float(average)}
+            for offset, (total, average) in enumerate(zip(totals, averages))
+        ],
+    }
+
+
+def streaks(window, mask, today):
+    """Sequências de dias consecutivos com alguma entrada"""
+    first, totals = _daily_totals(window, mask)
+    if first is None:
+        return {'current': 0, 'longest': 0, 'active_days': 0, 'longest_start': None, 'longest_end': None}
+    active = np.concatenate(([0], (totals > 0).astype(np.int8), [0]))
+    edges = np.diff(active)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    lengths = ends - starts
+    best = int(np.argmax(lengths))
+    # A sequência atual termina hoje ou ontem (o dia de hoje ainda pode ganhar entradas)
+    last_active = first + ends[-1] - 1
+    current = int(lengths[-1]) if last_active >= _epoch_day(today) - 1 else 0
+    return {
+        'current': current,
+        'longest': int(lengths[best]),
+        'active_days': int(len(np.flatnonzero(totals))),
+        'longest_start': _day_label(first + starts[best]),
+        'longest_end': _day_label(first + ends[best] - 1),
+    }
@@ -0,0 +1,89 @@
+"""Views assíncronas dos endpoints do timer.
+
+Servidas em `/api/entries/running/`, `/start_timer/` e `/stop_timer/` no lugar
+das actions do DRF (que não suporta views assíncronas). Leituras e escritas
+de `core.timer` rodam numa thread via `sync_to_async`, uma chamada por
+requisição (a serialização usa `prefetch_related`, que o ORM assíncrono do
+Django 4.2 não suporta), então sob ASGI o loop continua atendendo outros
+clientes durante um stop. Sob WSGI elas também funcionam (o Django executa a
+corrotina por requisição).
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import status
+
+from . import timer
+from .serializers import TimerStartSerializer, TimerStopSerializer
+
+
+def _method_not_allowed(request):
+    return JsonResponse(
+        {'detail': f'Método "{request.method}" não permitido.'},
+        status=status.HTTP_405_METHOD_NOT_ALLOWED,
+    )
+
+
+def _json_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+def _csrf_exempt(view):
+    # `csrf_exempt` do Django 4.2 embrulha a view numa função síncrona; como nas views do DRF,
+    # a API não usa CSRF
+    view.csrf_exempt = True
+    return view
+
+
+# Operação e serialização juntas: uma única ida à thread por requisição
+def _running_data():
+    return timer.serialize(timer.running_entry())
+
+
+def _start_data(data):
+    return timer.serialize(timer.start(data))
+
+
+def _stop_data(entry_id):
+    entry = timer.stop(entry_id)
+    return timer.serialize(entry) if entry is not None else None
+
+
+@_csrf_exempt
+async def running(request):
+    """Retorna entry que está rodando atualmente"""
+    if request.method != 'GET':
+        return _method_not_allowed(request)
+    return JsonResponse(await sync_to_async(_running_data)(), safe=False)
+
+
+@_csrf_exempt
+async def start_timer(request):
+    """Inicia um novo timer"""
+    if request.method != 'POST':
+        return _method_not_allowed(request)
+    serializer = TimerStartSerializer(data=_json_body(request))
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = await sync_to_async(_start_data)(serializer.validated_data)
+    return JsonResponse(data, status=status.HTTP_201_CREATED)
+
+
+@_csrf_exempt
+async def stop_timer(request):
+    """Para o timer atual"""
+    if request.method != 'POST':
+        return _method_not_allowed(request)
+    serializer = TimerStopSerializer(data=_json_body(request))
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = await sync_to_async(_stop_data)(serializer.validated_data['entry_id'])
+    if data is None:
+        return JsonResponse({'error': 'Timer não encontrado ou já parado'}, status=status.HTTP_404_NOT_FOUND)
+    return JsonResponse(data)
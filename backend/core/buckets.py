@@ -0,0 +1,196 @@
+"""Baldes diários pré-agregados para o dashboard.
+
+`DailyBucket` soma segundos e contagem das entradas finalizadas por
+(data local de início, categoria, task, tag). Cada entrada entra uma vez na
+linha com `tag` nula (usada para totais, categorias e tasks) e uma vez em
+cada linha das suas tags (usada no bloco por tag). A data é a de `start_at`
+no `TIME_ZONE`, o mesmo dia local usado por `ranges.filter_range`.
+"""
+from django.apps import apps as django_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import rollups
+
+BATCH_SIZE = 1000
+
+
+def _key(state):
+    if state is None:
+        return None
+    return (
+        timezone.localtime(state.start_at).date(),
+        state.category_id,
+        state.task_id,
+        state.duration_seconds,
+        state.tag_ids,
+    )
+
+
+def _tag_ids(state):
+    if state.tag_ids is not None:
+        return state.tag_ids
+    from .models import TimeEntry
+
+    return tuple(TimeEntry.tags.through.objects.filter(timeentry_id=state.entry_id).values_list('tag_id', flat=True))
+
+
+def _lookups(state):
+    day = timezone.localtime(state.start_at).date()
+    for tag_id in (None, *_tag_ids(state)):
+        yield {'day': day, 'category_id': state.category_id, 'task_id': state.task_id, 'tag_id': tag_id}
+
+
+def _increment(lookup, seconds, count):
+    from .models import DailyBucket
+
+    rows = DailyBucket.objects.filter(**lookup)
+    updated = rows.update(
+        total_seconds=F('total_seconds') + seconds,
+        entry_count=F('entry_count') + count,
+    )
+    if not updated and count > 0:
+        try:
+            with transaction.atomic():
+                DailyBucket.objects.create(**lookup, total_seconds=seconds, entry_count=count)
+        except IntegrityError:
+            # Outra transação criou a linha depois do UPDATE (índice único daily_bucket_key)
+            rows.update(total_seconds=F('total_seconds') + seconds, entry_count=F('entry_count') + count)
+    elif count < 0:
+        rows.filter(entry_count__lte=0).delete()
+
+
+def _shift(state, sign):
+    for lookup in _lookups(state):
+        _increment(lookup, sign * state.duration_seconds, sign)
+
+
+def apply_entry_change(old_state, new_state):
+    """Mantém os baldes (mesmo contrato de `rollups.apply_entry_change`)"""
+    if _key(old_state) == _key(new_state):
+        return
+    if old_state is not None:
+        _shift(old_state, -1)
+    if new_state is not None:
+        _shift(new_state, +1)
+
+
+def apply_entries_change(old_states, new_states):
+    """Versão em lote de `apply_entry_change`, para escritas em massa.
+
+    As diferenças são somadas por linha de balde; as linhas existentes são
+    lidas (travadas) e regravadas com `bulk_update` e as que faltam, criadas
+    com `bulk_create`, em lotes de `BATCH_SIZE` chaves.
+    """
+    from .models import DailyBucket
+
+    removed, added = rollups.changed_states(old_states, new_states, key=_key)
+    deltas = {}
+    for sign, states in ((-1, removed), (1, added)):
+        for state in states:
+            for lookup in _lookups(state):
+                key = tuple(lookup.values())
+                seconds, count = deltas.get(key, (0, 0))
+                deltas[key] = (seconds + sign * state.duration_seconds, count + sign)
+    keys = [key for key, delta in deltas.items() if delta != (0, 0)]
+
+    for offset in range(0, len(keys), BATCH_SIZE):
+        pending = {key: deltas[key] for key in keys[offset:offset + BATCH_SIZE]}
+        rows = DailyBucket.objects.select_for_update().filter(
+            day__in={key[0] for key in pending}, category_id__in={key[1] for key in pending}
+        )
+        changed, emptied = [], []
+        for bucket in rows:
+            delta = pending.pop((bucket.day, bucket.category_id, bucket.task_id, bucket.tag_id), None)
+            if delta is None:
+                continue
+            bucket.total_seconds += delta[0]
+            bucket.entry_count += delta[1]
+            (changed if bucket.entry_count > 0 else emptied).append(bucket)
+        DailyBucket.objects.bulk_update(changed, ['total_seconds', 'entry_count'])
+        DailyBucket.objects.filter(id__in=[bucket.id for bucket in emptied]).delete()
+
+        missing = {key: delta for key, delta in pending.items() if delta[1] > 0}
+        try:
+            with transaction.atomic():
+                DailyBucket.objects.bulk_create([
+                    DailyBucket(day=day, category_id=category_id, task_id=task_id, tag_id=tag_id,
+                                total_seconds=seconds, entry_count=count)
+                    for (day, category_id, task_id, tag_id), (seconds, count) in missing.items()
+                ])
+        except IntegrityError:
+            # Outra transação criou alguma das linhas depois da leitura
+            for (day, category_id, task_id, tag_id), (seconds, count) in missing.items():
+                lookup = {'day': day, 'category_id': category_id, 'task_id': task_id, 'tag_id': tag_id}
+                _increment(lookup, seconds, count)
+
+
+def _grouped_rows(entries):
+    """Linhas de balde agrupadas no banco: totais (tag nula) e por tag"""
+    by_day = entries.annotate(day=TruncDate('start_at')).order_by()
+    totals = by_day.values('day', 'category_id', 'task_id').annotate(
+        total_seconds=Sum('duration_seconds'),
+        entry_count=Count('id'),
+    )
+    for row in totals:
+        yield {**row, 'tag_id': None}
+    tagged = by_day.filter(tags__isnull=False).values('day', 'category_id', 'task_id', 'tags').annotate(
+        total_seconds=Sum('duration_seconds'),
+        entry_count=Count('id'),
+    )
+    for row in tagged:
+        tag_id = row.pop('tags')
+        yield {**row, 'tag_id': tag_id}
+
+
+def refresh_categories(category_ids):
+    """Recalcula os baldes das categorias afetadas por uma escrita em massa"""
+    from .models import DailyBucket, TimeEntry
+
+    category_ids = {pk for pk in category_ids if pk is not None}
+    if not category_ids:
+        return
+    entries = TimeEntry.objects.filter(category_id__in=category_ids, end_at__isnull=False)
+    with transaction.atomic():
+        DailyBucket.objects.filter(category_id__in=category_ids).delete()
+        DailyBucket.objects.bulk_create(
+            [DailyBucket(**row) for row in _grouped_rows(entries)],
+            batch_size=BATCH_SIZE,
+        )
+
+
+def rebuild(apps=django_apps):
+    """Reconstrói todos os baldes com duas agregações agrupadas"""
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    DailyBucket = apps.get_model('core', 'DailyBucket')
+
+    rows = list(_grouped_rows(TimeEntry.objects.filter(end_at__isnull=False)))
+    with transaction.atomic():
+        DailyBucket.objects.all().delete()
+        DailyBucket.objects.bulk_create([DailyBucket(**row) for row in rows], batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def totals_queryset(from_day=None, to_day=None):
+    """Baldes de totais (uma linha por entrada, sem duplicar por tag) no período"""
+    from .models import DailyBucket
+
+    queryset = DailyBucket.objects.filter(tag__isnull=True)
+    return _filter_days(queryset, from_day, to_day)
+
+
+def tags_queryset(from_day=None, to_day=None):
+    from .models import DailyBucket
+
+    queryset = DailyBucket.objects.filter(tag__isnull=False)
+    return _filter_days(queryset, from_day, to_day)
+
+
+def _filter_days(queryset, from_day, to_day):
+    if from_day:
+        queryset = queryset.filter(day__gte=from_day)
+    if to_day:
+        queryset = queryset.filter(day__lte=to_day)
+    return queryset
@@ -0,0 +1,232 @@
+"""Importação, edição e exclusão em massa de entradas.
+
+Na importação, as linhas são validadas em lotes: o formato de cada linha
+passa pelo `TimeEntryImportSerializer`, e as referências (categorias, tasks
+e tags) são conferidas com uma consulta por lote. A gravação usa
+`bulk_create` para as entradas e um único insert em massa na tabela de tags,
+tudo numa transação: qualquer erro devolve a lista de erros por linha e nada
+é gravado.
+
+A edição e a exclusão trabalham sobre os ids selecionados com UPDATE/DELETE
+em conjunto (em lotes de `BATCH_SIZE` ids), sem `save()` por entrada. Os
+dados derivados recebem no final, de uma vez, a diferença entre os estados
+das entradas antes e depois da escrita (`derived.apply_entries_change`), em
+vez de recalcular as categorias afetadas inteiras.
+"""
+import csv
+import io
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, When
+from rest_framework import serializers
+
+from . import derived, events, search, speedrun
+from .models import Category, EntryState, Tag, Task, TimeEntry
+from .serializers import TimeEntryImportSerializer
+
+BATCH_SIZE = 500
+
+CSV_LIST_SEPARATOR = ';'
+
+
+def parse_csv(text):
+    """Lê linhas CSV com cabeçalho; `tag_ids` usa ';' como separador"""
+    rows = []
+    for row in csv.DictReader(io.StringIO(text)):
+        row = {key: value for key, value in row.items() if key}
+        if row.get('task_id') == '':
+            row['task_id'] = None
+        tag_ids = row.get('tag_ids')
+        row['tag_ids'] = [value for value in (tag_ids or '').split(CSV_LIST_SEPARATOR) if value.strip()]
+        rows.append(row)
+    return rows
+
+
+def _validate_batch(offset, rows, errors):
+    # Uma única instância do serializer: os campos são montados uma vez por lote
+    serializer = TimeEntryImportSerializer()
+    valid = []
+    for index, row in enumerate(rows, start=offset):
+        try:
+            valid.append((index, serializer.run_validation(row)))
+        except serializers.ValidationError as error:
+            errors.append({'row': index, 'errors': error.detail})
+
+    category_ids = {data['category_id'] for _index, data in valid}
+    task_ids = {data['task_id'] for _index, data in valid if data.get('task_id')}
+    tag_ids = {tag_id for _index, data in valid for tag_id in data['tag_ids']}
+    known_categories = set(Category.objects.filter(id__in=category_ids).values_list('id', flat=True))
+    known_tasks = set(Task.objects.filter(id__in=task_ids).values_list('id', flat=True))
+    known_tags = set(Tag.objects.filter(id__in=tag_ids).values_list('id', flat=True))
+
+    checked = []
+    for index, data in valid:
+        row_errors = {}
+        if data['category_id'] not in known_categories:
+            row_errors['category_id'] = ['Categoria não encontrada']
+        if data.get('task_id') and data['task_id'] not in known_tasks:
+            row_errors['task_id'] = ['Task não encontrada']
+        missing_tags = sorted(set(data['tag_ids']) - known_tags)
+        if missing_tags:
+            row_errors['tag_ids'] = [f'Tags não encontradas: {missing_tags}']
+        if row_errors:
+            errors.append({'row': index, 'errors': row_errors})
+        else:
+            checked.append(data)
+    return checked
+
+
+@transaction.atomic
+def import_entries(rows):
+    """Valida e grava `rows`. Retorna (quantidade criada, erros por linha)."""
+    errors = []
+    validated = []
+    for offset in range(0, len(rows), BATCH_SIZE):
+        validated.extend(_validate_batch(offset, rows[offset:offset + BATCH_SIZE], errors))
+    if errors:
+        return 0, sorted(errors, key=lambda error: error['row'])
+
+    entries = [
+        TimeEntry(
+            category_id=data['category_id'],
+            task_id=data.get('task_id'),
+            start_at=data['start_at'],
+            end_at=data['end_at'],
+            duration_seconds=int((data['end_at'] - data['start_at']).total_seconds()),
+            note=data.get('note', ''),
+        )
+        for data in validated
+    ]
+    TimeEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+    Through = TimeEntry.tags.through
+    Through.objects.bulk_create(
+        [
+            Through(timeentry_id=entry.id, tag_id=tag_id)
+            for entry, data in zip(entries, validated)
+            for tag_id in set(data['tag_ids'])
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    # bulk_create não passa por TimeEntry.save
+    derived.apply_entries_change({}, {
+        entry.id: EntryState(
+            category_id=entry.category_id,
+            entry_id=entry.id,
+            end_at=entry.end_at,
+            duration_seconds=entry.duration_seconds,
+            start_at=entry.start_at,
+            task_id=entry.task_id,
+            tag_ids=tuple(sorted(set(data['tag_ids']))),
+        )
+        for entry, data in zip(entries, validated)
+    })
+    search.index_entries([entry.id for entry in entries])
+    events.entries_changed('created', [entry.id for entry in entries])
+    return len(entries), []
+
+
+def _chunks(values):
+    for offset in range(0, len(values), BATCH_SIZE):
+        yield values[offset:offset + BATCH_SIZE]
+
+
+def _selected(queryset):
+    """(ids, ids em execução) das entradas do queryset, lidos uma vez"""
+    rows = set(queryset.order_by().values_list('id', 'end_at'))
+    ids = sorted(entry_id for entry_id, _end_at in rows)
+    running_ids = [entry_id for entry_id, end_at in rows if end_at is None]
+    return ids, running_ids
+
+
+def _check_references(data):
+    errors = {}
+    if 'category_id' in data and not Category.objects.filter(id=data['category_id']).exists():
+        errors['category_id'] = ['Categoria não encontrada']
+    if data.get('task_id') and not Task.objects.filter(id=data['task_id']).exists():
+        errors['task_id'] = ['Task não encontrada']
+    for field in ('add_tag_ids', 'remove_tag_ids'):
+        missing = sorted(set(data[field]) - set(Tag.objects.filter(id__in=data[field]).values_list('id', flat=True)))
+        if missing:
+            errors[field] = [f'Tags não encontradas: {missing}']
+    if errors:
+        raise serializers.ValidationError(errors)
+
+
+@transaction.atomic
+def update_entries(queryset, data):
+    """Aplica categoria, task, tags e deslocamentos de horário às entradas do queryset.
+
+    `data` vem do `TimeEntryBulkUpdateSerializer`. A duração é recalculada no
+    próprio UPDATE a partir dos deslocamentos. Retorna a quantidade alterada.
+    """
+    start_shift = data['shift_seconds'] + data['shift_start_seconds']
+    end_shift = data['shift_seconds'] + data['shift_end_seconds']
+    changes = {}
+    if 'category_id' in data:
+        changes['category_id'] = data['category_id']
+    if 'task_id' in data:
+        changes['task_id'] = data['task_id']
+    if start_shift:
+        changes['start_at'] = F('start_at') + timedelta(seconds=start_shift)
+    if end_shift:
+        changes['end_at'] = F('end_at') + timedelta(seconds=end_shift)
+    if end_shift != start_shift:
+        changes['duration_seconds'] = Case(
+            When(end_at__isnull=False, then=F('duration_seconds') + (end_shift - start_shift)),
+            default=F('duration_seconds'),
+        )
+    if not changes and not data['add_tag_ids'] and not data['remove_tag_ids']:
+        raise serializers.ValidationError('Nenhuma alteração informada')
+    _check_references(data)
+
+    ids, running_ids = _selected(queryset)
+    if not ids:
+        return 0
+    if end_shift < start_shift and any(
+        TimeEntry.objects.filter(id__in=chunk, end_at__isnull=False, duration_seconds__lt=start_shift - end_shift).exists()
+        for chunk in _chunks(ids)
+    ):
+        raise serializers.ValidationError({'shift_end_seconds': ['O fim ficaria antes do início em alguma entrada']})
+
+    old_states = derived.entry_states(ids)
+    Through = TimeEntry.tags.through
+    for chunk in _chunks(ids):
+        if changes:
+            TimeEntry.objects.filter(id__in=chunk).update(**changes)
+        if data['remove_tag_ids']:
+            Through.objects.filter(timeentry_id__in=chunk, tag_id__in=data['remove_tag_ids']).delete()
+        if data['add_tag_ids']:
+            Through.objects.bulk_create(
+                [Through(timeentry_id=entry_id, tag_id=tag_id) for entry_id in chunk for tag_id in set(data['add_tag_ids'])],
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+
+    derived.apply_entries_change(old_states, derived.entry_states(ids))
+    if 'task_id' in data:
+        search.index_entries(ids)
+    if 'category_id' in data or start_shift or end_shift:
+        speedrun.refresh_snapshots(ids)
+    events.entries_changed('updated', ids)
+    if running_ids:
+        events.timer_changed(TimeEntry.objects.filter(id__in=running_ids).first())
+    return len(ids)
+
+
+@transaction.atomic
+def delete_entries(queryset):
+    """Apaga as entradas do queryset; retorna a quantidade apagada"""
+    ids, running_ids = _selected(queryset)
+    # As tags somem junto com as entradas; os estados são lidos antes
+    old_states = derived.entry_states(ids)
+    for chunk in _chunks(ids):
+        # DELETE em conjunto: TimeEntry.delete() por entrada faria a manutenção uma a uma
+        TimeEntry.objects.filter(id__in=chunk).delete()
+    derived.apply_entries_change(old_states, {})
+    search.remove_entries(ids)
+    events.entries_changed('deleted', ids)
+    if running_ids:
+        events.timer_changed(None)
+    return len(ids)
@@ -0,0 +1,233 @@
+"""Exportação e importação colunar (Parquet/Arrow) de todo o histórico.
+
+Cada tabela (tags, categories, tasks, entries) vira um arquivo com schema
+tipado. As relações M2M são gravadas como colunas de listas de ids
+(`default_tag_ids`, `tag_ids`). A escrita e a leitura são feitas em lotes;
+a importação usa apenas `bulk_create`, sem `save()` por linha, e reconstrói
+os dados derivados no final.
+"""
+import json
+from contextlib import contextmanager
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from . import derived
+from .models import Category, Tag, Task, TimeEntry
+
+BATCH_SIZE = 10000
+
+FILE_FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+
+# tabela -> (model, colunas escalares, colunas JSON, (campo M2M, coluna))
+TABLES = {
+    'tags': (
+        Tag,
+        [('id', pa.int64()), ('name', pa.string()), ('color', pa.string()), ('created_at', TIMESTAMP)],
+        [],
+        None,
+    ),
+    'categories': (
+        Category,
+        [
+            ('id', pa.int64()), ('name', pa.string()), ('parent_id', pa.int64()), ('path', pa.string()),
+            ('properties', pa.string()), ('icon', pa.string()),
+            ('created_at', TIMESTAMP), ('updated_at', TIMESTAMP),
+        ],
+        ['properties'],
+        None,
+    ),
+    'tasks': (
+        Task,
+        [
+            ('id', pa.int64()), ('name', pa.string()), ('description', pa.string()),
+            ('category_id', pa.int64()), ('properties', pa.string()),
+            ('created_at', TIMESTAMP), ('updated_at', TIMESTAMP),
+        ],
+        ['properties'],
+        ('default_tags', 'default_tag_ids'),
+    ),
+    'entries': (
+        TimeEntry,
+        [
+            ('id', pa.int64()), ('task_id', pa.int64()), ('category_id', pa.int64()),
+            ('start_at', TIMESTAMP), ('end_at', TIMESTAMP), ('duration_seconds', pa.int64()),
+            ('note', pa.string()), ('meta', pa.string()),
+            ('created_at', TIMESTAMP), ('updated_at', TIMESTAMP),
+        ],
+        ['meta'],
+        ('tags', 'tag_ids'),
+    ),
+}
+
+# Ordem de importação (as FKs de categories para si mesma são adiadas até o commit)
+IMPORT_ORDER = ['tags', 'categories', 'tasks', 'entries']
+
+
+def table_schema(table):
+    _model, columns, _json_columns, m2m = TABLES[table]
+    fields = [pa.field(name, arrow_type) for name, arrow_type in columns]
+    if m2m:
+        fields.append(pa.field(m2m[1], pa.list_(pa.int64())))
+    return pa.schema(fields)
+
+
+def _through(model, field_name):
+    """(tabela intermediária, coluna de origem, coluna de destino) de um campo M2M"""
+    descriptor = getattr(model, field_name)
+    source = f'{model._meta.model_name}_id'
+    target = f'{descriptor.field.related_model._meta.model_name}_id'
+    return descriptor.through, source, target
+
+
+def _m2m_ids(model, field_name, object_ids):
+    through, source, target = _through(model, field_name)
+    ids = {}
+    rows = through.objects.filter(**{f'{source}__in': object_ids}).values_list(source, target)
+    for object_id, related_id in rows.order_by(source, target):
+        ids.setdefault(object_id, []).append(related_id)
+    return ids
+
+
+def iter_batches(table, queryset=None, batch_size=BATCH_SIZE):
+    """Gera `RecordBatch`es da tabela lendo o banco em blocos"""
+    model, columns, json_columns, m2m = TABLES[table]
+    schema = table_schema(table)
+    names = [name for name, _arrow_type in columns]
+    if queryset is None:
+        queryset = model.objects.all()
+    rows = queryset.select_related(None).prefetch_related(None).order_by('id').values_list(*names)
+
+    def to_batch(chunk):
+        data = {name: [row[index] for row in chunk] for index, name in enumerate(names)}
+        for name in json_columns:
+            data[name] = [json.dumps(value, ensure_ascii=False) for value in data[name]]
+        if m2m:
+            related = _m2m_ids(model, m2m[0], data['id'])
+            data[m2m[1]] = [related.get(object_id, []) for object_id in data['id']]
+        return pa.RecordBatch.from_pydict(data, schema=schema)
+
+    chunk = []
+    for row in rows.iterator(chunk_size=batch_size):
+        chunk.append(row)
+        if len(chunk) >= batch_size:
+            yield to_batch(chunk)
+            chunk = []
+    if chunk:
+        yield to_batch(chunk)
+
+
+def write_table(table, sink, file_format='parquet', queryset=None):
+    """Escreve a tabela em `sink` (caminho ou arquivo binário). Retorna o total de linhas."""
+    schema = table_schema(table)
+    total = 0
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = ipc.new_file(sink, schema)
+    with writer:
+        for batch in iter_batches(table, queryset=queryset):
+            writer.write_batch(batch)
+            total += batch.num_rows
+    return total
+
+
+def export_all(directory, file_format='parquet'):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return {
+        table: write_table(table, str(directory / f'{table}{FILE_FORMATS[file_format]}'), file_format)
+        for table in IMPORT_ORDER
+    }
+
+
+def _read_batches(path, batch_size=BATCH_SIZE):
+    if path.suffix == FILE_FORMATS['parquet']:
+        yield from pq.ParquetFile(str(path)).iter_batches(batch_size=batch_size)
+        return
+    with pa.memory_map(str(path)) as source:
+        reader = ipc.open_file(source)
+        for index in range(reader.num_record_batches):
+            yield reader.get_batch(index)
+
+
+@contextmanager
+def _preserve_timestamps(model):
+    """Mantém created_at/updated_at do arquivo em vez de auto_now/auto_now_add"""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def import_table(table, path):
+    model, _columns, json_columns, m2m = TABLES[table]
+    if m2m:
+        through, source, target = _through(model, m2m[0])
+    total = 0
+    with _preserve_timestamps(model):
+        for batch in _read_batches(Path(path)):
+            objects = []
+            links = []
+            for row in batch.to_pylist():
+                related_ids = row.pop(m2m[1], None) if m2m else None
+                for name in json_columns:
+                    row[name] = json.loads(row[name]) if row[name] else {}
+                objects.append(model(**row))
+                for related_id in related_ids or []:
+                    links.append(through(**{source: row['id'], target: related_id}))
+            model.objects.bulk_create(objects, batch_size=1000)
+            if links:
+                through.objects.bulk_create(links, batch_size=1000)
+            total += len(objects)
+    return total
+
+
+def _reset_sequences():
+    models = [TABLES[table][0] for table in IMPORT_ORDER]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def import_all(directory, replace=False):
+    """Importa os arquivos de `directory` numa única transação"""
+    directory = Path(directory)
+    paths = {}
+    for table in IMPORT_ORDER:
+        candidates = [directory / f'{table}{suffix}' for suffix in FILE_FORMATS.values()]
+        existing = [path for path in candidates if path.exists()]
+        if not existing:
+            raise FileNotFoundError(f'Arquivo da tabela {table} não encontrado em {directory}')
+        paths[table] = existing[0]
+
+    with transaction.atomic():
+        if replace:
+            TimeEntry.objects.all().delete()
+            Task.objects.all().delete()
+            Category.objects.all().delete()
+            Tag.objects.all().delete()
+        elif any(TABLES[table][0].objects.exists() for table in IMPORT_ORDER):
+            raise ValueError('O banco já tem dados; use replace=True para substituí-los')
+        counts = {table: import_table(table, paths[table]) for table in IMPORT_ORDER}
+        _reset_sequences()
+        derived.rebuild_all()
+    return counts
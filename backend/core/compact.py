@@ -0,0 +1,120 @@
+"""Listagem compacta das entradas (`GET /entries/?view=compact`).
+
+Lê só as colunas de `core_timeentry` dos campos pedidos com `.values()`,
+resolve as tags, os caminhos das categorias e os nomes das tasks da página
+com uma consulta cada (sem JOIN na consulta principal, o que também mantém
+o COUNT da paginação numa única tabela) e monta listas simples, sem
+ModelSerializer por linha, sem o JSON `meta` e sem `speedrun_dynamic` (a não
+ser que seja pedido, com os agregados da página num único lote).
+
+O layout padrão é colunar, `{"fields": [...], "columns": {campo: [valores]}}`:
+cada nome de campo aparece uma vez por página em vez de uma vez por linha.
+Com `layout=rows` cada entrada vira uma lista na ordem de `fields`.
+"""
+from collections import namedtuple
+
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from . import speedrun
+from .models import Category, Task, TimeEntry
+
+# Campo da resposta -> colunas lidas com .values()
+FIELDS = {
+    'id': ('id',),
+    'start_at': ('start_at',),
+    'end_at': ('end_at',),
+    'duration_seconds': ('duration_seconds',),
+    'is_running': ('end_at',),
+    'category': ('category_id',),
+    # Caminho e nome lidos depois, numa consulta por página
+    'category_name': ('category_id',),
+    'task': ('task_id',),
+    'task_name': ('task_id',),
+    # Ids das tags, lidos da tabela intermediária numa consulta por página
+    'tags': (),
+    'note': ('note',),
+    'speedrun_dynamic': ('category_id', 'end_at', 'duration_seconds'),
+}
+DEFAULT_FIELDS = (
+    'id', 'start_at', 'end_at', 'duration_seconds', 'is_running', 'category', 'category_name',
+    'task', 'task_name', 'tags', 'note',
+)
+LAYOUTS = ('columns', 'rows')
+
+# O que speedrun.dynamic_from_stats lê de uma entrada
+_SpeedrunRow = namedtuple('_SpeedrunRow', 'id end_at duration_seconds')
+
+
+def parse_options(params):
+    """(campos, layout) pedidos em `fields` e `layout`; ValidationError se algum for desconhecido"""
+    fields = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown:
+        raise ValidationError({'fields': [f'Campos desconhecidos: {", ".join(unknown)}']})
+    layout = params.get('layout') or LAYOUTS[0]
+    if layout not in LAYOUTS:
+        raise ValidationError({'layout': [f'Use um de: {", ".join(LAYOUTS)}']})
+    return list(dict.fromkeys(fields)) or list(DEFAULT_FIELDS), layout
+
+
+def select(queryset, fields):
+    """`.values()` com as colunas dos campos (o id sempre, para as tags e o cursor)"""
+    columns = {'id': None, 'start_at': None}
+    for name in fields:
+        columns.update(dict.fromkeys(FIELDS[name]))
+    return queryset.select_related(None).prefetch_related(None).values(*columns)
+
+
+def _tag_ids(entry_ids):
+    tags = {}
+    rows = TimeEntry.tags.through.objects.filter(timeentry_id__in=entry_ids).values_list(
+        'timeentry_id', 'tag_id'
+    ).order_by('timeentry_id', 'tag_id')
+    for entry_id, tag_id in rows:
+        tags.setdefault(entry_id, []).append(tag_id)
+    return tags
+
+
+def _names(model, column, ids):
+    return dict(model.objects.filter(id__in={pk for pk in ids if pk is not None}).values_list('id', column))
+
+
+def render(rows, fields, layout):
+    """Página de linhas de `select` no layout pedido"""
+    rows = list(rows)
+    datetime_field = serializers.DateTimeField()
+
+    def datetimes(column):
+        return [datetime_field.to_representation(row[column]) if row[column] else None for row in rows]
+
+    columns = {}
+    for name in fields:
+        if name in ('start_at', 'end_at'):
+            columns[name] = datetimes(name)
+        elif name == 'is_running':
+            columns[name] = [row['end_at'] is None for row in rows]
+        elif name == 'category_name':
+            paths = _names(Category, 'path', [row['category_id'] for row in rows])
+            columns[name] = [paths.get(row['category_id']) for row in rows]
+        elif name == 'task_name':
+            names = _names(Task, 'name', [row['task_id'] for row in rows])
+            columns[name] = [names.get(row['task_id']) for row in rows]
+        elif name == 'tags':
+            tags = _tag_ids([row['id'] for row in rows])
+            columns[name] = [tags.get(row['id'], []) for row in rows]
+        elif name == 'speedrun_dynamic':
+            stats = speedrun.subtree_stats({row['category_id'] for row in rows if row['end_at']})
+            columns[name] = [
+                speedrun.dynamic_from_stats(
+                    _SpeedrunRow(row['id'], row['end_at'], row['duration_seconds']), stats[row['category_id']]
+                ) if row['end_at'] else None
+                for row in rows
+            ]
+        else:
+            column = FIELDS[name][0]
+            columns[name] = [row[column] for row in rows]
+
+    if layout == 'rows':
+        return {'fields': fields, 'rows': [list(values) for values in zip(*(columns[name] for name in fields))]}
+    return {'fields': fields, 'columns': columns}
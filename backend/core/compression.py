@@ -0,0 +1,79 @@
+"""Compressão das respostas da API conforme o tamanho.
+
+Respostas a partir de `settings.COMPRESSION_MIN_SIZE` bytes são comprimidas
+com brotli, quando o pacote opcional `brotli` está instalado e o cliente o
+aceita, ou com gzip. Abaixo do limite o custo de CPU não compensa os bytes
+economizados. Respostas em streaming (SSE e exportações, que têm
+`?compress=gzip` próprio) passam intactas.
+
+Como o corpo comprimido é outra representação, o ETag vira fraco (`W/`),
+como no GZipMiddleware do Django; a comparação do If-None-Match continua
+valendo.
+"""
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    # Opcional: sem ele, só gzip
+    brotli = None
+
+_ENCODING_RE = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def accepted_encodings(header):
+    """Codificações aceitas no Accept-Encoding (as com q=0 ficam de fora)"""
+    accepted = set()
+    for part in header.split(','):
+        match = _ENCODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+        # A resposta muda com o Accept-Encoding mesmo quando não é comprimida
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
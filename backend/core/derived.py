@@ -0,0 +1,107 @@
+"""Ponto único de manutenção dos dados derivados das entradas.
+
+Cada estrutura derivada (rollups, índice de speedrun, baldes diários) expõe
+`apply_entry_change(old_state, new_state)` para escritas individuais,
+`apply_entries_change(old_states, new_states)` para escritas em massa de
+entradas e `refresh_categories(category_ids)` para as que mudam a árvore ou
+apagam em cascata. Models e views
+chamam apenas as funções deste módulo, que também incrementam a versão
+`entries` usada como chave de cache dos dados lidos das entradas e as
+gerações do cache de resultados das estatísticas (`results`).
+"""
+from . import buckets, hierarchy, results, rollups, search, speedrun, versioning
+
+MAINTAINERS = (rollups, speedrun, buckets)
+STATE_BATCH_SIZE = 500
+
+
+def apply_entry_change(old_state, new_state):
+    for maintainer in MAINTAINERS:
+        maintainer.apply_entry_change(old_state, new_state)
+    if old_state != new_state:
+        # Só os dias e as subárvores da entrada
+        results.entries_changed([old_state, new_state])
+    versioning.bump_version('entries')
+
+
+def entry_states(entry_ids):
+    """{entry_id: EntryState} das entradas finalizadas, com as tags, lidos em lotes"""
+    from .models import EntryState, TimeEntry
+
+    entry_ids = sorted(set(entry_ids))
+    states = {}
+    for offset in range(0, len(entry_ids), STATE_BATCH_SIZE):
+        chunk = entry_ids[offset:offset + STATE_BATCH_SIZE]
+        tag_ids = {}
+        links = TimeEntry.tags.through.objects.filter(timeentry_id__in=chunk).order_by('timeentry_id', 'tag_id')
+        for entry_id, tag_id in links.values_list('timeentry_id', 'tag_id'):
+            tag_ids.setdefault(entry_id, []).append(tag_id)
+        rows = TimeEntry.objects.filter(id__in=chunk, end_at__isnull=False).values(
+            'id', 'category_id', 'task_id', 'start_at', 'end_at', 'duration_seconds'
+        )
+        for row in rows:
+            states[row['id']] = EntryState(
+                category_id=row['category_id'],
+                entry_id=row['id'],
+                end_at=row['end_at'],
+                duration_seconds=int(row['duration_seconds'] or 0),
+                start_at=row['start_at'],
+                task_id=row['task_id'],
+                tag_ids=tuple(tag_ids.get(row['id'], ())),
+            )
+    return states
+
+
+def apply_entries_change(old_states, new_states):
+    """Escritas em massa: {entry_id: EntryState} de antes e de depois (ver `entry_states`)"""
+    for maintainer in MAINTAINERS:
+        maintainer.apply_entries_change(old_states, new_states)
+    results.entries_changed([*old_states.values(), *new_states.values()])
+    versioning.bump_version('entries')
+
+
+def refresh_categories(category_ids):
+    category_ids = set(category_ids)
+    for maintainer in MAINTAINERS:
+        maintainer.refresh_categories(category_ids)
+    # Mudanças na árvore e exclusões em cascata podem mexer em qualquer dia
+    results.invalidate_all()
+    versioning.bump_version('entries')
+
+
+def apply_entry_tags_change(entry_ids, removing):
+    """Tira (antes) ou repõe (depois) as entradas nos dados que dependem das tags"""
+    from .models import EntryState, TimeEntry
+
+    entries = TimeEntry.objects.filter(id__in=entry_ids, end_at__isnull=False).values(
+        'id', 'category_id', 'task_id', 'start_at', 'end_at', 'duration_seconds'
+    )
+    states = []
+    for row in entries:
+        state = EntryState(
+            category_id=row['category_id'],
+            entry_id=row['id'],
+            end_at=row['end_at'],
+            duration_seconds=row['duration_seconds'],
+            start_at=row['start_at'],
+            task_id=row['task_id'],
+        )
+        if removing:
+            buckets.apply_entry_change(state, None)
+        else:
+            buckets.apply_entry_change(None, state)
+        states.append(state)
+    # As estatísticas por categoria não dependem das tags
+    results.entries_changed(states, subtrees=False)
+    versioning.bump_version('entries')
+
+
+def rebuild_all():
+    """Reconstrói tudo a partir das tabelas base (depois de importações em massa)"""
+    hierarchy.rebuild()
+    rollups.rebuild_rollups()
+    speedrun.rebuild()
+    buckets.rebuild()
+    search.rebuild()
+    results.invalidate_all()
+    versioning.bump_version('entries')
@@ -0,0 +1,131 @@
+"""Canal de eventos em tempo real (Server-Sent Events).
+
+As views publicam depois do commit e cada conexão aberta em `/api/events/`
+recebe a mensagem já formatada, sem nenhuma consulta por cliente. Eventos:
+
+- `timer`: entrada em execução serializada, ou `null` quando nada está rodando;
+- `entry`: `{"action": "created" | "updated" | "deleted", "ids": [...]}`.
+
+O broadcaster vive no processo do servidor ASGI: com vários workers, cada um
+só entrega as escritas feitas por ele.
+"""
+import asyncio
+import json
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+# Mensagens pendentes por conexão; um cliente lento perde as mais antigas
+QUEUE_SIZE = 100
+
+# Comentário enviado quando não há eventos, para manter a conexão aberta
+KEEPALIVE_SECONDS = 15
+
+
+def format_event(event, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+class Broadcaster:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """Registra uma fila no loop atual; use dentro da corrotina da conexão"""
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, message):
+        """Entrega `message` a todas as conexões (pode ser chamado de qualquer thread)"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # Loop já encerrado
+                self.unsubscribe((loop, queue))
+
+    @staticmethod
+    def _deliver(queue, message):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+
+broadcaster = Broadcaster()
+
+
+def publish(event, data):
+    message = format_event(event, data)
+    transaction.on_commit(lambda: broadcaster.publish(message))
+
+
+def timer_changed(entry):
+    """Publica o novo estado do timer (`entry` em execução ou None)"""
+    from .serializers import TimeEntrySerializer
+
+    publish('timer', TimeEntrySerializer(entry).data if entry is not None else None)
+
+
+def entries_changed(action, entry_ids):
+    entry_ids = list(entry_ids)
+    if entry_ids:
+        publish('entry', {'action': action, 'ids': entry_ids})
+
+
+class CancelOnDisconnect:
+    """Middleware ASGI que encerra as conexões de eventos quando o cliente sai.
+
+    O handler ASGI do Django 4.2 não acompanha `http.disconnect` durante uma
+    resposta em streaming, então a conexão SSE ficaria inscrita no broadcaster
+    para sempre. Aqui o corpo da requisição é repassado ao Django e o `receive`
+    real fica sendo observado; ao desconectar, a tarefa da resposta é cancelada.
+    """
+
+    def __init__(self, app, path_prefix='/api/events/'):
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(self.path_prefix):
+            return await self.app(scope, receive, send)
+
+        messages = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            messages.append(message)
+            if not message.get('more_body', False):
+                break
+
+        async def app_receive():
+            if messages:
+                return messages.pop(0)
+            # Depois do corpo, o Django não volta a chamar receive
+            await asyncio.Future()
+
+        async def wait_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        app_task = asyncio.ensure_future(self.app(scope, app_receive, send))
+        disconnect_task = asyncio.ensure_future(wait_disconnect())
+        await asyncio.wait({app_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+        for task in (app_task, disconnect_task):
+            if not task.done():
+                task.cancel()
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            pass
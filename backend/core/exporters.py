@@ -0,0 +1,142 @@
+"""Exportação de entradas em streaming.
+
+As linhas são lidas com `.iterator(chunk_size=...)`, as tags de cada bloco
+são resolvidas com uma única consulta na tabela intermediária e o conteúdo
+é emitido por geradores, então o uso de memória não depende do total de
+linhas exportadas.
+
+Sob ASGI o Django consome um iterador síncrono de StreamingHttpResponse com
+`sync_to_async(list)`, ou seja, acumula a exportação inteira antes de
+enviar. `aiter_chunks` adapta os geradores: cada lote de pedaços é lido
+numa ida à thread do banco e enviado antes do próximo.
+"""
+import csv
+import json
+import zlib
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import TimeEntry
+
+CHUNK_SIZE = 2000
+# Pedaços (linhas, ou blocos do gzip) lidos por ida à thread em aiter_chunks
+STREAM_BATCH = 500
+
+ENTRY_FIELDS = (
+    'id', 'start_at', 'end_at', 'duration_seconds', 'note',
+    'category_id', 'category__path', 'task_id', 'task__name',
+)
+
+CSV_HEADER = ['Data', 'Categoria', 'Task', 'Início', 'Fim', 'Duração (min)', 'Tags', 'Nota']
+
+
+def _tags_by_entry(entry_ids):
+    tags = {}
+    rows = TimeEntry.tags.through.objects.filter(timeentry_id__in=entry_ids).values_list(
+        'timeentry_id', 'tag__name'
+    ).order_by('timeentry_id', 'tag__name')
+    for entry_id, tag_name in rows:
+        tags.setdefault(entry_id, []).append(tag_name)
+    return tags
+
+
+def iter_entries(queryset, chunk_size=CHUNK_SIZE):
+    """Gera dicts das entradas com a lista de tags, um bloco por vez"""
+    rows = queryset.select_related(None).prefetch_related(None).values(*ENTRY_FIELDS)
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _with_tags(chunk)
+            chunk = []
+    if chunk:
+        yield from _with_tags(chunk)
+
+
+def _with_tags(chunk):
+    tags = _tags_by_entry([row['id'] for row in chunk])
+    for row in chunk:
+        row['tags'] = tags.get(row['id'], [])
+        yield row
+
+
+class _Echo:
+    """Buffer que devolve o que recebe, para o csv.writer produzir strings"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(entries):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for entry in entries:
+        duration_min = entry['duration_seconds'] / 60 if entry['duration_seconds'] else 0
+        yield writer.writerow([
+            entry['start_at'].date(),
+            entry['category__path'],
+            entry['task__name'] or '',
+            entry['start_at'].strftime('%H:%M'),
+            entry['end_at'].strftime('%H:%M') if entry['end_at'] else '',
+            f"{duration_min:.1f}",
+            ', '.join(entry['tags']),
+            entry['note'],
+        ])
+
+
+def ndjson_lines(entries):
+    for entry in entries:
+        yield json.dumps({
+            'id': entry['id'],
+            'start_at': entry['start_at'],
+            'end_at': entry['end_at'],
+            'duration_seconds': entry['duration_seconds'],
+            'category_id': entry['category_id'],
+            'category_path': entry['category__path'],
+            'task_id': entry['task_id'],
+            'task_name': entry['task__name'],
+            'tags': entry['tags'],
+            'note': entry['note'],
+        }, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def gzip_stream(chunks):
+    """Comprime um gerador de strings em gzip sem acumular o conteúdo"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _next_batch(iterator, size):
+    return list(islice(iterator, size))
+
+
+def _close(iterator):
+    close = getattr(iterator, 'close', None)
+    if close is not None:
+        close()
+
+
+async def aiter_chunks(chunks, size=STREAM_BATCH):
+    """Iterador assíncrono sobre um gerador síncrono de str ou bytes, para o
+    StreamingHttpResponse sob ASGI.
+
+    Os lotes são lidos com sync_to_async (thread_sensitive), na mesma thread
+    da view, onde está a conexão do cursor aberto por `iter_entries`; cada
+    lote sai como um único pedaço. Se o cliente desconecta, o gerador é
+    fechado na mesma thread e libera o cursor.
+    """
+    iterator = iter(chunks)
+    try:
+        while True:
+            batch = await sync_to_async(_next_batch)(iterator, size)
+            if not batch:
+                break
+            yield batch[0][:0].join(batch)
+    finally:
+        await sync_to_async(_close)(iterator)
@@ -0,0 +1,146 @@
+"""Hierarquia de categorias via closure table.
+
+`CategoryClosure` tem uma linha `(ancestor, descendant, depth)` para cada par
+de categorias ligadas na árvore, incluindo a própria categoria (depth 0).
+Filtrar uma subárvore vira um join por inteiro indexado, e mover ou
+renomear um nó reescreve os caminhos descendentes com um único UPDATE.
+"""
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Concat, Substr
+
+from . import versioning
+
+
+def subtree_q(category_id, prefix='category__'):
+    """Filtro da subárvore de `category_id` (a própria categoria e as descendentes)"""
+    return Q(**{f'{prefix}ancestor_links__ancestor_id': category_id})
+
+
+def ancestor_ids(category_id):
+    """IDs das categorias cuja subárvore contém `category_id` (inclui a própria)"""
+    from .models import CategoryClosure
+
+    return list(CategoryClosure.objects.filter(descendant_id=category_id).values_list('ancestor_id', flat=True))
+
+
+def descendant_ids(category_id):
+    """IDs da subárvore de `category_id` (inclui a própria)"""
+    from .models import CategoryClosure
+
+    return list(CategoryClosure.objects.filter(ancestor_id=category_id).values_list('descendant_id', flat=True))
+
+
+def with_ancestors(category_ids):
+    """Conjunto com as categorias e todas as suas ancestrais"""
+    from .models import CategoryClosure
+
+    category_ids = {pk for pk in category_ids if pk is not None}
+    if not category_ids:
+        return set()
+    return set(
+        CategoryClosure.objects.filter(descendant_id__in=category_ids).values_list('ancestor_id', flat=True)
+    )
+
+
+def ancestors_by_category(category_ids):
+    """{categoria: [ids das ancestrais, incluindo a própria]} com uma única consulta"""
+    from .models import CategoryClosure
+
+    category_ids = {pk for pk in category_ids if pk is not None}
+    chains = {pk: [] for pk in category_ids}
+    links = CategoryClosure.objects.filter(descendant_id__in=category_ids).values_list('descendant_id', 'ancestor_id')
+    for descendant_id, ancestor_id in links:
+        chains[descendant_id].append(ancestor_id)
+    return chains
+
+
+def insert_node(category):
+    """Registra uma categoria recém-criada abaixo do seu pai"""
+    from .models import CategoryClosure
+
+    links = [CategoryClosure(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+    if category.parent_id:
+        links.extend(
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1)
+            for ancestor_id, depth in CategoryClosure.objects.filter(
+                descendant_id=category.parent_id
+            ).values_list('ancestor_id', 'depth')
+        )
+    CategoryClosure.objects.bulk_create(links)
+
+
+def move_subtree(category):
+    """Religa a subárvore de `category` ao novo pai. Retorna as ancestrais antigas."""
+    from .models import CategoryClosure
+
+    subtree = list(CategoryClosure.objects.filter(ancestor_id=category.pk).values_list('descendant_id', 'depth'))
+    subtree_ids = [descendant_id for descendant_id, _depth in subtree]
+    if category.parent_id in subtree_ids:
+        raise ValueError('Uma categoria não pode ser movida para dentro da própria subárvore')
+
+    old_links = CategoryClosure.objects.filter(descendant_id=category.pk).exclude(ancestor_id=category.pk)
+    old_ancestor_ids = list(old_links.values_list('ancestor_id', flat=True))
+    CategoryClosure.objects.filter(descendant_id__in=subtree_ids, ancestor_id__in=old_ancestor_ids).delete()
+
+    if category.parent_id:
+        new_ancestors = list(
+            CategoryClosure.objects.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth')
+        )
+        CategoryClosure.objects.bulk_create([
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+            for ancestor_id, ancestor_depth in new_ancestors
+            for descendant_id, depth in subtree
+        ])
+    return old_ancestor_ids
+
+
+def rewrite_descendant_paths(category, old_path):
+    """Troca o prefixo `old_path` pelo caminho atual em todas as descendentes"""
+    from .models import Category
+
+    Category.objects.filter(
+        ancestor_links__ancestor_id=category.pk,
+        ancestor_links__depth__gt=0,
+    ).update(path=Concat(Value(category.path), Substr('path', len(old_path) + 1)))
+
+
+def ancestor_map(rows):
+    """{id: [ids das ancestrais, da raiz até a própria]} a partir de pares (id, parent_id)"""
+    parents = dict(rows)
+    chains = {}
+    for category_id in parents:
+        chain = []
+        current = category_id
+        while current is not None and current not in chain:
+            chain.append(current)
+            current = parents.get(current)
+        chains[category_id] = chain[::-1]
+    return chains
+
+
+def rebuild(apps=django_apps):
+    """Reconstrói a closure table e corrige caminhos desatualizados a partir de `parent`"""
+    Category = apps.get_model('core', 'Category')
+    CategoryClosure = apps.get_model('core', 'CategoryClosure')
+
+    categories = {row['id']: row for row in Category.objects.values('id', 'parent_id', 'name', 'path')}
+    chains = ancestor_map((pk, row['parent_id']) for pk, row in categories.items())
+
+    links = []
+    stale = []
+    for category_id, chain in chains.items():
+        depth = len(chain) - 1
+        for position, ancestor_id in enumerate(chain):
+            links.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth - position))
+        path = ''.join(f"/{categories[pk]['name']}" for pk in chain)
+        if path != categories[category_id]['path']:
+            stale.append(Category(id=category_id, path=path))
+
+    with transaction.atomic():
+        versioning.bump_version('categories')
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.bulk_create(links, batch_size=1000)
+        Category.objects.bulk_update(stale, ['path'], batch_size=500)
+    return len(chains)
@@ -0,0 +1,116 @@
+"""Fila de trabalhos em segundo plano.
+
+`dispatch(key, func, *args)` executa `func` conforme `settings.BACKGROUND_JOBS`:
+
+- `thread`: pool de threads no processo. Chaves repetidas enquanto o trabalho
+  está na fila são ignoradas e falhas são repetidas com espera crescente. Os
+  servidores chamam `start()` ao carregar a aplicação para reenfileirar o que
+  ficou gravado no banco (processo reiniciado no meio, migrações);
+- `db`: não executa nada; o trabalho já gravado no banco pelo chamador é
+  processado pelo comando `run_jobs`, que pode rodar em vários processos;
+- `sync`: executa na hora (testes e comandos).
+
+Os trabalhos devem ser idempotentes: a mesma chave pode ser processada de novo
+depois de uma falha ou por outro processo.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 0.5
+
+
+class WorkQueue:
+    def __init__(self, max_workers, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY_SECONDS):
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, *args):
+        """Agenda `func(*args)`; devolve False se a chave já está na fila"""
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='jobs')
+        self._executor.submit(self._run, key, func, args)
+        return True
+
+    def _run(self, key, func, args):
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    func(*args)
+                    return
+                except Exception:
+                    logger.exception('Trabalho %s falhou (tentativa %s de %s)', key, attempt, self.max_attempts)
+                    if attempt < self.max_attempts:
+                        time.sleep(self.retry_delay * attempt)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+            # Cada thread do pool tem suas conexões; não deixa nenhuma aberta entre trabalhos
+            connections.close_all()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self, timeout=10):
+        """Espera a fila esvaziar (comandos e scripts); devolve False se o tempo acabar"""
+        deadline = time.monotonic() + timeout
+        while self.pending():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+queue = WorkQueue(max_workers=settings.BACKGROUND_JOB_WORKERS)
+
+
+def dispatch(key, func, *args):
+    mode = settings.BACKGROUND_JOBS
+    if mode == 'sync':
+        func(*args)
+    elif mode == 'thread':
+        queue.submit(key, func, *args)
+    elif mode != 'db':
+        raise ValueError(f'BACKGROUND_JOBS inválido: {mode}')
+
+
+def start():
+    """Chamada por wsgi.py/asgi.py: no modo `thread`, recupera no pool os trabalhos que ficaram no banco"""
+    from . import speedrun
+
+    if settings.BACKGROUND_JOBS == 'thread':
+        queue.submit('recover', speedrun.requeue_pending_snapshots)
+
+
+def run_pending(fetch_keys, func, once=False, interval=1.0, batch_size=100):
+    """Laço do worker do modo `db`: processa as chaves devolvidas por `fetch_keys` até esvaziar"""
+    processed = 0
+    while True:
+        close_old_connections()
+        keys = list(fetch_keys(batch_size))
+        for key in keys:
+            try:
+                func(key)
+                processed += 1
+            except Exception:
+                logger.exception('Trabalho %s falhou', key)
+        if not keys:
+            if once:
+                return processed
+            time.sleep(interval)
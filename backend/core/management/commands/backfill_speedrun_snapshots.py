@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core import speedrun
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstrói o índice de prefixos do speedrun e recalcula '
+        "meta['speedrun_snapshot'] de todas as entradas finalizadas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--index-only',
+            action='store_true',
+            help='Reconstrói apenas o índice, sem reescrever os snapshots',
+        )
+
+    def handle(self, *args, **options):
+        total = speedrun.rebuild(write_snapshots=not options['index_only'])
+        self.stdout.write(self.style.SUCCESS(f'{total} entradas processadas.'))
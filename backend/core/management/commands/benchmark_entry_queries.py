@@ -0,0 +1,99 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import ranges
+from core.models import Category, TimeEntry
+
+# Índices removidos na medição "antes", pela migração que os criou
+ENTRY_INDEXES = {
+    '0006_entry_range_indexes': ['entry_start_at', 'entry_category_start_at', 'entry_category_end_at'],
+    # Índice único parcial que substituiu entry_end_at; atende também a busca do timer em execução
+    '0008_single_running_entry': ['entry_single_running'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara plano de consulta e tempo dos acessos a entradas antes (filtros start_at__date, '
+        'sem os índices novos) e depois (limites semiabertos com índices)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Tamanho do período filtrado')
+        parser.add_argument('--runs', type=int, default=20, help='Execuções por consulta')
+
+    def handle(self, *args, **options):
+        to_day = timezone.localdate()
+        from_day = to_day - timedelta(days=options['days'] - 1)
+        category_id = Category.objects.values_list('id', flat=True).first()
+        entries = TimeEntry.objects.select_related(None)
+
+        def legacy_range(queryset):
+            return queryset.filter(start_at__date__gte=from_day, start_at__date__lte=to_day)
+
+        def current_range(queryset):
+            return ranges.filter_range(queryset, from_day, to_day)
+
+        patterns = [
+            (
+                'período (listagem)',
+                lambda: legacy_range(entries)[:50],
+                lambda: current_range(entries)[:50],
+            ),
+            (
+                'categoria + período',
+                lambda: legacy_range(entries.filter(category_id=category_id))[:50],
+                lambda: current_range(entries.filter(category_id=category_id))[:50],
+            ),
+            (
+                'timer em execução',
+                lambda: entries.filter(end_at__isnull=True)[:1],
+                lambda: entries.filter(end_at__isnull=True).order_by()[:1],
+            ),
+            (
+                'finalizadas da categoria por fim',
+                lambda: entries.filter(category_id=category_id, end_at__isnull=False).order_by('-end_at')[:10],
+                lambda: entries.filter(category_id=category_id, end_at__isnull=False).order_by('-end_at')[:10],
+            ),
+        ]
+
+        self.stdout.write(f'{entries.count()} entradas, período {from_day} a {to_day}, {options["runs"]} execuções')
+        self.stdout.write('antes sem os índices ' + '; '.join(
+            f'{", ".join(names)} ({migration})' for migration, names in ENTRY_INDEXES.items()
+        ) + '\n')
+        before = self._measure([legacy for _name, legacy, _current in patterns], options['runs'], drop_indexes=True)
+        after = self._measure([current for _name, _legacy, current in patterns], options['runs'])
+
+        for (name, _legacy, _current), (plan_before, ms_before), (plan_after, ms_after) in zip(patterns, before, after):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f'  antes  {ms_before:8.3f} ms')
+            self.stdout.write(self._indent(plan_before))
+            self.stdout.write(f'  depois {ms_after:8.3f} ms')
+            self.stdout.write(self._indent(plan_after))
+
+    def _measure(self, queries, runs, drop_indexes=False):
+        """(plano, mediana em ms) de cada consulta; os índices removidos voltam no rollback"""
+        results = []
+        with transaction.atomic():
+            if drop_indexes:
+                with connection.cursor() as cursor:
+                    for name in (name for names in ENTRY_INDEXES.values() for name in names):
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+            for build in queries:
+                plan = build().explain()
+                timings = []
+                for _run in range(runs):
+                    started = time.perf_counter()
+                    list(build())
+                    timings.append((time.perf_counter() - started) * 1000)
+                results.append((plan, statistics.median(timings)))
+            transaction.set_rollback(True)
+        return results
+
+    def _indent(self, plan):
+        return '\n'.join(f'    {line}' for line in plan.splitlines())
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core import columnar
+
+
+class Command(BaseCommand):
+    help = 'Exporta tags, categorias, tasks e entradas em arquivos Parquet ou Arrow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Diretório de saída')
+        parser.add_argument('--file-format', choices=sorted(columnar.FILE_FORMATS), default='parquet')
+
+    def handle(self, *args, **options):
+        counts = columnar.export_all(options['directory'], options['file_format'])
+        for table, total in counts.items():
+            self.stdout.write(f'{table}: {total} linhas')
+        self.stdout.write(self.style.SUCCESS('Exportação concluída.'))
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera um histórico sintético grande (árvore de categorias profunda, tasks, tags e entradas '
+        'finalizadas com distribuições realistas) para testes de escala e para run_benchmarks'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=100000, help='Entradas finalizadas geradas')
+        parser.add_argument('--roots', type=int, default=4, help='Categorias raiz')
+        parser.add_argument('--branching', type=int, default=3, help='Filhas por categoria')
+        parser.add_argument('--depth', type=int, default=4, help='Níveis da árvore de categorias')
+        parser.add_argument('--tags', type=int, default=30, help='Tags criadas')
+        parser.add_argument('--tasks-per-category', type=int, default=3, help='Tasks em cada categoria folha')
+        parser.add_argument('--days', type=int, default=730, help='Dias de histórico, terminando ontem')
+        parser.add_argument('--seed', type=int, default=0, help='Semente do gerador aleatório')
+        parser.add_argument('--replace', action='store_true', help='Apaga os dados atuais antes de gerar')
+
+    def handle(self, *args, **options):
+        if options['roots'] < 1 or options['depth'] < 1 or options['days'] < 1:
+            raise CommandError('--roots, --depth e --days devem ser maiores que zero')
+
+        started = time.perf_counter()
+
+        def progress(done, total):
+            self.stdout.write(f'{done}/{total} entradas', ending='\r')
+            self.stdout.flush()
+
+        try:
+            counts = synthetic.generate(
+                entries=options['entries'],
+                roots=options['roots'],
+                branching=options['branching'],
+                depth=options['depth'],
+                tags=options['tags'],
+                tasks_per_category=options['tasks_per_category'],
+                days=options['days'],
+                seed=options['seed'],
+                replace=options['replace'],
+                progress=progress,
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write('')
+        for table, total in counts.items():
+            self.stdout.write(f'{table}: {total} linhas')
+        self.stdout.write(self.style.SUCCESS(f'Histórico gerado em {time.perf_counter() - started:.1f}s.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import columnar
+
+
+class Command(BaseCommand):
+    help = 'Importa em massa os arquivos gerados por export_columnar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Diretório com os arquivos .parquet ou .arrow')
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Apaga os dados atuais antes de importar',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            counts = columnar.import_all(options['directory'], replace=options['replace'])
+        except (FileNotFoundError, ValueError) as error:
+            raise CommandError(str(error))
+        for table, total in counts.items():
+            self.stdout.write(f'{table}: {total} linhas')
+        self.stdout.write(self.style.SUCCESS('Importação concluída.'))
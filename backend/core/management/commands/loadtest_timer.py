@@ -0,0 +1,225 @@
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.client import HTTPConnection
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SERVERS = {
+    'wsgi': lambda port: [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}'],
+    'asgi': lambda port: [
+        sys.executable, '-m', 'uvicorn', 'timetracker.asgi:application',
+        '--port', str(port), '--log-level', 'warning',
+    ],
+}
+# Variáveis de ambiente de cada perfil de banco (ver DB_ENGINE em settings)
+PROFILES = {
+    'sqlite': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_TUNED': 'False'},
+    'sqlite-tuned': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_TUNED': 'True'},
+    'postgresql': {'DB_ENGINE': 'postgresql'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga dos endpoints do timer (e do envio de lotes do /api/sync/): sobe o servidor WSGI '
+        '(runserver) e o ASGI (uvicorn) em cada perfil de banco, sempre com um banco limpo, e compara '
+        'requisições/s, latências e erros'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requisições por servidor')
+        parser.add_argument('--concurrency', type=int, default=32, help='Clientes simultâneos')
+        parser.add_argument(
+            '--scenario', choices=['running', 'timer', 'sync'], default='running',
+            help='running: só GET running/; timer: ciclos start_timer/running/stop_timer; '
+                 'sync: lotes POST sync/ (tag e entrada novas) e GET sync/, que mostram a fila de escritas '
+                 'do log de sincronização no PostgreSQL',
+        )
+        parser.add_argument('--servers', default='wsgi,asgi', help='Servidores testados, separados por vírgula')
+        parser.add_argument(
+            '--profiles', default='sqlite,sqlite-tuned',
+            help='Perfis de banco testados, separados por vírgula: ' + ', '.join(PROFILES),
+        )
+        parser.add_argument(
+            '--pg-database',
+            help='Banco PostgreSQL descartável do perfil postgresql (é esvaziado a cada rodada); '
+                 'conexão pelas variáveis DB_USER, DB_PASSWORD, DB_HOST e DB_PORT',
+        )
+        parser.add_argument('--port', type=int, default=8765, help='Porta usada pelos servidores')
+
+    def handle(self, *args, **options):
+        servers = [name.strip() for name in options['servers'].split(',') if name.strip()]
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f'Servidores desconhecidos: {", ".join(sorted(unknown))}')
+        profiles = [name.strip() for name in options['profiles'].split(',') if name.strip()]
+        unknown = set(profiles) - set(PROFILES)
+        if unknown:
+            raise CommandError(f'Perfis desconhecidos: {", ".join(sorted(unknown))}')
+        if 'postgresql' in profiles and not options['pg_database']:
+            raise CommandError('O perfil postgresql precisa de --pg-database')
+
+        workdir = Path(tempfile.mkdtemp(prefix='loadtest-'))
+        try:
+            template = workdir / 'template.sqlite3'
+            if any(profile != 'postgresql' for profile in profiles):
+                self._run_manage(['migrate', '--verbosity', '0'], 'sqlite', template)
+            self.stdout.write(
+                f'{options["requests"]} requisições, {options["concurrency"]} clientes, cenário {options["scenario"]}\n'
+            )
+            self.stdout.write(
+                f'{"perfil":<13} {"servidor":<8} {"req/s":>9} {"escritas/s":>10} '
+                f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"erros":>6}'
+            )
+            for profile in profiles:
+                for name in servers:
+                    if profile == 'postgresql':
+                        database = options['pg_database']
+                        self._run_manage(['migrate', '--verbosity', '0'], profile, database)
+                        self._run_manage(['flush', '--no-input', '--verbosity', '0'], profile, database)
+                    else:
+                        database = workdir / f'{profile}-{name}.sqlite3'
+                        shutil.copy(template, database)
+                    result = self._bench(name, profile, database, options)
+                    self.stdout.write(
+                        f'{profile:<13} {name:<8} {result["rps"]:>9.1f} {result["wps"]:>10.1f} {result["p50"]:>8.2f} '
+                        f'{result["p95"]:>8.2f} {result["p99"]:>8.2f} {result["errors"]:>6}'
+                    )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _env(self, profile, database):
+        return {
+            **os.environ, **PROFILES[profile],
+            'DB_NAME': str(database), 'DEBUG': 'False', 'PYTHONUNBUFFERED': '1',
+        }
+
+    def _run_manage(self, arguments, profile, database):
+        subprocess.run(
+            [sys.executable, 'manage.py', *arguments],
+            cwd=settings.BASE_DIR, env=self._env(profile, database), check=True,
+        )
+
+    def _bench(self, name, profile, database, options):
+        port = options['port']
+        process = subprocess.Popen(
+            SERVERS[name](port), cwd=settings.BASE_DIR, env=self._env(profile, database),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self._wait_ready(port, process)
+            status, body = _request(port, 'POST', '/api/categories/', {'name': 'Carga'})
+            if status != 201:
+                raise CommandError(f'{name}: não foi possível criar a categoria ({status})')
+            category_id = body['id']
+
+            workload = {'running': _running_cycle, 'timer': _timer_cycle, 'sync': _sync_cycle}[options['scenario']]
+            # Aquecimento (conexões com o banco, imports tardios)
+            for _index in range(10):
+                workload(port, category_id)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                results = list(executor.map(
+                    lambda _index: workload(port, category_id), range(options['requests'])
+                ))
+            elapsed = time.perf_counter() - started
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+        latencies = sorted(latency for cycle in results for latency, _status, _write in cycle)
+        # 4xx conta como sucesso: timers concorrentes se param entre si
+        errors = sum(1 for cycle in results for _latency, status, _write in cycle if status >= 500)
+        writes = sum(1 for cycle in results for _latency, status, write in cycle if write and status < 300)
+        quantiles = statistics.quantiles(latencies, n=100)
+        return {
+            'rps': len(latencies) / elapsed,
+            'wps': writes / elapsed,
+            'p50': quantiles[49],
+            'p95': quantiles[94],
+            'p99': quantiles[98],
+            'errors': errors,
+        }
+
+    def _wait_ready(self, port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'O servidor na porta {port} encerrou ao iniciar')
+            try:
+                _request(port, 'GET', '/api/entries/running/')
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'O servidor na porta {port} não respondeu em {timeout}s')
+
+
+def _request(port, method, path, payload=None):
+    connection = HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body else {}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        is_json = response.getheader('Content-Type', '').startswith('application/json')
+        return response.status, json.loads(data) if data and is_json else None
+    finally:
+        connection.close()
+
+
+def _timed(port, method, path, payload=None):
+    """(latência em ms, status, corpo); falha de conexão vira 599"""
+    started = time.perf_counter()
+    try:
+        status, body = _request(port, method, path, payload)
+    except OSError:
+        status, body = 599, None
+    return (time.perf_counter() - started) * 1000, status, body
+
+
+def _running_cycle(port, category_id):
+    latency, status, _body = _timed(port, 'GET', '/api/entries/running/')
+    return [(latency, status, False)]
+
+
+def _timer_cycle(port, category_id):
+    """[(latência, status, é escrita)] de um ciclo start_timer, running e stop_timer"""
+    results = []
+    latency, status, entry = _timed(port, 'POST', '/api/entries/start_timer/', {'category_id': category_id})
+    results.append((latency, status, True))
+    latency, status, _body = _timed(port, 'GET', '/api/entries/running/')
+    results.append((latency, status, False))
+    if entry and 'id' in entry:
+        latency, status, _body = _timed(port, 'POST', '/api/entries/stop_timer/', {'entry_id': entry['id']})
+        results.append((latency, status, True))
+    return results
+
+
+def _sync_cycle(port, category_id):
+    """[(latência, status, é escrita)] de um lote do cliente offline (tag e entrada finalizada) e uma leitura do log"""
+    end_at = datetime.now(timezone.utc)
+    mutations = [
+        {'op': 'create', 'model': 'tag', 'client_id': 'tag', 'data': {'name': f'carga-{uuid.uuid4().hex[:12]}'}},
+        {'op': 'create', 'model': 'entry', 'data': {
+            'category': category_id, 'start_at': (end_at - timedelta(minutes=5)).isoformat(),
+            'end_at': end_at.isoformat(), 'tags': ['tag'],
+        }},
+    ]
+    latency, status, _body = _timed(port, 'POST', '/api/sync/', {'mutations': mutations})
+    results = [(latency, status, True)]
+    latency, status, _body = _timed(port, 'GET', '/api/sync/?since=0&limit=100')
+    results.append((latency, status, False))
+    return results
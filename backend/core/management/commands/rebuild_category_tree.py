@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import hierarchy
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói a closure table de categorias e corrige caminhos desatualizados'
+
+    def handle(self, *args, **options):
+        total = hierarchy.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{total} categorias indexadas.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import buckets
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói os baldes diários usados pelo dashboard'
+
+    def handle(self, *args, **options):
+        total = buckets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{total} baldes diários reconstruídos.'))
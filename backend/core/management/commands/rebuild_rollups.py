@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói os rollups de duração por subárvore de categoria'
+
+    def handle(self, *args, **options):
+        total = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'{total} rollups de categoria reconstruídos.'))
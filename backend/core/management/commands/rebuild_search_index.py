@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói em lotes o índice de busca textual (notas das entradas, nome e descrição das tasks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.BATCH_SIZE, help='Entradas por lote')
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f'{done}/{total} entradas', ending='\r')
+            self.stdout.flush()
+
+        total = search.rebuild(batch_size=max(1, options['batch_size']), progress=progress)
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f'{total} documentos indexados.'))
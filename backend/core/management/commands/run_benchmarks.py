@@ -0,0 +1,220 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import analytics, exporters, hierarchy, ranges, results, versioning
+from core.models import TimeEntry
+
+# Máximo de consultas SQL por requisição, sem as partes proporcionais abaixo.
+# Nenhum orçamento depende do tamanho do histórico: um aumento é um N+1 novo.
+QUERY_BUDGETS = {
+    'tree': 1,
+    # Página, tags e um único lote de agregados do speedrun_dynamic (mais o COUNT na paginação por página)
+    'entries': 4,
+    'entries_cursor': 3,
+    # COUNT, página com .values() e tags, categorias e tasks da página
+    'entries_compact': 5,
+    'stats_summary': 3,
+    'top_tasks': 1,
+    'export_csv': 1,
+    'stop_timer': 20,
+    # Janela em memória já atualizada: nenhuma consulta
+    'analytics': 0,
+    # Cursor do core_changelog, entradas finalizadas e vínculos com tags
+    'analytics_cold': 3,
+    # Cursor, entradas alteradas no core_changelog, as próprias entradas e suas tags
+    'analytics_write': 4,
+}
+# As tags são lidas uma vez por bloco de exporters.CHUNK_SIZE entradas
+PER_EXPORT_CHUNK = 1
+# Rollups e índice do speedrun são atualizados em cada ancestral da categoria
+PER_STOP_ANCESTOR = 3
+EXPORT_DAYS = 30
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede as requisições principais da API (árvore, listagem com speedrun_dynamic e compacta, stats_summary, '
+        'top_tasks, export_csv, stop_timer e analytics quente, fria e depois de uma escrita) no banco atual, confere os orçamentos de consultas SQL e '
+        'compara as latências com a linha de base gravada; falha se houver regressão'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20, help='Execuções medidas por cenário')
+        parser.add_argument('--warmup', type=int, default=2, help='Execuções descartadas antes da medição')
+        parser.add_argument(
+            '--baseline', default=str(Path(settings.BASE_DIR) / 'benchmark_baseline.json'),
+            help='Arquivo JSON com as latências de referência',
+        )
+        parser.add_argument('--record', action='store_true', help='Grava as latências medidas como nova linha de base')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help='Aumento relativo da mediana aceito em relação à linha de base (0.5 = 50%%)',
+        )
+        parser.add_argument('--only', default='', help='Cenários a executar, separados por vírgula')
+
+    def handle(self, *args, **options):
+        entry_count = TimeEntry.objects.count()
+        if not entry_count:
+            raise CommandError('O banco não tem entradas; gere um histórico com generate_history')
+
+        scenarios, budgets = self._scenarios()
+        selected = [name.strip() for name in options['only'].split(',') if name.strip()] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(f'Cenários desconhecidos: {", ".join(sorted(unknown))}')
+
+        baseline_path = Path(options['baseline'])
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        if baseline and not options['record'] and baseline.get('entries') != entry_count:
+            self.stdout.write(self.style.WARNING(
+                f'Linha de base gravada com {baseline.get("entries")} entradas; o banco tem {entry_count}'
+            ))
+
+        self.stdout.write(f'{entry_count} entradas, {options["runs"]} execuções por cenário\n')
+        self.stdout.write(
+            f'{"cenário":<16} {"consultas":>10} {"p50 ms":>9} {"p95 ms":>9} {"base ms":>9}  situação'
+        )
+        results = {}
+        failures = []
+        for name in selected:
+            result = self._measure(scenarios[name], options['warmup'], options['runs'])
+            results[name] = result
+            problems = []
+            budget = budgets[name]
+            if result['queries'] > budget:
+                problems.append(f'{result["queries"]} consultas (orçamento {budget})')
+            reference = baseline.get('scenarios', {}).get(name)
+            # Folga absoluta de 2 ms para cenários rápidos, em que o ruído domina
+            if reference and not options['record'] and (
+                result['p50_ms'] > reference['p50_ms'] * (1 + options['tolerance']) + 2
+            ):
+                problems.append(f'p50 {result["p50_ms"]:.1f} ms (base {reference["p50_ms"]:.1f} ms)')
+            failures.extend(f'{name}: {problem}' for problem in problems)
+
+            self.stdout.write(
+                f'{name:<16} {result["queries"]:>4} / {budget:<3} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+                f'{reference["p50_ms"] if reference else "-":>9}  '
+                + (self.style.ERROR('REGRESSÃO') if problems else self.style.SUCCESS('ok'))
+            )
+
+        if options['record']:
+            recorded = baseline.get('scenarios', {}) if baseline.get('entries') == entry_count else {}
+            recorded.update({name: {'p50_ms': round(result['p50_ms'], 2)} for name, result in results.items()})
+            baseline_path.write_text(json.dumps({'entries': entry_count, 'scenarios': recorded}, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Linha de base gravada em {baseline_path}'))
+
+        if failures:
+            raise CommandError('Regressões encontradas:\n' + '\n'.join(failures))
+
+    def _measure(self, scenario, warmup, runs):
+        for _index in range(warmup):
+            scenario()
+        timings = []
+        queries = 0
+        for _index in range(runs):
+            elapsed, count = scenario()
+            timings.append(elapsed * 1000)
+            queries = max(queries, count)
+        timings.sort()
+        return {
+            'queries': queries,
+            'p50_ms': statistics.median(timings),
+            'p95_ms': timings[min(len(timings) - 1, round(0.95 * len(timings)) - 1)],
+        }
+
+    def _scenarios(self):
+        """(cenário -> função que faz uma requisição e devolve (segundos, consultas), orçamentos)"""
+        client = Client(SERVER_NAME='localhost')
+        export_day = timezone.localdate() - timedelta(days=EXPORT_DAYS)
+        # Categoria mais profunda com entradas: o pior caso do stop_timer
+        category_id = max(
+            set(TimeEntry.objects.values_list('category_id', flat=True)[:1000]),
+            key=lambda pk: len(hierarchy.ancestor_ids(pk)),
+        )
+
+        export_rows = ranges.filter_range(TimeEntry.objects.all(), export_day, None).count()
+        export_chunks = -(-export_rows // exporters.CHUNK_SIZE)
+        budgets = dict(QUERY_BUDGETS)
+        budgets['export_csv'] += PER_EXPORT_CHUNK * export_chunks
+        budgets['stop_timer'] += PER_STOP_ANCESTOR * len(hierarchy.ancestor_ids(category_id))
+
+        def request(method, path, data=None, before=None):
+            def run():
+                if before is not None:
+                    before()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    if method == 'post':
+                        response = client.post(path, data, content_type='application/json')
+                    else:
+                        response = client.get(path, data)
+                    if response.streaming:
+                        for _chunk in response.streaming_content:
+                            pass
+                    elapsed = time.perf_counter() - started
+                if response.status_code >= 400:
+                    raise CommandError(f'{path} respondeu {response.status_code}')
+                return elapsed, len(captured)
+            return run
+
+        def clear_tree_cache():
+            # Mede a montagem da árvore, não o acerto no cache
+            cache.delete(f'category_tree:{versioning.get_version("categories")}')
+
+        def clear_results_cache():
+            # Mede as agregações, não o acerto no cache de resultados
+            caches[results.CACHE_ALIAS].clear()
+
+        def clear_analytics_window():
+            # Mede a leitura completa da janela, não a janela em memória
+            analytics._cache.clear()
+
+        write_entry_id = TimeEntry.objects.filter(end_at__isnull=False).order_by('-start_at').values_list(
+            'id', flat=True
+        ).first()
+        write_count = [0]
+
+        def write_entry():
+            # Uma edição pela API antes de cada execução: a janela aplica só essa entrada
+            write_count[0] += 1
+            response = client.patch(
+                f'/api/entries/{write_entry_id}/', {'note': f'benchmark {write_count[0]}'},
+                content_type='application/json',
+            )
+            if response.status_code >= 400:
+                raise CommandError(f'/api/entries/{write_entry_id}/ respondeu {response.status_code}')
+
+        def stop_timer():
+            # Cada execução para uma entrada nova e desfaz tudo no final
+            with transaction.atomic():
+                entry = TimeEntry.objects.create(
+                    category_id=category_id, start_at=timezone.now() - timedelta(minutes=30)
+                )
+                result = request('post', '/api/entries/stop_timer/', {'entry_id': entry.id})()
+                transaction.set_rollback(True)
+            return result
+
+        return {
+            'tree': request('get', '/api/categories/tree/', before=clear_tree_cache),
+            'entries': request('get', '/api/entries/'),
+            'entries_cursor': request('get', '/api/entries/', {'pagination': 'cursor'}),
+            'entries_compact': request('get', '/api/entries/', {'view': 'compact'}),
+            'stats_summary': request('get', '/api/entries/stats_summary/', before=clear_results_cache),
+            'top_tasks': request('get', '/api/entries/top_tasks/', before=clear_results_cache),
+            'export_csv': request('get', '/api/entries/export_csv/', {'from': export_day.isoformat()}),
+            'stop_timer': stop_timer,
+            'analytics': request('get', '/api/analytics/percentiles/'),
+            'analytics_cold': request('get', '/api/analytics/percentiles/', before=clear_analytics_window),
+            'analytics_write': request('get', '/api/analytics/percentiles/', before=write_entry),
+        }, budgets
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs, speedrun
+
+
+class Command(BaseCommand):
+    help = (
+        'Processa a fila de trabalhos gravada no banco (snapshots de speedrun pendentes). '
+        "Use com BACKGROUND_JOBS='db'; pode rodar em vários processos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Esvazia a fila e encerra')
+        parser.add_argument('--interval', type=float, default=1.0, help='Espera entre consultas à fila vazia (s)')
+        parser.add_argument(
+            '--failed', action='store_true', help='Lista os trabalhos que esgotaram as tentativas e encerra'
+        )
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Devolve à fila os trabalhos que esgotaram as tentativas e encerra',
+        )
+
+    def handle(self, *args, **options):
+        if options['failed']:
+            failed = speedrun.failed_snapshot_jobs()
+            for job in failed:
+                self.stdout.write(f'entrada {job.entry_id}: {job.attempts} tentativas, {job.last_error}')
+            self.stdout.write(f'{len(failed)} trabalhos esgotados.')
+            return
+        if options['retry_failed']:
+            retried = speedrun.retry_failed_snapshots()
+            self.stdout.write(self.style.SUCCESS(
+                f'{retried} trabalhos devolvidos à fila (processados pelo run_jobs ou, '
+                "com BACKGROUND_JOBS='thread', quando o servidor iniciar)."
+            ))
+            return
+        # O snapshot muda a versão dos dados; num cache local ao processo o servidor não veria a mudança
+        if settings.VERSIONS_CACHE_BACKEND == 'locmem':
+            raise CommandError(
+                'run_jobs roda em outro processo que o servidor: use VERSIONS_CACHE_BACKEND file ou redis'
+            )
+
+        processed = jobs.run_pending(
+            speedrun.pending_snapshot_ids, speedrun.compute_snapshot,
+            once=options['once'], interval=options['interval'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{processed} trabalhos processados.'))
@@ -0,0 +1,246 @@
+"""Métricas por requisição: consultas SQL, tempo no banco, de serialização e de renderização.
+
+Com `settings.REQUEST_METRICS` ligado, `RequestMetricsMiddleware` mede cada
+requisição e devolve os tempos no cabeçalho `Server-Timing` (visível na aba
+de rede do navegador). As amostras das últimas `REQUEST_METRICS_WINDOW`
+requisições de cada rota ficam na memória do processo e `/api/_metrics`
+as publica no formato texto do Prometheus (p50/p95/p99 por rota).
+
+A serialização é o `.data` dos serializers do DRF (`TimedDataMixin`) e os
+blocos que montam a resposta à mão (`serializing()`), sem o tempo das
+consultas SQL feitas no meio, que já contam em `db`; a renderização é o
+`JSONRenderer`.
+
+Desligado, o middleware se remove da pilha (`MiddlewareNotUsed`) e o wrapper
+de consultas não é instalado; sobra só um `ContextVar.get()` na serialização
+e no renderer.
+
+O coletor da requisição fica num `ContextVar`, que o asgiref copia para as
+threads do `sync_to_async`: consultas das views assíncronas também contam.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import renderers
+
+QUANTILES = (0.5, 0.95, 0.99)
+# (nome da métrica, campo da amostra, descrição)
+SERIES = (
+    ('felixo_request_duration_seconds', 'total', 'Tempo total da requisição'),
+    ('felixo_request_db_seconds', 'db', 'Tempo gasto em consultas SQL'),
+    ('felixo_request_serialize_seconds', 'serialize', 'Tempo de serialização dos dados (sem as consultas SQL)'),
+    ('felixo_request_render_seconds', 'render', 'Tempo de renderização do JSON da resposta'),
+    ('felixo_request_queries', 'queries', 'Consultas SQL por requisição'),
+)
+
+_collector = ContextVar('request_metrics', default=None)
+
+
+class Collector:
+    __slots__ = ('queries', 'db', 'serialize', 'render', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.serializing = False
+
+
+def _query_timer(execute, sql, params, many, context):
+    collector = _collector.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        collector.db += time.perf_counter() - started
+        collector.queries += 1
+
+
+def _install_query_timer(connection, **kwargs):
+    if _query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_timer)
+
+
+class RouteStats:
+    """Janela das últimas amostras e totais acumulados de uma rota"""
+
+    def __init__(self, window):
+        self.samples = {field: deque(maxlen=window) for _name, field, _help in SERIES}
+        self.sums = {field: 0.0 for _name, field, _help in SERIES}
+        self.count = 0
+
+    def add(self, sample):
+        for field, value in sample.items():
+            self.samples[field].append(value)
+            self.sums[field] += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self, window):
+        self.window = window
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, route, sample):
+        with self._lock:
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = RouteStats(self.window)
+            stats.add(sample)
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def snapshot(self):
+        """{(método, rota): (contagem, somas, amostras ordenadas)} para o relatório"""
+        with self._lock:
+            return {
+                key: (stats.count, dict(stats.sums), {field: sorted(values) for field, values in stats.samples.items()})
+                for key, stats in self._routes.items()
+            }
+
+
+registry = Registry(settings.REQUEST_METRICS_WINDOW)
+
+
+def _quantile(values, q):
+    """Quantil pelo posto mais próximo de uma lista já ordenada"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """Texto no formato de exposição do Prometheus (summary por rota e método)"""
+    snapshot = sorted(registry.snapshot().items())
+    lines = []
+    for name, field, description in SERIES:
+        lines.append(f'# HELP {name} {description} (quantis das últimas {registry.window} requisições)')
+        lines.append(f'# TYPE {name} summary')
+        for (method, route), (count, sums, samples) in snapshot:
+            labels = f'route="{_label(route)}",method="{_label(method)}"'
+            for q in QUANTILES:
+                lines.append(f'{name}{{{labels},quantile="{q}"}} {_quantile(samples[field], q):.6g}')
+            lines.append(f'{name}_sum{{{labels}}} {sums[field]:.6g}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None and match.view_name else 'unmatched'
+
+
+def _server_timing(collector, total):
+    app = max(0.0, total - collector.db - collector.serialize - collector.render)
+    return (
+        f'db;dur={collector.db * 1000:.1f};desc="{collector.queries} consultas", '
+        f'serialize;dur={collector.serialize * 1000:.1f}, render;dur={collector.render * 1000:.1f}, '
+        f'app;dur={app * 1000:.1f}, total;dur={total * 1000:.1f}'
+    )
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        connection_created.connect(_install_query_timer, dispatch_uid='core.metrics.query_timer')
+        for connection in connections.all(initialized_only=True):
+            _install_query_timer(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        collector, token, started = self._begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            _collector.reset(token)
+        return self._finish(request, response, collector, started)
+
+    async def _acall(self, request):
+        collector, token, started = self._begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _collector.reset(token)
+        return self._finish(request, response, collector, started)
+
+    def _begin(self):
+        collector = Collector()
+        return collector, _collector.set(collector), time.perf_counter()
+
+    def _finish(self, request, response, collector, started):
+        # Em respostas em streaming (SSE, exportações) o tempo vai até os cabeçalhos
+        total = time.perf_counter() - started
+        response['Server-Timing'] = _server_timing(collector, total)
+        registry.record(request.method, _route(request), {
+            'total': total, 'db': collector.db, 'serialize': collector.serialize, 'render': collector.render,
+            'queries': collector.queries,
+        })
+        return response
+
+
+@contextmanager
+def serializing():
+    """Soma o tempo do bloco à serialização da requisição, sem as consultas SQL dele.
+
+    Blocos aninhados (serializers dentro de serializers) contam uma vez só.
+    """
+    collector = _collector.get()
+    if collector is None or collector.serializing:
+        yield
+        return
+    collector.serializing = True
+    started, db = time.perf_counter(), collector.db
+    try:
+        yield
+    finally:
+        collector.serializing = False
+        collector.serialize += time.perf_counter() - started - (collector.db - db)
+
+
+class TimedDataMixin:
+    """Mede o `.data` de um serializer (ou ListSerializer) do DRF"""
+
+    @property
+    def data(self):
+        with serializing():
+            return super().data
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer do DRF que soma seu tempo ao coletor da requisição"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        collector = _collector.get()
+        if collector is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            collector.render += time.perf_counter() - started
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:57
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum
+import django.db.models.deletion
+
+
+# Cópia congelada do código da época: mudanças posteriores nos módulos de
+# core não alteram o que esta migração faz.
+
+
+def _ancestor_map(rows):
+    """{id: [ids das ancestrais, da raiz até a própria]} a partir de pares (id, parent_id)"""
+    parents = dict(rows)
+    chains = {}
+    for category_id in parents:
+        chain = []
+        current = category_id
+        while current is not None and current not in chain:
+            chain.append(current)
+            current = parents.get(current)
+        chains[category_id] = chain[::-1]
+    return chains
+
+
+def _rebuild_rollups(apps):
+    """Rollups de cada subárvore com uma agregação agrupada por categoria"""
+    Category = apps.get_model('core', 'Category')
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    CategoryRollup = apps.get_model('core', 'CategoryRollup')
+
+    finished = TimeEntry.objects.filter(end_at__isnull=False)
+    own_stats = {
+        row['category_id']: row
+        for row in finished.values('category_id').order_by().annotate(
+            entry_count=Count('id'),
+            total_seconds=Sum('duration_seconds'),
+            min_seconds=Min('duration_seconds'),
+            max_seconds=Max('duration_seconds'),
+            sum_squares=Sum(F('duration_seconds') * F('duration_seconds')),
+        )
+    }
+    first_entries = finished.filter(category_id=OuterRef('pk')).order_by('end_at', 'id')
+    categories = list(
+        Category.objects.annotate(
+            first_entry_id=Subquery(first_entries.values('id')[:1]),
+            first_end_at=Subquery(first_entries.values('end_at')[:1]),
+        ).values('id', 'parent_id', 'first_entry_id', 'first_end_at')
+    )
+    chains = _ancestor_map((category['id'], category['parent_id']) for category in categories)
+
+    totals = {}
+    for category in categories:
+        own = own_stats.get(category['id'])
+        if not own:
+            continue
+        for target_id in chains[category['id']]:
+            total = totals.get(target_id)
+            if total is None:
+                totals[target_id] = {
+                    **{key: own[key] for key in ('entry_count', 'total_seconds', 'min_seconds', 'max_seconds', 'sum_squares')},
+                    'first_entry_id': category['first_entry_id'],
+                    'first_end_at': category['first_end_at'],
+                }
+                continue
+            total['entry_count'] += own['entry_count']
+            total['total_seconds'] += own['total_seconds']
+            total['sum_squares'] += own['sum_squares']
+            total['min_seconds'] = min(total['min_seconds'], own['min_seconds'])
+            total['max_seconds'] = max(total['max_seconds'], own['max_seconds'])
+            candidate = (category['first_end_at'], category['first_entry_id'])
+            if candidate < (total['first_end_at'], total['first_entry_id']):
+                total['first_end_at'], total['first_entry_id'] = candidate
+
+    CategoryRollup.objects.all().delete()
+    CategoryRollup.objects.bulk_create(
+        [CategoryRollup(category_id=pk, **values) for pk, values in totals.items()], batch_size=500,
+    )
+
+
+def populate_rollups(apps, schema_editor):
+    _rebuild_rollups(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRollup',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='core.category')),
+                ('entry_count', models.IntegerField(default=0)),
+                ('total_seconds', models.BigIntegerField(default=0)),
+                ('min_seconds', models.IntegerField(default=0)),
+                ('max_seconds', models.IntegerField(default=0)),
+                ('sum_squares', models.BigIntegerField(default=0)),
+                ('first_entry_id', models.BigIntegerField(blank=True, null=True)),
+                ('first_end_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
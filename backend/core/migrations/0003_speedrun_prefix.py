@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Cópia congelada do código da época: mudanças posteriores nos módulos de
+# core não alteram o que esta migração faz.
+BATCH_SIZE = 2000
+
+
+def _ancestor_map(rows):
+    """{id: [ids das ancestrais, da raiz até a própria]} a partir de pares (id, parent_id)"""
+    parents = dict(rows)
+    chains = {}
+    for category_id in parents:
+        chain = []
+        current = category_id
+        while current is not None and current not in chain:
+            chain.append(current)
+            current = parents.get(current)
+        chains[category_id] = chain[::-1]
+    return chains
+
+
+def _rebuild_prefixes(apps):
+    """Índice do speedrun: prefixos acumulados de cada ancestral, em ordem de end_at"""
+    Category = apps.get_model('core', 'Category')
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    SpeedrunPrefix = apps.get_model('core', 'SpeedrunPrefix')
+
+    ancestors = _ancestor_map(Category.objects.values_list('id', 'parent_id'))
+    running = {}  # category_id -> [count, seconds, min]
+    batch = []
+    entries = (
+        TimeEntry.objects.filter(end_at__isnull=False)
+        .order_by('end_at', 'id')
+        .values_list('id', 'category_id', 'end_at', 'duration_seconds')
+    )
+    SpeedrunPrefix.objects.all().delete()
+    for entry_id, category_id, end_at, seconds in entries.iterator(chunk_size=BATCH_SIZE):
+        for ancestor_id in ancestors.get(category_id, []):
+            state = running.setdefault(ancestor_id, [0, 0, seconds])
+            state[0] += 1
+            state[1] += seconds
+            state[2] = min(state[2], seconds)
+            batch.append(SpeedrunPrefix(
+                category_id=ancestor_id, entry_id=entry_id, end_at=end_at,
+                duration_seconds=seconds, cum_count=state[0], cum_seconds=state[1], cum_min=state[2],
+            ))
+        if len(batch) >= BATCH_SIZE:
+            SpeedrunPrefix.objects.bulk_create(batch)
+            batch = []
+    SpeedrunPrefix.objects.bulk_create(batch)
+
+
+def populate_index(apps, schema_editor):
+    _rebuild_prefixes(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_category_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpeedrunPrefix',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_id', models.BigIntegerField()),
+                ('end_at', models.DateTimeField()),
+                ('duration_seconds', models.IntegerField()),
+                ('cum_count', models.IntegerField()),
+                ('cum_seconds', models.BigIntegerField()),
+                ('cum_min', models.IntegerField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['entry_id'], name='speedrun_prefix_entry')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='speedrunprefix',
+            constraint=models.UniqueConstraint(fields=('category', 'end_at', 'entry_id'), name='speedrun_prefix_order'),
+        ),
+        migrations.RunPython(populate_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Cópia congelada do código da época: mudanças posteriores nos módulos de
+# core não alteram o que esta migração faz.
+
+
+def _ancestor_map(rows):
+    """{id: [ids das ancestrais, da raiz até a própria]} a partir de pares (id, parent_id)"""
+    parents = dict(rows)
+    chains = {}
+    for category_id in parents:
+        chain = []
+        current = category_id
+        while current is not None and current not in chain:
+            chain.append(current)
+            current = parents.get(current)
+        chains[category_id] = chain[::-1]
+    return chains
+
+
+def _rebuild_closure(apps):
+    """Closure table e caminhos a partir de `parent`"""
+    Category = apps.get_model('core', 'Category')
+    CategoryClosure = apps.get_model('core', 'CategoryClosure')
+
+    categories = {row['id']: row for row in Category.objects.values('id', 'parent_id', 'name', 'path')}
+    chains = _ancestor_map((pk, row['parent_id']) for pk, row in categories.items())
+
+    links = []
+    stale = []
+    for category_id, chain in chains.items():
+        depth = len(chain) - 1
+        for position, ancestor_id in enumerate(chain):
+            links.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth - position))
+        path = ''.join(f"/{categories[pk]['name']}" for pk in chain)
+        if path != categories[category_id]['path']:
+            stale.append(Category(id=category_id, path=path))
+
+    CategoryClosure.objects.all().delete()
+    CategoryClosure.objects.bulk_create(links, batch_size=1000)
+    Category.objects.bulk_update(stale, ['path'], batch_size=500)
+
+
+def populate_closure(apps, schema_editor):
+    _rebuild_closure(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_speedrun_prefix'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='core.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='core.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='category_closure_descendant')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='categoryclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='category_closure_pair'),
+        ),
+        migrations.RunPython(populate_closure, migrations.RunPython.noop),
+    ]
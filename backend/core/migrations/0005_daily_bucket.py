@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:07
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+# Cópia congelada do código da época: mudanças posteriores nos módulos de
+# core não alteram o que esta migração faz.
+BATCH_SIZE = 1000
+
+
+def _rebuild_buckets(apps):
+    """Baldes diários: totais (tag nula) e por tag, agrupados no banco"""
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    DailyBucket = apps.get_model('core', 'DailyBucket')
+
+    by_day = TimeEntry.objects.filter(end_at__isnull=False).annotate(day=TruncDate('start_at')).order_by()
+    rows = [
+        {**row, 'tag_id': None}
+        for row in by_day.values('day', 'category_id', 'task_id').annotate(
+            total_seconds=Sum('duration_seconds'), entry_count=Count('id'),
+        )
+    ]
+    for row in by_day.filter(tags__isnull=False).values('day', 'category_id', 'task_id', 'tags').annotate(
+        total_seconds=Sum('duration_seconds'), entry_count=Count('id'),
+    ):
+        tag_id = row.pop('tags')
+        rows.append({**row, 'tag_id': tag_id})
+    DailyBucket.objects.all().delete()
+    DailyBucket.objects.bulk_create([DailyBucket(**row) for row in rows], batch_size=BATCH_SIZE)
+
+
+def populate_buckets(apps, schema_editor):
+    _rebuild_buckets(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_category_closure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total_seconds', models.BigIntegerField(default=0)),
+                ('entry_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.category')),
+                ('tag', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.tag')),
+                ('task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'category', 'task', 'tag'], name='daily_bucket_key'), models.Index(fields=['tag', 'day'], name='daily_bucket_tag_day')],
+            },
+        ),
+        migrations.RunPython(populate_buckets, migrations.RunPython.noop),
+    ]
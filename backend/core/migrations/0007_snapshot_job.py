@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_entry_range_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotJob',
+            fields=[
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot_job', serialize=False, to='core.timeentry')),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
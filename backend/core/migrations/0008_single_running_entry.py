@@ -0,0 +1,172 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:04
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+
+
+# Cópia congelada do código da época: mudanças posteriores nos módulos de
+# core não alteram o que esta migração faz.
+BATCH_SIZE = 1000
+PENDING_KEY = 'speedrun_snapshot_pending'
+
+
+def _ancestor_map(rows):
+    """{id: [ids das ancestrais, da raiz até a própria]} a partir de pares (id, parent_id)"""
+    parents = dict(rows)
+    chains = {}
+    for category_id in parents:
+        chain = []
+        current = category_id
+        while current is not None and current not in chain:
+            chain.append(current)
+            current = parents.get(current)
+        chains[category_id] = chain[::-1]
+    return chains
+
+
+def _rebuild_rollups(apps):
+    """Rollups de cada subárvore com uma agregação agrupada por categoria"""
+    Category = apps.get_model('core', 'Category')
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    CategoryRollup = apps.get_model('core', 'CategoryRollup')
+
+    finished = TimeEntry.objects.filter(end_at__isnull=False)
+    own_stats = {
+        row['category_id']: row
+        for row in finished.values('category_id').order_by().annotate(
+            entry_count=Count('id'),
+            total_seconds=Sum('duration_seconds'),
+            min_seconds=Min('duration_seconds'),
+            max_seconds=Max('duration_seconds'),
+            sum_squares=Sum(F('duration_seconds') * F('duration_seconds')),
+        )
+    }
+    first_entries = finished.filter(category_id=OuterRef('pk')).order_by('end_at', 'id')
+    categories = list(
+        Category.objects.annotate(
+            first_entry_id=Subquery(first_entries.values('id')[:1]),
+            first_end_at=Subquery(first_entries.values('end_at')[:1]),
+        ).values('id', 'parent_id', 'first_entry_id', 'first_end_at')
+    )
+    chains = _ancestor_map((category['id'], category['parent_id']) for category in categories)
+
+    totals = {}
+    for category in categories:
+        own = own_stats.get(category['id'])
+        if not own:
+            continue
+        for target_id in chains[category['id']]:
+            total = totals.get(target_id)
+            if total is None:
+                totals[target_id] = {
+                    **{key: own[key] for key in ('entry_count', 'total_seconds', 'min_seconds', 'max_seconds', 'sum_squares')},
+                    'first_entry_id': category['first_entry_id'],
+                    'first_end_at': category['first_end_at'],
+                }
+                continue
+            total['entry_count'] += own['entry_count']
+            total['total_seconds'] += own['total_seconds']
+            total['sum_squares'] += own['sum_squares']
+            total['min_seconds'] = min(total['min_seconds'], own['min_seconds'])
+            total['max_seconds'] = max(total['max_seconds'], own['max_seconds'])
+            candidate = (category['first_end_at'], category['first_entry_id'])
+            if candidate < (total['first_end_at'], total['first_entry_id']):
+                total['first_end_at'], total['first_entry_id'] = candidate
+
+    CategoryRollup.objects.all().delete()
+    CategoryRollup.objects.bulk_create(
+        [CategoryRollup(category_id=pk, **values) for pk, values in totals.items()], batch_size=500,
+    )
+
+
+def _rebuild_prefixes(apps):
+    """Índice do speedrun: prefixos acumulados de cada ancestral, em ordem de end_at"""
+    Category = apps.get_model('core', 'Category')
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    SpeedrunPrefix = apps.get_model('core', 'SpeedrunPrefix')
+
+    ancestors = _ancestor_map(Category.objects.values_list('id', 'parent_id'))
+    running = {}  # category_id -> [count, seconds, min]
+    batch = []
+    entries = (
+        TimeEntry.objects.filter(end_at__isnull=False)
+        .order_by('end_at', 'id')
+        .values_list('id', 'category_id', 'end_at', 'duration_seconds')
+    )
+    SpeedrunPrefix.objects.all().delete()
+    for entry_id, category_id, end_at, seconds in entries.iterator(chunk_size=BATCH_SIZE):
+        for ancestor_id in ancestors.get(category_id, []):
+            state = running.setdefault(ancestor_id, [0, 0, seconds])
+            state[0] += 1
+            state[1] += seconds
+            state[2] = min(state[2], seconds)
+            batch.append(SpeedrunPrefix(
+                category_id=ancestor_id, entry_id=entry_id, end_at=end_at,
+                duration_seconds=seconds, cum_count=state[0], cum_seconds=state[1], cum_min=state[2],
+            ))
+        if len(batch) >= BATCH_SIZE:
+            SpeedrunPrefix.objects.bulk_create(batch)
+            batch = []
+    SpeedrunPrefix.objects.bulk_create(batch)
+
+
+def _rebuild_buckets(apps):
+    """Baldes diários: totais (tag nula) e por tag, agrupados no banco"""
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    DailyBucket = apps.get_model('core', 'DailyBucket')
+
+    by_day = TimeEntry.objects.filter(end_at__isnull=False).annotate(day=TruncDate('start_at')).order_by()
+    rows = [
+        {**row, 'tag_id': None}
+        for row in by_day.values('day', 'category_id', 'task_id').annotate(
+            total_seconds=Sum('duration_seconds'), entry_count=Count('id'),
+        )
+    ]
+    for row in by_day.filter(tags__isnull=False).values('day', 'category_id', 'task_id', 'tags').annotate(
+        total_seconds=Sum('duration_seconds'), entry_count=Count('id'),
+    ):
+        tag_id = row.pop('tags')
+        rows.append({**row, 'tag_id': tag_id})
+    DailyBucket.objects.all().delete()
+    DailyBucket.objects.bulk_create([DailyBucket(**row) for row in rows], batch_size=BATCH_SIZE)
+
+
+def stop_extra_timers(apps, schema_editor):
+    """Antes do índice único, para os timers rodando a mais, cada um no início do seguinte (como o start_timer)"""
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    SnapshotJob = apps.get_model('core', 'SnapshotJob')
+
+    running = list(TimeEntry.objects.filter(end_at__isnull=True).order_by('start_at', 'id'))
+    stopped = running[:-1]
+    if not stopped:
+        return
+    for entry, following in zip(stopped, running[1:]):
+        entry.end_at = following.start_at
+        entry.duration_seconds = int((entry.end_at - entry.start_at).total_seconds())
+        entry.meta = {**(entry.meta or {}), PENDING_KEY: True}
+    TimeEntry.objects.bulk_update(stopped, ['end_at', 'duration_seconds', 'meta'])
+    # Os snapshots ficam na fila do run_jobs
+    SnapshotJob.objects.bulk_create([SnapshotJob(entry_id=entry.id) for entry in stopped], ignore_conflicts=True)
+    _rebuild_rollups(apps)
+    _rebuild_prefixes(apps)
+    _rebuild_buckets(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_snapshot_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(stop_extra_timers, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='timeentry',
+            name='entry_end_at',
+        ),
+        migrations.AddConstraint(
+            model_name='timeentry',
+            constraint=models.UniqueConstraint(models.Value(1), condition=models.Q(('end_at__isnull', True)), name='entry_single_running'),
+        ),
+    ]
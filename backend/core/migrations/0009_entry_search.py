@@ -0,0 +1,77 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:31
+
+from django.db import migrations
+
+
+# Cópia congelada do código da época: mudanças posteriores nos módulos de
+# core não alteram o que esta migração faz.
+TABLE = 'core_entry_search'
+BATCH_SIZE = 2000
+PG_CONFIG = 'portuguese'
+
+
+def _documents_sql(vendor, where):
+    if vendor == 'postgresql':
+        document = ' || '.join(
+            f"setweight(to_tsvector('{PG_CONFIG}', coalesce({column}, '')), '{weight}')"
+            for column, weight in (('e.note', 'B'), ('t.name', 'A'), ('t.description', 'C'))
+        )
+        columns = f'e.id, {document}'
+    else:
+        columns = "e.id, e.note, coalesce(t.name, ''), coalesce(t.description, '')"
+    return f'SELECT {columns} FROM core_timeentry e LEFT JOIN core_task t ON t.id = e.task_id WHERE {where}'
+
+
+def _rebuild_index(connection):
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        insert = f'INSERT INTO {TABLE} (entry_id, document) '
+    else:
+        insert = f'INSERT INTO {TABLE} (rowid, note, task_name, task_description) '
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute('SELECT min(id) FROM core_timeentry')
+        start = cursor.fetchone()[0]
+        while start is not None:
+            cursor.execute('SELECT id FROM core_timeentry WHERE id >= %s ORDER BY id LIMIT 1 OFFSET %s', [start, BATCH_SIZE])
+            row = cursor.fetchone()
+            end = row[0] if row else None
+            if end is None:
+                cursor.execute(insert + _documents_sql(vendor, 'e.id >= %s'), [start])
+            else:
+                cursor.execute(insert + _documents_sql(vendor, 'e.id >= %s AND e.id < %s'), [start, end])
+            start = end
+        if vendor != 'postgresql':
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE {TABLE} ('
+            f'entry_id bigint PRIMARY KEY REFERENCES core_timeentry (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            f'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(f'CREATE INDEX {TABLE}_document ON {TABLE} USING GIN (document)')
+    else:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            f"note, task_name, task_description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    _rebuild_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_single_running_entry'),
+    ]
+
+    operations = [
+        # Tabela virtual FTS5 (SQLite) ou tsvector com GIN (PostgreSQL), fora dos models; lida e escrita por core.search
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,141 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:28
+
+from django.db import migrations, models
+
+
+# Cópia congelada do esquema do log: mudanças posteriores em core.sync não
+# alteram o que esta migração cria. (nome no log, tabela, coluna com o id do
+# objeto, se a exclusão da linha apaga o objeto); numa tabela intermediária a
+# ligação é uma alteração do dono e não substitui a marca de exclusão dele.
+TRACKED_TABLES = (
+    ('category', 'core_category', 'id', True),
+    ('tag', 'core_tag', 'id', True),
+    ('task', 'core_task', 'id', True),
+    ('task', 'core_task_default_tags', 'task_id', False),
+    ('entry', 'core_timeentry', 'id', True),
+    ('entry', 'core_timeentry_tags', 'timeentry_id', False),
+)
+OPERATIONS = ('INSERT', 'UPDATE', 'DELETE')
+PG_FUNCTION = 'core_changelog_record'
+PG_FUNCTION_SQL = f"""
+    CREATE OR REPLACE FUNCTION {PG_FUNCTION}() RETURNS trigger AS $$
+    DECLARE
+        changed_id bigint;
+        tombstone boolean := TG_ARGV[2]::boolean;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            changed_id := (to_jsonb(OLD) ->> TG_ARGV[1])::bigint;
+        ELSE
+            changed_id := (to_jsonb(NEW) ->> TG_ARGV[1])::bigint;
+        END IF;
+        -- Ids na ordem dos commits: uma transação por vez grava no log
+        PERFORM pg_advisory_xact_lock(hashtext('core_changelog'));
+        IF tombstone THEN
+            DELETE FROM core_changelog WHERE model = TG_ARGV[0] AND object_id = changed_id;
+            INSERT INTO core_changelog (model, object_id, deleted)
+                VALUES (TG_ARGV[0], changed_id, TG_OP = 'DELETE');
+        ELSE
+            DELETE FROM core_changelog
+                WHERE model = TG_ARGV[0] AND object_id = changed_id AND NOT deleted;
+            INSERT INTO core_changelog (model, object_id, deleted)
+                SELECT TG_ARGV[0], changed_id, false
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM core_changelog WHERE model = TG_ARGV[0] AND object_id = changed_id
+                );
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+def _trigger_name(table, operation):
+    return f'{table}_changelog_{operation.lower()}'
+
+
+def _sqlite_trigger_body(model, column, tombstone, operation):
+    row = 'OLD' if operation == 'DELETE' else 'NEW'
+    # DELETE + INSERT sem cláusula de conflito: um INSERT OR IGNORE externo
+    # (como o das tags em massa) valeria também dentro do trigger
+    if tombstone:
+        return (
+            f"DELETE FROM core_changelog WHERE model = '{model}' AND object_id = {row}.{column}; "
+            f"INSERT INTO core_changelog (model, object_id, deleted) "
+            f"VALUES ('{model}', {row}.{column}, {int(operation == 'DELETE')});"
+        )
+    return (
+        f"DELETE FROM core_changelog WHERE model = '{model}' AND object_id = {row}.{column} AND NOT deleted; "
+        f"INSERT INTO core_changelog (model, object_id, deleted) "
+        f"SELECT '{model}', {row}.{column}, 0 WHERE NOT EXISTS ("
+        f"SELECT 1 FROM core_changelog WHERE model = '{model}' AND object_id = {row}.{column});"
+    )
+
+
+def create_triggers(apps, schema_editor):
+    """Triggers que gravam o log e registro dos objetos existentes (categorias e tags antes de quem as referencia)"""
+    postgres = schema_editor.connection.vendor == 'postgresql'
+    if postgres:
+        schema_editor.execute(PG_FUNCTION_SQL)
+    for model, table, column, tombstone in TRACKED_TABLES:
+        for operation in OPERATIONS:
+            trigger = _trigger_name(table, operation)
+            if postgres:
+                schema_editor.execute(
+                    f"CREATE TRIGGER {trigger} AFTER {operation} ON {table} FOR EACH ROW "
+                    f"EXECUTE FUNCTION {PG_FUNCTION}('{model}', '{column}', '{str(tombstone).lower()}')"
+                )
+            else:
+                body = _sqlite_trigger_body(model, column, tombstone, operation)
+                schema_editor.execute(f'CREATE TRIGGER {trigger} AFTER {operation} ON {table} FOR EACH ROW BEGIN {body} END')
+
+    for model, table, _column, tombstone in TRACKED_TABLES:
+        if tombstone:
+            schema_editor.execute(
+                f'INSERT INTO core_changelog (model, object_id, deleted) SELECT %s, id, %s FROM {table} ORDER BY id',
+                [model, False],
+            )
+
+
+def drop_triggers(apps, schema_editor):
+    postgres = schema_editor.connection.vendor == 'postgresql'
+    for _model, table, _column, _tombstone in TRACKED_TABLES:
+        for operation in OPERATIONS:
+            trigger = _trigger_name(table, operation)
+            schema_editor.execute(
+                f'DROP TRIGGER IF EXISTS {trigger} ON {table}' if postgres else f'DROP TRIGGER IF EXISTS {trigger}'
+            )
+    if postgres:
+        schema_editor.execute(f'DROP FUNCTION IF EXISTS {PG_FUNCTION}()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_entry_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncBatch',
+            fields=[
+                ('batch_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('response', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='changelog',
+            constraint=models.UniqueConstraint(fields=('model', 'object_id'), name='changelog_object'),
+        ),
+        # O log é gravado por triggers nas tabelas sincronizadas (lido por core.sync)
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:42
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_buckets(apps, schema_editor):
+    """Antes do índice único, recalcula das entradas as chaves com linhas repetidas
+
+    Linhas repetidas recebiam cada incremento seguinte, então somá-las contaria em dobro.
+    """
+    DailyBucket = apps.get_model('core', 'DailyBucket')
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+
+    keys = ('day', 'category_id', 'task_id', 'tag_id')
+    duplicated = DailyBucket.objects.values(*keys).annotate(rows=Count('id')).filter(rows__gt=1).order_by()
+    for key in list(duplicated):
+        lookup = {name: key[name] for name in keys}
+        entries = TimeEntry.objects.filter(
+            end_at__isnull=False, start_at__date=key['day'], category_id=key['category_id'], task_id=key['task_id'],
+        )
+        if key['tag_id'] is not None:
+            entries = entries.filter(tags=key['tag_id'])
+        totals = entries.aggregate(total_seconds=Sum('duration_seconds'), entry_count=Count('id'))
+        DailyBucket.objects.filter(**lookup).delete()
+        if totals['entry_count']:
+            DailyBucket.objects.create(**lookup, **totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_sync_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_buckets, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='dailybucket',
+            name='daily_bucket_key',
+        ),
+        migrations.AddConstraint(
+            model_name='dailybucket',
+            constraint=models.UniqueConstraint(condition=models.Q(('tag__isnull', True), ('task__isnull', True)), fields=('day', 'category'), name='daily_bucket_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailybucket',
+            constraint=models.UniqueConstraint(condition=models.Q(('tag__isnull', True), ('task__isnull', False)), fields=('day', 'category', 'task'), name='daily_bucket_key_task'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailybucket',
+            constraint=models.UniqueConstraint(condition=models.Q(('tag__isnull', False), ('task__isnull', True)), fields=('day', 'category', 'tag'), name='daily_bucket_key_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailybucket',
+            constraint=models.UniqueConstraint(condition=models.Q(('tag__isnull', False), ('task__isnull', False)), fields=('day', 'category', 'task', 'tag'), name='daily_bucket_key_task_tag'),
+        ),
+    ]
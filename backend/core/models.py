@@ -1,7 +1,16 @@
-from django.db import models
+from collections import namedtuple
+from django.db import models, transaction
 from django.utils import timezone
 import json
 
+# Estado de uma entrada finalizada visto pelos dados derivados (None = não finalizada).
+# tag_ids=None significa "ler as tags atuais do banco".
+EntryState = namedtuple(
+    'EntryState',
+    ['category_id', 'entry_id', 'end_at', 'duration_seconds', 'start_at', 'task_id', 'tag_ids'],
+    defaults=(None,),
+)
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
@@ -19,14 +28,61 @@ class Category(models.Model):
         return self.path
 
     def save(self, *args, **kwargs):
+        from . import derived, hierarchy, versioning
+
         if self.parent:
             self.path = f"{self.parent.path}/{self.name}"
         else:
             self.path = f"/{self.name}"
-        super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            versioning.bump_version('categories')
+            previous = None
+            if self.pk:
+                previous = Category.objects.filter(pk=self.pk).values('parent_id', 'path').first()
+            super().save(*args, **kwargs)
+
+            if previous is None:
+                hierarchy.insert_node(self)
+                return
+            if previous['path'] != self.path:
+                hierarchy.rewrite_descendant_paths(self, previous['path'])
+            if previous['parent_id'] != self.parent_id:
+                old_ancestor_ids = hierarchy.move_subtree(self)
+                # Os agregados das ancestrais antigas e novas mudam de conjunto
+                derived.refresh_categories({self.pk, *old_ancestor_ids})
 
     def get_descendants(self):
-        return Category.objects.filter(path__startswith=f"{self.path}/")
+        from . import hierarchy
+
+        return Category.objects.filter(hierarchy.subtree_q(self.pk, prefix='')).exclude(pk=self.pk)
+
+    def delete(self, *args, **kwargs):
+        from . import derived, hierarchy, versioning
+
+        with transaction.atomic():
+            versioning.bump_version('categories')
+            ancestor_ids = [pk for pk in hierarchy.ancestor_ids(self.pk) if pk != self.pk]
+            result = super().delete(*args, **kwargs)
+            derived.refresh_categories(ancestor_ids)
+        return result
+
+class CategoryClosure(models.Model):
+    """Par (ancestral, descendente) da árvore de categorias, inclusive o próprio nó"""
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='category_closure_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='category_closure_descendant'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
 
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -48,6 +104,28 @@ class Task(models.Model):
     def __str__(self):
         return f"{self.category.path} > {self.name}"
 
+    def save(self, *args, **kwargs):
+        from . import search
+
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = Task.objects.filter(pk=self.pk).values('name', 'description').first()
+            super().save(*args, **kwargs)
+            # O nome e a descrição fazem parte do documento de busca das entradas da task
+            if previous is not None and (previous['name'], previous['description']) != (self.name, self.description):
+                search.index_task(self.pk)
+
+    def delete(self, *args, **kwargs):
+        from . import derived, search
+
+        with transaction.atomic():
+            entries = list(self.entries.values_list('id', 'category_id'))
+            result = super().delete(*args, **kwargs)
+            derived.refresh_categories({category_id for _entry_id, category_id in entries})
+            search.remove_entries([entry_id for entry_id, _category_id in entries])
+        return result
+
 class TimeEntry(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, null=True, blank=True, related_name='entries')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='entries')
@@ -62,14 +140,105 @@ class TimeEntry(models.Model):
 
     class Meta:
         ordering = ['-start_at']
+        indexes = [
+            # Listagem e filtros de período (ordenada por -start_at)
+            models.Index(fields=['start_at'], name='entry_start_at'),
+            # Listagem filtrada por categoria
+            models.Index(fields=['category', 'start_at'], name='entry_category_start_at'),
+            # Rollups, speedrun e média recente (finalizadas por categoria em ordem de fim)
+            models.Index(fields=['category', 'end_at'], name='entry_category_end_at'),
+        ]
+        constraints = [
+            # No máximo um timer rodando. O índice parcial tem uma linha e
+            # também atende a consulta do timer em execução (end_at nulo)
+            models.UniqueConstraint(
+                models.Value(1), condition=models.Q(end_at__isnull=True), name='entry_single_running',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.category.path} - {self.start_at.strftime('%Y-%m-%d %H:%M')}"
 
+    STATE_FIELDS = {'id', 'category_id', 'task_id', 'start_at', 'end_at', 'duration_seconds'}
+    # Campos do documento da entrada no índice de busca
+    SEARCH_FIELDS = {'note', 'task_id'}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado persistido, usado para aplicar deltas nos dados derivados
+        if cls.STATE_FIELDS.issubset(field_names):
+            instance._persisted_state = instance._current_state()
+        if cls.SEARCH_FIELDS.issubset(field_names):
+            instance._persisted_search_key = instance._search_key()
+        return instance
+
+    def _search_key(self):
+        return (self.note, self.task_id)
+
+    def _current_state(self):
+        if self.end_at is None:
+            return None
+        return EntryState(
+            category_id=self.category_id,
+            entry_id=self.id,
+            end_at=self.end_at,
+            duration_seconds=int(self.duration_seconds or 0),
+            start_at=self.start_at,
+            task_id=self.task_id,
+        )
+
+    def _stored_state(self):
+        if hasattr(self, '_persisted_state'):
+            return self._persisted_state
+        if self.pk is None:
+            return None
+        # Instância carregada com campos adiados: lê o estado gravado
+        row = TimeEntry.objects.filter(pk=self.pk).values(
+            'category_id', 'task_id', 'start_at', 'end_at', 'duration_seconds'
+        ).first()
+        if row is None or row['end_at'] is None:
+            return None
+        return EntryState(
+            category_id=row['category_id'],
+            entry_id=self.pk,
+            end_at=row['end_at'],
+            duration_seconds=int(row['duration_seconds'] or 0),
+            start_at=row['start_at'],
+            task_id=row['task_id'],
+        )
+
     def save(self, *args, **kwargs):
+        from . import derived, search
+
         if self.end_at and self.start_at:
             self.duration_seconds = int((self.end_at - self.start_at).total_seconds())
-        super().save(*args, **kwargs)
+        search_key = self._search_key()
+        with transaction.atomic():
+            old_state = self._stored_state()
+            super().save(*args, **kwargs)
+            new_state = self._current_state()
+            derived.apply_entry_change(old_state, new_state)
+            # Parar o timer não muda o documento de busca
+            if getattr(self, '_persisted_search_key', None) != search_key:
+                search.index_entries([self.pk])
+        self._persisted_state = new_state
+        self._persisted_search_key = search_key
+
+    def delete(self, *args, **kwargs):
+        from . import derived, search
+
+        with transaction.atomic():
+            old_state = self._stored_state()
+            if old_state is not None:
+                # As tags somem junto com a entrada; guarda antes de apagar
+                old_state = old_state._replace(tag_ids=tuple(self.tags.values_list('id', flat=True)))
+            entry_id = self.pk
+            result = super().delete(*args, **kwargs)
+            derived.apply_entry_change(old_state, None)
+            search.remove_entries([entry_id])
+        self._persisted_state = None
+        return result
 
     @property
     def is_running(self):
@@ -79,4 +248,132 @@ class TimeEntry(models.Model):
         if self.is_running:
             self.end_at = timezone.now()
             self.save()
-        return self
\ No newline at end of file
+        return self
+
+class CategoryRollup(models.Model):
+    """Agregados de duração das entradas finalizadas na subárvore da categoria"""
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='rollup')
+    entry_count = models.IntegerField(default=0)
+    total_seconds = models.BigIntegerField(default=0)
+    min_seconds = models.IntegerField(default=0)
+    max_seconds = models.IntegerField(default=0)
+    sum_squares = models.BigIntegerField(default=0)
+    first_entry_id = models.BigIntegerField(null=True, blank=True)
+    first_end_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.category_id} ({self.entry_count} entradas)"
+
+    @property
+    def avg_seconds(self):
+        return self.total_seconds / self.entry_count if self.entry_count else 0
+
+    @property
+    def stddev_seconds(self):
+        if not self.entry_count:
+            return 0
+        variance = self.sum_squares / self.entry_count - self.avg_seconds ** 2
+        return max(variance, 0) ** 0.5
+
+class SpeedrunPrefix(models.Model):
+    """Agregados acumulados da subárvore da categoria, em ordem de (end_at, entry_id)"""
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    entry_id = models.BigIntegerField()
+    end_at = models.DateTimeField()
+    duration_seconds = models.IntegerField()
+    cum_count = models.IntegerField()
+    cum_seconds = models.BigIntegerField()
+    cum_min = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'end_at', 'entry_id'], name='speedrun_prefix_order'),
+        ]
+        indexes = [
+            models.Index(fields=['entry_id'], name='speedrun_prefix_entry'),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id} #{self.cum_count} ({self.entry_id})"
+
+class DailyBucket(models.Model):
+    """Soma diária das entradas finalizadas por (data local, categoria, task, tag)"""
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    # Nula na linha de totais da entrada; preenchida nas linhas por tag
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    total_seconds = models.BigIntegerField(default=0)
+    entry_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Uma linha por chave. NULLs são distintos num índice único, então cada
+            # combinação de task e tag nulas tem o seu índice parcial
+            models.UniqueConstraint(
+                fields=['day', 'category'],
+                condition=models.Q(task__isnull=True, tag__isnull=True),
+                name='daily_bucket_key',
+            ),
+            models.UniqueConstraint(
+                fields=['day', 'category', 'task'],
+                condition=models.Q(task__isnull=False, tag__isnull=True),
+                name='daily_bucket_key_task',
+            ),
+            models.UniqueConstraint(
+                fields=['day', 'category', 'tag'],
+                condition=models.Q(task__isnull=True, tag__isnull=False),
+                name='daily_bucket_key_tag',
+            ),
+            models.UniqueConstraint(
+                fields=['day', 'category', 'task', 'tag'],
+                condition=models.Q(task__isnull=False, tag__isnull=False),
+                name='daily_bucket_key_task_tag',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['tag', 'day'], name='daily_bucket_tag_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category_id}/{self.task_id}/{self.tag_id}: {self.total_seconds}s"
+
+class SnapshotJob(models.Model):
+    """Cálculo pendente do snapshot de speedrun de uma entrada finalizada (fila no banco)"""
+    entry = models.OneToOneField(TimeEntry, on_delete=models.CASCADE, primary_key=True, related_name='snapshot_job')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"snapshot {self.entry_id} ({self.attempts} tentativas)"
+
+class ChangeLog(models.Model):
+    """Última mudança de cada objeto sincronizado; o id é o cursor do /api/sync/.
+
+    Gravado só pelos triggers criados em core.sync: cada escrita troca a linha
+    do objeto por uma nova, com id maior, então há no máximo uma por objeto.
+    """
+    model = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id'], name='changelog_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.id}: {self.model} {self.object_id}{' (apagado)' if self.deleted else ''}"
+
+class SyncBatch(models.Model):
+    """Lote de mutações do cliente já aplicado: reenvios do mesmo id devolvem a resposta gravada"""
+    batch_id = models.CharField(max_length=64, primary_key=True)
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.batch_id
@@ -0,0 +1,100 @@
+"""Paginação das entradas.
+
+O modo padrão continua sendo o de páginas numeradas do DRF. Com
+`?pagination=cursor` (ou um `cursor` na query) a listagem usa keyset em
+(`start_at`, `id`), na mesma ordem decrescente de `TimeEntry.Meta`: cada
+página é uma busca no índice a partir da última linha da anterior, sem
+`OFFSET`, e o total (`COUNT(*)`) só é calculado com `?count=1`.
+"""
+import base64
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(start_at, entry_id):
+    raw = f'{start_at.isoformat()}|{entry_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(value):
+    """(start_at, id) do cursor; NotFound se o valor não for um cursor válido"""
+    try:
+        raw = base64.urlsafe_b64decode(value.encode('ascii')).decode('utf-8')
+        start_at, entry_id = raw.rsplit('|', 1)
+        start_at = parse_datetime(start_at)
+        entry_id = int(entry_id)
+    except (TypeError, ValueError, UnicodeError):
+        start_at = None
+    if start_at is None or start_at.tzinfo is None:
+        raise NotFound('Cursor inválido')
+    return start_at, entry_id
+
+
+class EntryPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.count = None
+        if str(request.query_params.get(self.count_query_param)).lower() in ('1', 'true', 'yes'):
+            self.count = queryset.count()
+
+        queryset = queryset.order_by('-start_at', '-id')
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            start_at, entry_id = decode_cursor(cursor)
+            # O limite `start_at <= ...` isolado permite a busca no índice; o OR só separa os empates
+            queryset = queryset.filter(Q(start_at__lte=start_at), Q(start_at__lt=start_at) | Q(id__lt=entry_id))
+
+        # Uma linha a mais indica se existe próxima página
+        rows = list(queryset[:page_size + 1])
+        self.page_rows = rows[:page_size]
+        last = self.page_rows[-1] if len(rows) > page_size else None
+        if last is None:
+            self.next_cursor = None
+        elif isinstance(last, dict):
+            # Linhas de .values() (listagem compacta)
+            self.next_cursor = encode_cursor(last['start_at'], last['id'])
+        else:
+            self.next_cursor = encode_cursor(last.start_at, last.id)
+        return self.page_rows
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.mode_query_param, 'cursor')
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        payload = OrderedDict([
+            ('next', self.get_next_link()),
+            ('next_cursor', self.next_cursor),
+            ('results', data),
+        ])
+        if self.count is not None:
+            payload['count'] = self.count
+            payload.move_to_end('count', last=False)
+        return Response(payload)
@@ -0,0 +1,63 @@
+"""Filtro de período das entradas.
+
+Os parâmetros `from`/`to` (datas locais, inclusivas) viram limites
+semiabertos `[início de from, início do dia seguinte a to)` em datetimes com
+o fuso do `TIME_ZONE`. Comparar `start_at` com esses limites usa o índice da
+coluna, ao contrário de `start_at__date`, que converte o fuso linha a linha.
+"""
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+
+def parse_day(value, param):
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({param: ['Data inválida, use o formato AAAA-MM-DD']})
+    return day
+
+
+def parse_int(value, param, minimum=None):
+    """Inteiro de um parâmetro de consulta (None se ausente); inválido vira 400"""
+    if value in (None, ''):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or (minimum is not None and number < minimum):
+        message = 'Informe um número inteiro' if minimum is None else f'Informe um número inteiro a partir de {minimum}'
+        raise ValidationError({param: [message]})
+    return number
+
+
+def day_range(params):
+    """(primeiro dia, último dia) dos parâmetros `from`/`to`; ausentes viram None"""
+    return parse_day(params.get('from'), 'from'), parse_day(params.get('to'), 'to')
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def datetime_bounds(from_day, to_day):
+    """Limites semiabertos [lower, upper) do período"""
+    lower = day_start(from_day) if from_day else None
+    upper = day_start(to_day + datetime.timedelta(days=1)) if to_day else None
+    return lower, upper
+
+
+def filter_range(queryset, from_day, to_day, field='start_at'):
+    lower, upper = datetime_bounds(from_day, to_day)
+    if lower is not None:
+        queryset = queryset.filter(**{f'{field}__gte': lower})
+    if upper is not None:
+        queryset = queryset.filter(**{f'{field}__lt': upper})
+    return queryset
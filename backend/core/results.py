@@ -0,0 +1,105 @@
+"""Cache de resultados das estatísticas (`stats_summary`, `top_tasks` e `stats` da categoria).
+
+Os resultados ficam no cache `results` do Django (ver RESULTS_CACHE_* nas
+settings: locmem por padrão, com TTL e descarte dos menos usados quando
+passa de MAX_ENTRIES; arquivo e Redis são opcionais). A chave junta o
+endpoint, os parâmetros normalizados e as gerações dos dados de que o
+resultado depende, então invalidar é só incrementar gerações, sem procurar
+chaves; as entradas antigas somem pelo TTL ou pelo descarte.
+
+Gerações (contadores no cache `versions`, com os de `versioning`, para que
+as invalidações feitas em outros processos cheguem ao servidor mesmo com o
+cache de resultados em `locmem`):
+
+- `day:<data>`: entradas finalizadas que começam no dia local. Uma janela
+  `from`/`to` depende só dos seus dias, então parar um timer só invalida
+  as janelas que contêm o dia da entrada.
+- `open`: janelas sem `from` ou `to` (ou longas demais para listar os dias),
+  que dependem de qualquer entrada.
+- `category:<id>`: entradas da subárvore; uma escrita incrementa a
+  categoria da entrada e as ancestrais.
+- `all`: escritas em massa e reconstruções, que invalidam tudo.
+
+Os nomes que aparecem nos resultados (caminhos das categorias, tasks e
+tags) entram pelas versões `categories`, `tasks` e `tags` de `versioning`.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from . import hierarchy, versioning
+
+CACHE_ALIAS = 'results'
+KEY_PREFIX = 'results'
+# Janelas mais longas dependem de `open` em vez de uma geração por dia
+MAX_WINDOW_DAYS = 400
+NAME_NAMESPACES = ('categories', 'tasks', 'tags')
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(name):
+    return f'{KEY_PREFIX}:generation:{name}'
+
+
+def _generations(names):
+    return versioning.read_counters([_generation_key(name) for name in names])
+
+
+def _bump(names):
+    versioning.advance_counters([_generation_key(name) for name in names])
+
+
+def invalidate(names):
+    """Incrementa as gerações assim que a transação atual for confirmada"""
+    names = set(names)
+    if names:
+        transaction.on_commit(lambda: _bump(names))
+
+
+def cached(endpoint, params, generations, compute, namespaces=NAME_NAMESPACES):
+    """Resultado de `compute()` guardado sob o endpoint, os parâmetros e as gerações.
+
+    `namespaces` são as versões de `versioning` dos nomes que aparecem no resultado.
+    """
+    versions = [versioning.get_version(namespace) for namespace in namespaces]
+    # As gerações são lidas antes de calcular: uma escrita no meio muda a chave
+    state = repr((sorted(params.items()), versions, _generations(['all', *generations])))
+    key = f'{KEY_PREFIX}:{endpoint}:{hashlib.sha1(state.encode("utf-8")).hexdigest()}'
+    cache = _cache()
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result)
+    return result
+
+
+def window_generations(from_day, to_day):
+    """Gerações de uma janela de dias (limites inclusivos, None = aberto)"""
+    if from_day is None or to_day is None or (to_day - from_day).days >= MAX_WINDOW_DAYS:
+        return ['open']
+    return [f'day:{from_day + timedelta(days=offset)}' for offset in range((to_day - from_day).days + 1)]
+
+
+def category_generations(category_id):
+    return [f'category:{category_id}']
+
+
+def entries_changed(states, subtrees=True):
+    """Invalida os dias (e, com `subtrees`, as subárvores) das entradas (EntryState ou None)"""
+    states = [state for state in states if state is not None]
+    names = {'open'}
+    for state in states:
+        names.add(f'day:{timezone.localtime(state.start_at).date()}')
+    if subtrees:
+        names.update(f'category:{pk}' for pk in hierarchy.with_ancestors(state.category_id for state in states))
+    invalidate(names)
+
+
+def invalidate_all():
+    invalidate(['all'])
@@ -0,0 +1,303 @@
+"""Manutenção dos rollups de duração por subárvore de categoria.
+
+Cada `CategoryRollup` guarda contagem, soma, mínimo, máximo, soma dos
+quadrados e a primeira entrada (por `end_at`, `id`) de todas as entradas
+finalizadas da categoria e das suas descendentes. Escritas individuais e
+em massa aplicam deltas; só as categorias que perdem o mínimo, o máximo ou a
+primeira entrada (e as de categorias movidas) são recalculadas.
+"""
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import (
+    BigIntegerField, Case, Count, DateTimeField, F, IntegerField, Max, Min, OuterRef, Q,
+    Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Greatest, Least
+
+from . import hierarchy
+
+
+def _apply_delta(category_ids, removed, added):
+    """Soma as entradas `added` e subtrai as `removed` (EntryState) nos rollups das categorias.
+
+    Mínimo, máximo e primeira entrada só acompanham as adicionadas: quem
+    remove recalcula as categorias em que uma removida era um desses extremos.
+    """
+    from .models import CategoryRollup
+
+    if not category_ids:
+        return
+    CategoryRollup.objects.bulk_create(
+        [CategoryRollup(category_id=pk) for pk in category_ids],
+        ignore_conflicts=True,
+    )
+    seconds = sum(state.duration_seconds for state in added) - sum(state.duration_seconds for state in removed)
+    squares = sum(state.duration_seconds ** 2 for state in added) - sum(state.duration_seconds ** 2 for state in removed)
+    changes = {
+        'entry_count': F('entry_count') + (len(added) - len(removed)),
+        'total_seconds': F('total_seconds') + seconds,
+        'sum_squares': F('sum_squares') + squares,
+    }
+    if added:
+        minimum = min(state.duration_seconds for state in added)
+        maximum = max(state.duration_seconds for state in added)
+        first = min(added, key=lambda state: (state.end_at, state.entry_id))
+        empty = Q(entry_count=0)
+        becomes_first = (
+            empty | Q(first_end_at__gt=first.end_at) | Q(first_end_at=first.end_at, first_entry_id__gt=first.entry_id)
+        )
+        changes.update(
+            min_seconds=Case(
+                When(empty, then=Value(minimum)),
+                default=Least('min_seconds', Value(minimum)),
+                output_field=IntegerField(),
+            ),
+            max_seconds=Case(
+                When(empty, then=Value(maximum)),
+                default=Greatest('max_seconds', Value(maximum)),
+                output_field=IntegerField(),
+            ),
+            first_entry_id=Case(
+                When(becomes_first, then=Value(first.entry_id)),
+                default=F('first_entry_id'),
+                output_field=BigIntegerField(),
+            ),
+            first_end_at=Case(
+                When(becomes_first, then=Value(first.end_at)),
+                default=F('first_end_at'),
+                output_field=DateTimeField(),
+            ),
+        )
+    CategoryRollup.objects.filter(category_id__in=category_ids).update(**changes)
+
+
+def _remove(category_ids, entry_id, seconds):
+    """Subtrai a entrada e devolve as categorias cujo min/max/primeira precisam ser recalculados"""
+    from .models import CategoryRollup
+
+    if not category_ids:
+        return []
+    rollups = CategoryRollup.objects.filter(category_id__in=category_ids)
+    rollups.update(
+        entry_count=F('entry_count') - 1,
+        total_seconds=F('total_seconds') - seconds,
+        sum_squares=F('sum_squares') - seconds * seconds,
+    )
+    return list(
+        rollups.filter(Q(min_seconds=seconds) | Q(max_seconds=seconds) | Q(first_entry_id=entry_id))
+        .values_list('category_id', flat=True)
+    )
+
+
+def duration_key(state):
+    """Parte do estado que afeta os agregados de duração"""
+    if state is None:
+        return None
+    return (state.category_id, state.entry_id, state.end_at, state.duration_seconds)
+
+
+def apply_entry_change(old_state, new_state):
+    """Aplica a mudança de uma entrada nos rollups.
+
+    Os estados são `EntryState` ou `None` quando a entrada não está
+    finalizada (ou não existe). Deve ser chamada depois que a entrada já
+    foi gravada.
+    """
+    if duration_key(old_state) == duration_key(new_state):
+        return
+
+    refreshed = set()
+    if old_state is not None:
+        stale = _remove(hierarchy.ancestor_ids(old_state.category_id), old_state.entry_id, old_state.duration_seconds)
+        # O recálculo lê o estado atual do banco, que já inclui new_state
+        refresh_categories(stale, include_ancestors=False)
+        refreshed.update(stale)
+
+    if new_state is not None:
+        targets = [pk for pk in hierarchy.ancestor_ids(new_state.category_id) if pk not in refreshed]
+        _apply_delta(targets, [], [new_state])
+
+
+def changed_states(old_states, new_states, key=duration_key):
+    """(removidos, adicionados) entre {entry_id: EntryState} de antes e de depois,
+    só das entradas em que `key` mudou"""
+    removed, added = [], []
+    for entry_id in old_states.keys() | new_states.keys():
+        old_state, new_state = old_states.get(entry_id), new_states.get(entry_id)
+        if key(old_state) == key(new_state):
+            continue
+        if old_state is not None:
+            removed.append(old_state)
+        if new_state is not None:
+            added.append(new_state)
+    return removed, added
+
+
+def apply_entries_change(old_states, new_states):
+    """Versão em lote de `apply_entry_change`, para escritas em massa.
+
+    As diferenças são agrupadas por categoria (com as ancestrais) e aplicadas
+    com um UPDATE por categoria. Deve ser chamada depois da escrita.
+    """
+    from .models import CategoryRollup
+
+    removed, added = changed_states(old_states, new_states)
+    ancestors = hierarchy.ancestors_by_category(state.category_id for state in removed + added)
+    touched = {}
+    for index, states in enumerate((removed, added)):
+        for state in states:
+            for pk in ancestors[state.category_id]:
+                touched.setdefault(pk, ([], []))[index].append(state)
+    if not touched:
+        return
+
+    extremes = CategoryRollup.objects.filter(category_id__in=touched).values_list(
+        'category_id', 'min_seconds', 'max_seconds', 'first_entry_id'
+    )
+    stale = {
+        category_id
+        for category_id, min_seconds, max_seconds, first_entry_id in extremes
+        if any(
+            state.duration_seconds in (min_seconds, max_seconds) or state.entry_id == first_entry_id
+            for state in touched[category_id][0]
+        )
+    }
+    # O recálculo lê o estado atual do banco, que já inclui a escrita
+    refresh_categories(stale, include_ancestors=False)
+    for pk, (category_removed, category_added) in touched.items():
+        if pk not in stale:
+            _apply_delta([pk], category_removed, category_added)
+
+
+def _aggregate_subtree(category_id):
+    from .models import TimeEntry
+
+    entries = TimeEntry.objects.filter(hierarchy.subtree_q(category_id), end_at__isnull=False)
+    aggregates = entries.aggregate(
+        entry_count=Count('id'),
+        total_seconds=Sum('duration_seconds'),
+        min_seconds=Min('duration_seconds'),
+        max_seconds=Max('duration_seconds'),
+        sum_squares=Sum(F('duration_seconds') * F('duration_seconds')),
+    )
+    first_entry = entries.order_by('end_at', 'id').values('id', 'end_at').first()
+    return {
+        'entry_count': aggregates['entry_count'] or 0,
+        'total_seconds': aggregates['total_seconds'] or 0,
+        'min_seconds': aggregates['min_seconds'] or 0,
+        'max_seconds': aggregates['max_seconds'] or 0,
+        'sum_squares': aggregates['sum_squares'] or 0,
+        'first_entry_id': first_entry['id'] if first_entry else None,
+        'first_end_at': first_entry['end_at'] if first_entry else None,
+    }
+
+
+def refresh_categories(category_ids, include_ancestors=True):
+    """Recalcula do zero os rollups das categorias (e, por padrão, das ancestrais).
+
+    Usado depois de escritas em massa (`QuerySet.update`/`delete`), que não
+    passam por `TimeEntry.save`.
+    """
+    from .models import CategoryRollup
+
+    category_ids = {pk for pk in category_ids if pk is not None}
+    if include_ancestors:
+        category_ids = hierarchy.with_ancestors(category_ids)
+
+    with transaction.atomic():
+        for category_id in category_ids:
+            CategoryRollup.objects.update_or_create(
+                category_id=category_id,
+                defaults=_aggregate_subtree(category_id),
+            )
+
+
+def rebuild_rollups(apps=django_apps):
+    """Reconstrói todos os rollups com uma agregação agrupada por categoria.
+
+    Aceita o registro de apps para poder ser usada em migrações.
+    """
+    Category = apps.get_model('core', 'Category')
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    CategoryRollup = apps.get_model('core', 'CategoryRollup')
+
+    finished = TimeEntry.objects.filter(end_at__isnull=False)
+    own_stats = {
+        row['category_id']: row
+        for row in finished.values('category_id').order_by().annotate(
+            entry_count=Count('id'),
+            total_seconds=Sum('duration_seconds'),
+            min_seconds=Min('duration_seconds'),
+            max_seconds=Max('duration_seconds'),
+            sum_squares=Sum(F('duration_seconds') * F('duration_seconds')),
+        )
+    }
+    first_entries = finished.filter(category_id=OuterRef('pk')).order_by('end_at', 'id')
+    categories = list(
+        Category.objects.annotate(
+            first_entry_id=Subquery(first_entries.values('id')[:1]),
+            first_end_at=Subquery(first_entries.values('end_at')[:1]),
+        ).values('id', 'parent_id', 'first_entry_id', 'first_end_at')
+    )
+    chains = hierarchy.ancestor_map((category['id'], category['parent_id']) for category in categories)
+
+    totals = {}
+    for category in categories:
+        own = own_stats.get(category['id'])
+        if not own:
+            continue
+        for target_id in chains[category['id']]:
+            total = totals.get(target_id)
+            if total is None:
+                totals[target_id] = {
+                    'entry_count': own['entry_count'],
+                    'total_seconds': own['total_seconds'],
+                    'min_seconds': own['min_seconds'],
+                    'max_seconds': own['max_seconds'],
+                    'sum_squares': own['sum_squares'],
+                    'first_entry_id': category['first_entry_id'],
+                    'first_end_at': category['first_end_at'],
+                }
+                continue
+            total['entry_count'] += own['entry_count']
+            total['total_seconds'] += own['total_seconds']
+            total['sum_squares'] += own['sum_squares']
+            total['min_seconds'] = min(total['min_seconds'], own['min_seconds'])
+            total['max_seconds'] = max(total['max_seconds'], own['max_seconds'])
+            candidate = (category['first_end_at'], category['first_entry_id'])
+            if candidate < (total['first_end_at'], total['first_entry_id']):
+                total['first_end_at'], total['first_entry_id'] = candidate
+
+    with transaction.atomic():
+        CategoryRollup.objects.all().delete()
+        CategoryRollup.objects.bulk_create(
+            [CategoryRollup(category_id=pk, **values) for pk, values in totals.items()],
+            batch_size=500,
+        )
+    return len(totals)
+
+
+def get_subtree_stats(category_id):
+    """Estatísticas da subárvore lidas do rollup (uma consulta por chave primária)"""
+    from .models import CategoryRollup
+
+    rollup = CategoryRollup.objects.filter(category_id=category_id).first()
+    if rollup is None or rollup.entry_count <= 0:
+        return {
+            'total_entries': 0,
+            'total_seconds': 0,
+            'avg_duration': 0.0,
+            'min_duration': 0,
+            'max_duration': 0,
+            'stddev_duration': 0.0,
+            'first_entry_id': None,
+        }
+    return {
+        'total_entries': rollup.entry_count,
+        'total_seconds': rollup.total_seconds,
+        'avg_duration': float(rollup.avg_seconds),
+        'min_duration': rollup.min_seconds,
+        'max_duration': rollup.max_seconds,
+        'stddev_duration': float(rollup.stddev_seconds),
+        'first_entry_id': rollup.first_entry_id,
+    }
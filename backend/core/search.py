@@ -0,0 +1,201 @@
+"""Busca textual nas notas das entradas e no nome e na descrição das tasks.
+
+Cada entrada tem um documento no índice `core_entry_search` com a nota, o
+nome e a descrição da sua task. No SQLite o índice é uma tabela virtual FTS5
+(rowid = id da entrada, sem diferença de acentos); no PostgreSQL, uma linha
+com um `tsvector` por entrada e índice GIN. A migração 0009 cria a estrutura
+de cada banco, com sua própria cópia do SQL, e só este módulo a lê e escreve.
+
+Como os outros dados derivados, o índice é atualizado nas escritas:
+`index_entries` quando a nota ou a task de entradas mudam, `index_task`
+quando o nome ou a descrição de uma task mudam e `remove_entries` nas
+exclusões. `rebuild()` (comando `rebuild_search_index`) o repopula em lotes.
+Documentos de entradas apagadas em cascata (junto com a categoria ou a task)
+não aparecem nos resultados, que sempre cruzam o índice com as entradas.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABLE = 'core_entry_search'
+BATCH_SIZE = 2000
+# Pesos do ranking: nota, nome da task, descrição da task
+WEIGHTS = (1.0, 2.0, 0.5)
+PG_CONFIG = 'portuguese'
+SNIPPET_MARKERS = ('[', ']')
+SNIPPET_WORDS = 12
+MAX_TERMS = 16
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def _documents_sql(where):
+    """SELECT dos documentos (id da entrada + colunas) das entradas em `where`"""
+    if _is_postgres():
+        document = ' || '.join(
+            f"setweight(to_tsvector('{PG_CONFIG}', coalesce({column}, '')), '{weight}')"
+            for column, weight in (('e.note', 'B'), ('t.name', 'A'), ('t.description', 'C'))
+        )
+        columns = f'e.id, {document}'
+    else:
+        columns = "e.id, e.note, coalesce(t.name, ''), coalesce(t.description, '')"
+    return f'SELECT {columns} FROM core_timeentry e LEFT JOIN core_task t ON t.id = e.task_id WHERE {where}'
+
+
+def _write(cursor, where, params):
+    """Regrava os documentos das entradas em `where`"""
+    if _is_postgres():
+        cursor.execute(
+            f'INSERT INTO {TABLE} (entry_id, document) {_documents_sql(where)} '
+            f'ON CONFLICT (entry_id) DO UPDATE SET document = EXCLUDED.document',
+            params,
+        )
+    else:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN (SELECT e.id FROM core_timeentry e WHERE {where})', params)
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, note, task_name, task_description) {_documents_sql(where)}', params
+        )
+
+
+def _key_column():
+    return 'entry_id' if _is_postgres() else 'rowid'
+
+
+def index_entries(entry_ids):
+    """Regrava os documentos das entradas (criadas ou com nota/task alteradas)"""
+    entry_ids = sorted(set(entry_ids))
+    with connection.cursor() as cursor:
+        for offset in range(0, len(entry_ids), BATCH_SIZE):
+            chunk = entry_ids[offset:offset + BATCH_SIZE]
+            _write(cursor, f'e.id IN ({", ".join(["%s"] * len(chunk))})', chunk)
+
+
+def index_task(task_id):
+    """Regrava os documentos das entradas da task (nome ou descrição alterados)"""
+    with connection.cursor() as cursor:
+        _write(cursor, 'e.task_id = %s', [task_id])
+
+
+def remove_entries(entry_ids):
+    entry_ids = sorted(set(entry_ids))
+    with connection.cursor() as cursor:
+        for offset in range(0, len(entry_ids), BATCH_SIZE):
+            chunk = entry_ids[offset:offset + BATCH_SIZE]
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE {_key_column()} IN ({", ".join(["%s"] * len(chunk))})', chunk
+            )
+
+
+def rebuild(batch_size=BATCH_SIZE, progress=None):
+    """Repopula o índice inteiro em lotes de ids; retorna o número de documentos"""
+    if _is_postgres():
+        insert = f'INSERT INTO {TABLE} (entry_id, document) '
+    else:
+        insert = f'INSERT INTO {TABLE} (rowid, note, task_name, task_description) '
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute('SELECT min(id), count(*) FROM core_timeentry')
+        start, total = cursor.fetchone()
+        done = 0
+        while start is not None:
+            # Primeiro id do próximo lote (paginação por chave, sem OFFSET crescente)
+            cursor.execute('SELECT id FROM core_timeentry WHERE id >= %s ORDER BY id LIMIT 1 OFFSET %s', [start, batch_size])
+            row = cursor.fetchone()
+            end = row[0] if row else None
+            if end is None:
+                cursor.execute(insert + _documents_sql('e.id >= %s'), [start])
+            else:
+                cursor.execute(insert + _documents_sql('e.id >= %s AND e.id < %s'), [start, end])
+            done += cursor.rowcount
+            if progress is not None:
+                progress(done, total)
+            start = end
+        if not _is_postgres():
+            # Junta os segmentos do FTS5 criados pelos lotes
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return done
+
+
+def parse_query(text):
+    """Termos da busca: palavras do texto, sem a sintaxe de consulta de cada banco"""
+    return _TERM_RE.findall(text or '')[:MAX_TERMS]
+
+
+def _match_sql(terms):
+    """(condição, parâmetros) que casa os documentos com todos os termos"""
+    if _is_postgres():
+        query = ' & '.join(f"{term}:*" for term in terms)
+        return f"document @@ to_tsquery('{PG_CONFIG}', %s)", [query]
+    # Cada termo entre aspas (sem operadores do FTS5) e como prefixo: "reun" casa com "reunião"
+    query = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+    return f'{TABLE} MATCH %s', [query]
+
+
+def match_q(text):
+    """Q das entradas que casam com `text` (busca do admin)"""
+    terms = parse_query(text)
+    if not terms:
+        return Q(pk__in=[])
+    condition, params = _match_sql(terms)
+    return Q(pk__in=RawSQL(f'SELECT {_key_column()} FROM {TABLE} WHERE {condition}', params))
+
+
+def search(text, queryset, limit, offset=0):
+    """(total, [(id da entrada, relevância, trecho)]) das entradas de `queryset` que casam com `text`.
+
+    A ordem é a relevância (maior primeiro); o trecho marca os termos com
+    SNIPPET_MARKERS.
+    """
+    terms = parse_query(text)
+    if not terms:
+        return 0, []
+    condition, params = _match_sql(terms)
+    filtered_sql, filtered_params = queryset.order_by().values('id').query.sql_with_params()
+    start, end = SNIPPET_MARKERS
+
+    if _is_postgres():
+        key = 's.entry_id'
+        rank = f"ts_rank(s.document, to_tsquery('{PG_CONFIG}', %s))"
+        snippet = (
+            f"ts_headline('{PG_CONFIG}', concat_ws(' — ', t.name, e.note), to_tsquery('{PG_CONFIG}', %s), "
+            f"'StartSel={start}, StopSel={end}, MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}')"
+        )
+        select_params = [params[0], params[0]]
+        source = (
+            f'{TABLE} s JOIN ({filtered_sql}) filtered ON filtered.id = s.entry_id '
+            f'JOIN core_timeentry e ON e.id = s.entry_id LEFT JOIN core_task t ON t.id = e.task_id'
+        )
+        where = f's.{condition}'
+        order = f'score DESC, {key} DESC'
+    else:
+        # Sem apelido: o FTS5 identifica a tabela pelo nome em MATCH, rank e snippet.
+        # O índice fica no laço externo e o filtro entra por JOIN: com `rowid IN (...)`
+        # o FTS5 refaz a busca para cada id.
+        key = f'{TABLE}.rowid'
+        # Com ORDER BY rank o FTS5 ordena internamente e só calcula o trecho
+        # das linhas da página; rank é o bm25 com os pesos, menor = mais relevante
+        rank = f'-{TABLE}.rank'
+        snippet = f"snippet({TABLE}, -1, '{start}', '{end}', '…', {SNIPPET_WORDS})"
+        select_params = []
+        source = f'{TABLE} JOIN ({filtered_sql}) filtered ON filtered.id = {TABLE}.rowid'
+        where = f'{condition} AND {TABLE}.rank MATCH %s'
+        params = [*params, f'bm25({", ".join(str(weight) for weight in WEIGHTS)})']
+        order = f'{TABLE}.rank'
+
+    source_params = [*filtered_params, *params]
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {source} WHERE {where}', source_params)
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f'SELECT {key}, {rank} AS score, {snippet} FROM {source} WHERE {where} '
+            f'ORDER BY {order} LIMIT %s OFFSET %s',
+            [*select_params, *source_params, limit, offset],
+        )
+        rows = cursor.fetchall()
+    return total, [(entry_id, float(score), snippet) for entry_id, score, snippet in rows]
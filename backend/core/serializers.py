@@ -1,115 +1,117 @@
+from django.db import models
 from rest_framework import serializers
-from django.db.models import Avg, Min, Count
+from . import hierarchy, metrics, speedrun
 from .models import Category, Task, Tag, TimeEntry
 
-class TagSerializer(serializers.ModelSerializer):
+# Serializers das respostas: o `.data` entra na métrica de serialização
+class TimedListSerializer(metrics.TimedDataMixin, serializers.ListSerializer):
+    pass
+
+class TagSerializer(metrics.TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(metrics.TimedDataMixin, serializers.ModelSerializer):
     children = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
         fields = ['id', 'name', 'parent', 'path', 'properties', 'icon', 'children', 'created_at', 'updated_at']
         read_only_fields = ['path']  # path é calculado automaticamente
+        list_serializer_class = TimedListSerializer
     
+    def validate_parent(self, parent):
+        if parent and self.instance and parent.pk in hierarchy.descendant_ids(self.instance.pk):
+            raise serializers.ValidationError('Uma categoria não pode ser movida para dentro da própria subárvore')
+        return parent
+
     def get_children(self, obj):
         children = obj.children.all()
         return CategorySerializer(children, many=True).data
 
-class TaskSerializer(serializers.ModelSerializer):
+def build_category_tree():
+    """Árvore completa no formato do CategorySerializer, com uma única consulta"""
+    datetime_field = serializers.DateTimeField()
+    nodes = {}
+    roots = []
+    rows = Category.objects.order_by('path').values(
+        'id', 'name', 'parent_id', 'path', 'properties', 'icon', 'created_at', 'updated_at'
+    )
+    for row in rows:
+        nodes[row['id']] = {
+            'id': row['id'],
+            'name': row['name'],
+            'parent': row['parent_id'],
+            'path': row['path'],
+            'properties': row['properties'],
+            'icon': row['icon'],
+            'children': [],
+            'created_at': datetime_field.to_representation(row['created_at']),
+            'updated_at': datetime_field.to_representation(row['updated_at']),
+        }
+    for node in nodes.values():
+        parent = nodes.get(node['parent'])
+        if parent is not None:
+            parent['children'].append(node)
+        elif node['parent'] is None:
+            roots.append(node)
+    return roots
+
+class TaskSerializer(metrics.TimedDataMixin, serializers.ModelSerializer):
     default_tags = TagSerializer(many=True, read_only=True)
     category_name = serializers.CharField(source='category.path', read_only=True)
     
     class Meta:
         model = Task
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
 
-class TimeEntrySerializer(serializers.ModelSerializer):
+class TimeEntryListSerializer(TimedListSerializer):
+    def to_representation(self, data):
+        # Agregados de todas as categorias da página numa consulta, antes dos itens
+        entries = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.context['_speedrun_stats'] = speedrun.subtree_stats(
+            {entry.category_id for entry in entries if entry.end_at}
+        )
+        return super().to_representation(entries)
+
+class TimeEntrySerializer(metrics.TimedDataMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     task_name = serializers.CharField(source='task.name', read_only=True, allow_null=True)
     category_name = serializers.CharField(source='category.path', read_only=True)
     is_running = serializers.BooleanField(read_only=True)
     speedrun_dynamic = serializers.SerializerMethodField()
+    speedrun_snapshot_pending = serializers.SerializerMethodField()
+
+    def get_speedrun_snapshot_pending(self, obj):
+        # meta['speedrun_snapshot'] chega depois, quando o trabalho em segundo plano termina
+        return bool((obj.meta or {}).get(speedrun.PENDING_KEY))
 
     def get_speedrun_dynamic(self, obj):
         if not obj.end_at:
             return None
+        stats = self.context.get('_speedrun_stats', {}).get(obj.category_id)
+        if stats is None:
+            stats = speedrun.subtree_stats([obj.category_id])[obj.category_id]
+        return speedrun.dynamic_from_stats(obj, stats)
 
-        cache = self.context.setdefault('_speedrun_category_cache', {})
-        category_path = obj.category.path
+    def validate(self, attrs):
+        # O índice único entry_single_running recusaria o segundo timer com erro 500
+        end_at = attrs['end_at'] if 'end_at' in attrs else getattr(self.instance, 'end_at', None)
+        if end_at is None:
+            running = TimeEntry.objects.filter(end_at__isnull=True)
+            if self.instance is not None:
+                running = running.exclude(pk=self.instance.pk)
+            if running.exists():
+                raise serializers.ValidationError({'end_at': 'Já existe um timer rodando; pare-o antes'})
+        return attrs
 
-        stats = cache.get(category_path)
-        if stats is None:
-            base_queryset = TimeEntry.objects.filter(
-                category__path__startswith=category_path,
-                end_at__isnull=False
-            )
-            aggregates = base_queryset.aggregate(
-                avg_duration=Avg('duration_seconds'),
-                min_duration=Min('duration_seconds'),
-                total_entries=Count('id'),
-            )
-            first_entry = base_queryset.order_by('end_at', 'id').values('id').first()
-            stats = {
-                'avg_duration': float(aggregates['avg_duration'] or 0),
-                'min_duration': int(aggregates['min_duration'] or 0),
-                'total_entries': int(aggregates['total_entries'] or 0),
-                'first_entry_id': int(first_entry['id']) if first_entry else None,
-            }
-            cache[category_path] = stats
-
-        current_seconds = int(obj.duration_seconds or 0)
-        avg_duration = stats['avg_duration']
-        min_duration = stats['min_duration']
-        total_entries = stats['total_entries']
-        first_entry_id = stats['first_entry_id']
-
-        if total_entries <= 1 or avg_duration <= 0 or obj.id == first_entry_id:
-            return {
-                'status': 'first',
-                'label': 'Primeira sessão',
-                'current_seconds': current_seconds,
-                'avg_duration': round(avg_duration),
-                'min_duration': min_duration,
-                'total_entries': total_entries,
-                'ratio_percent': 100,
-            }
-
-        ratio = current_seconds / avg_duration
-        ratio_percent = int(round(ratio * 100))
-
-        if current_seconds <= min_duration:
-            status = 'record'
-            label = 'Recorde'
-        elif ratio <= 0.90:
-            status = 'fast'
-            label = 'Bom ritmo'
-        elif ratio <= 1.10:
-            status = 'normal'
-            label = 'Na média'
-        elif ratio <= 1.35:
-            status = 'slow'
-            label = 'Abaixo da média'
-        else:
-            status = 'very_slow'
-            label = 'Bem abaixo da média'
-
-        return {
-            'status': status,
-            'label': label,
-            'current_seconds': current_seconds,
-            'avg_duration': round(avg_duration),
-            'min_duration': min_duration,
-            'total_entries': total_entries,
-            'ratio_percent': ratio_percent,
-        }
-    
     class Meta:
         model = TimeEntry
         fields = '__all__'
+        list_serializer_class = TimeEntryListSerializer
 
 class TimerStartSerializer(serializers.Serializer):
     category_id = serializers.IntegerField()
@@ -119,3 +121,69 @@ class TimerStartSerializer(serializers.Serializer):
 
 class TimerStopSerializer(serializers.Serializer):
     entry_id = serializers.IntegerField()
+
+class TimeEntryImportSerializer(serializers.Serializer):
+    category_id = serializers.IntegerField()
+    task_id = serializers.IntegerField(required=False, allow_null=True)
+    start_at = serializers.DateTimeField()
+    end_at = serializers.DateTimeField()
+    note = serializers.CharField(required=False, allow_blank=True, default='')
+    tag_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def validate(self, attrs):
+        if attrs['end_at'] < attrs['start_at']:
+            raise serializers.ValidationError({'end_at': 'O fim deve ser depois do início'})
+        return attrs
+
+class TimeEntrySelectionSerializer(serializers.Serializer):
+    """Entradas de uma operação em massa: lista de ids, os filtros da listagem ou `all`"""
+    # Filtros que restringem a seleção; include_descendants só modifica `category`
+    FILTER_KEYS = ('from', 'to', 'category', 'tag')
+
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = serializers.DictField(required=False)
+    # Todas as entradas só com pedido explícito: um filtro vazio não seleciona tudo
+    all = serializers.BooleanField(required=False, default=False)
+
+    def validate_filter(self, value):
+        unknown = sorted(set(value) - {*self.FILTER_KEYS, 'include_descendants'})
+        if unknown:
+            raise serializers.ValidationError(f'Filtros desconhecidos: {", ".join(unknown)}')
+        if not any(value.get(key) not in (None, '') for key in self.FILTER_KEYS):
+            raise serializers.ValidationError(
+                f'Informe ao menos um filtro ({", ".join(self.FILTER_KEYS)}) ou use "all": true'
+            )
+        return value
+
+    def validate(self, attrs):
+        if ('ids' in attrs) + ('filter' in attrs) + attrs['all'] != 1:
+            raise serializers.ValidationError('Envie `ids`, `filter` ou `"all": true` (apenas um)')
+        return attrs
+
+class TimeEntryBulkUpdateSerializer(TimeEntrySelectionSerializer):
+    category_id = serializers.IntegerField(required=False)
+    task_id = serializers.IntegerField(required=False, allow_null=True)
+    add_tag_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    remove_tag_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    # Deslocamentos em segundos; shift_seconds move início e fim juntos
+    shift_seconds = serializers.IntegerField(required=False, default=0)
+    shift_start_seconds = serializers.IntegerField(required=False, default=0)
+    shift_end_seconds = serializers.IntegerField(required=False, default=0)
+
+class SyncMutationSerializer(serializers.Serializer):
+    """Uma mutação enfileirada pelo cliente offline (ver core.sync)"""
+    op = serializers.ChoiceField(choices=['create', 'update', 'delete'])
+    model = serializers.ChoiceField(choices=['category', 'tag', 'task', 'entry'])
+    # Id do servidor ou o client_id de um create anterior do mesmo lote
+    id = serializers.JSONField(required=False)
+    client_id = serializers.CharField(required=False, max_length=64)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['op'] != 'create' and not isinstance(attrs.get('id'), (int, str)):
+            raise serializers.ValidationError({'id': 'Informe o id (ou client_id) do objeto'})
+        return attrs
+
+class SyncBatchSerializer(serializers.Serializer):
+    batch_id = serializers.CharField(required=False, max_length=64)
+    mutations = serializers.ListField(child=SyncMutationSerializer(), allow_empty=False, max_length=1000)
@@ -0,0 +1,41 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import derived, versioning
+from .models import Tag, Task, TimeEntry
+
+
+@receiver(m2m_changed, sender=TimeEntry.tags.through)
+def entry_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mantém os baldes por tag quando as tags de uma entrada mudam"""
+    if action not in ('pre_add', 'post_add', 'pre_remove', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    if reverse:
+        # tag.timeentry_set.add/remove/clear: instance é a tag
+        if action == 'pre_clear':
+            instance._cleared_entry_ids = list(instance.timeentry_set.values_list('id', flat=True))
+        entry_ids = pk_set if pk_set is not None else getattr(instance, '_cleared_entry_ids', [])
+    else:
+        entry_ids = [instance.pk]
+    derived.apply_entry_tags_change(entry_ids, removing=action.startswith('pre_'))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    # As ligações com as entradas somem em cascata, sem m2m_changed
+    versioning.bump_version('entries')
+    versioning.bump_version('tags')
+
+
+# Nomes de tasks e tags aparecem nas listagens e nas estatísticas
+# (ETags da versão `data` e chaves do cache de resultados)
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(m2m_changed, sender=Task.default_tags.through)
+def task_changed(sender, **kwargs):
+    versioning.bump_version('tasks')
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, **kwargs):
+    versioning.bump_version('tags')
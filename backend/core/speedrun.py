@@ -0,0 +1,491 @@
+"""Classificação de speedrun e índice de prefixos por categoria.
+
+Há duas leituras da mesma classificação (`classify_speedrun`), no mesmo
+formato: o snapshot "na época", gravado em `meta['speedrun_snapshot']`
+contra as sessões que terminaram antes (pelo índice de prefixos), e o campo
+dinâmico "hoje" da listagem, contra todas as sessões da subárvore (pelos
+rollups, lidos em lote por `subtree_stats`).
+
+`SpeedrunPrefix` guarda, para cada categoria e cada entrada finalizada da
+sua subárvore, os agregados acumulados (contagem, soma e mínimo) em ordem
+de `(end_at, entry_id)`. Assim, "quantas entradas terminaram antes de T, com
+que média e mínimo" vira a leitura de uma única linha pelo índice, em vez de
+carregar todo o histórico da subárvore.
+"""
+import logging
+from collections import namedtuple
+
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Least
+
+from . import hierarchy, rollups, versioning
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+
+
+LABELS = {
+    'first': 'Primeira sessão',
+    'record': 'Recorde',
+    'fast': 'Bom ritmo',
+    'normal': 'Na média',
+    'slow': 'Abaixo da média',
+    'very_slow': 'Bem abaixo da média',
+}
+
+# Agregados finalizados da subárvore de uma categoria (do rollup)
+SubtreeStats = namedtuple('SubtreeStats', ['total_entries', 'total_seconds', 'min_duration', 'first_entry_id'])
+EMPTY_STATS = SubtreeStats(0, 0, 0, None)
+STATS_CACHE_PREFIX = 'speedrun_stats'
+
+
+def classify_speedrun(current_seconds, avg_duration, min_duration, total_entries, is_first=False):
+    if is_first or total_entries <= 1 or avg_duration <= 0:
+        return {
+            'status': 'first',
+            'label': LABELS['first'],
+            'ratio_percent': 100,
+        }
+
+    ratio = current_seconds / avg_duration
+    ratio_percent = int(round(ratio * 100))
+
+    if current_seconds <= min_duration:
+        status = 'record'
+    elif ratio <= 0.90:
+        status = 'fast'
+    elif ratio <= 1.10:
+        status = 'normal'
+    elif ratio <= 1.35:
+        status = 'slow'
+    else:
+        status = 'very_slow'
+
+    return {
+        'status': status,
+        'label': LABELS[status],
+        'ratio_percent': ratio_percent,
+    }
+
+
+def _summary(current_seconds, avg_duration, min_duration, total_entries, is_first=False):
+    """Classificação com os números usados nela (formato comum do campo dinâmico e do snapshot)"""
+    return {
+        **classify_speedrun(current_seconds, avg_duration, min_duration, total_entries, is_first),
+        'current_seconds': current_seconds,
+        'avg_duration': round(avg_duration),
+        'min_duration': int(min_duration),
+        'total_entries': int(total_entries),
+    }
+
+
+def snapshot_from_prefix(current_seconds, compared_entries, compared_seconds, min_duration):
+    """Snapshot "na época": a entrada contra as sessões da subárvore que terminaram antes dela"""
+    current_seconds = int(current_seconds or 0)
+    if compared_entries == 0:
+        return {**_summary(current_seconds, 0, 0, 1, is_first=True), 'compared_entries': 0}
+    return {
+        **_summary(current_seconds, compared_seconds / compared_entries, min_duration, compared_entries + 1),
+        'compared_entries': int(compared_entries),
+    }
+
+
+def dynamic_from_stats(entry, stats):
+    """Classificação "hoje": a entrada contra todas as sessões finalizadas da subárvore"""
+    if entry.end_at is None:
+        return None
+    avg_duration = stats.total_seconds / stats.total_entries if stats.total_entries else 0
+    return _summary(
+        int(entry.duration_seconds or 0), avg_duration, stats.min_duration, stats.total_entries,
+        is_first=entry.id == stats.first_entry_id,
+    )
+
+
+def subtree_stats(category_ids):
+    """{categoria: SubtreeStats} com uma única consulta para todas as categorias pedidas.
+
+    O resultado fica no cache sob a versão `entries`, que muda a cada escrita
+    em entradas (e nas reconstruções dos dados derivados).
+    """
+    from .models import CategoryRollup
+
+    category_ids = {int(pk) for pk in category_ids if pk is not None}
+    if not category_ids:
+        return {}
+    version = versioning.get_version('entries')
+    keys = {f'{STATS_CACHE_PREFIX}:{version}:{pk}': pk for pk in category_ids}
+    cached = cache.get_many(keys)
+    stats = {keys[key]: SubtreeStats(*value) for key, value in cached.items()}
+
+    missing = category_ids - set(stats)
+    if missing:
+        rows = CategoryRollup.objects.filter(category_id__in=missing, entry_count__gt=0).values_list(
+            'category_id', 'entry_count', 'total_seconds', 'min_seconds', 'first_entry_id'
+        )
+        loaded = {category_id: SubtreeStats(*values) for category_id, *values in rows}
+        loaded.update({pk: EMPTY_STATS for pk in missing - set(loaded)})
+        cache.set_many({f'{STATS_CACHE_PREFIX}:{version}:{pk}': tuple(value) for pk, value in loaded.items()})
+        stats.update(loaded)
+    return stats
+
+
+def prefix_before(category_id, end_at):
+    """Agregados das entradas da subárvore que terminaram antes de `end_at`"""
+    from .models import SpeedrunPrefix
+
+    row = (
+        SpeedrunPrefix.objects.filter(category_id=category_id, end_at__lt=end_at)
+        .order_by('-end_at', '-entry_id')
+        .values('cum_count', 'cum_seconds', 'cum_min')
+        .first()
+    )
+    if row is None:
+        return 0, 0, 0
+    return row['cum_count'], row['cum_seconds'], row['cum_min']
+
+
+def build_speedrun_snapshot(entry):
+    count, seconds, minimum = prefix_before(entry.category_id, entry.end_at)
+    return snapshot_from_prefix(entry.duration_seconds, count, seconds, minimum)
+
+
+# Marca em meta enquanto o snapshot da entrada está na fila
+PENDING_KEY = 'speedrun_snapshot_pending'
+
+
+def schedule_snapshot(entry):
+    """Enfileira o cálculo do snapshot de `entry` (já marcada como pendente em meta)"""
+    from . import jobs
+    from .models import SnapshotJob
+
+    SnapshotJob.objects.get_or_create(entry_id=entry.id)
+    entry_id = entry.id
+    transaction.on_commit(lambda: jobs.dispatch(('speedrun_snapshot', entry_id), compute_snapshot, entry_id))
+
+
+def compute_snapshot(entry_id):
+    """Grava o snapshot de uma entrada da fila; idempotente, falhas contam tentativas no trabalho"""
+    from . import events
+    from .models import SnapshotJob, TimeEntry
+
+    if not SnapshotJob.objects.filter(entry_id=entry_id).exists():
+        return
+    try:
+        with transaction.atomic():
+            entry = TimeEntry.objects.filter(id=entry_id, end_at__isnull=False).first()
+            if entry is not None:
+                meta = dict(entry.meta or {})
+                meta['speedrun_snapshot'] = build_speedrun_snapshot(entry)
+                meta.pop(PENDING_KEY, None)
+                # Só o meta muda; update evita a manutenção dos dados derivados do save()
+                TimeEntry.objects.filter(id=entry_id).update(meta=meta)
+                # Os agregados não mudam, só a resposta da API (versão `data`)
+                versioning.bump_version()
+                events.entries_changed('updated', [entry_id])
+            SnapshotJob.objects.filter(entry_id=entry_id).delete()
+    except Exception as error:
+        SnapshotJob.objects.filter(entry_id=entry_id).update(attempts=F('attempts') + 1, last_error=str(error))
+        raise
+
+
+def refresh_snapshots(entry_ids):
+    """Recalcula o snapshot das entradas dadas (edições em massa), em lotes de `BATCH_SIZE` ids.
+
+    Em cada lote, para cada categoria, lê o prefixo anterior à primeira
+    entrada e, em ordem, as linhas do índice até a última; cada entrada pega
+    o último prefixo que terminou antes dela. Devolve o número de entradas
+    atualizadas.
+    """
+    entry_ids = list(entry_ids)
+    updated = 0
+    with transaction.atomic():
+        for offset in range(0, len(entry_ids), BATCH_SIZE):
+            updated += _refresh_snapshot_batch(entry_ids[offset:offset + BATCH_SIZE])
+    return updated
+
+
+def _refresh_snapshot_batch(entry_ids):
+    from .models import SnapshotJob, SpeedrunPrefix, TimeEntry
+
+    entries = list(
+        TimeEntry.objects.filter(id__in=entry_ids, end_at__isnull=False)
+        .only('id', 'category_id', 'end_at', 'duration_seconds', 'meta')
+        .order_by('category_id', 'end_at', 'id')
+    )
+    by_category = {}
+    for entry in entries:
+        by_category.setdefault(entry.category_id, []).append(entry)
+
+    for category_id, group in by_category.items():
+        prefix = prefix_before(category_id, group[0].end_at)
+        rows = (
+            SpeedrunPrefix.objects.filter(
+                category_id=category_id, end_at__gte=group[0].end_at, end_at__lt=group[-1].end_at
+            )
+            .order_by('end_at', 'entry_id')
+            .values_list('end_at', 'cum_count', 'cum_seconds', 'cum_min')
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+        pending = next(rows, None)
+        for entry in group:
+            while pending is not None and pending[0] < entry.end_at:
+                prefix = pending[1:]
+                pending = next(rows, None)
+            meta = dict(entry.meta or {})
+            meta['speedrun_snapshot'] = snapshot_from_prefix(entry.duration_seconds, *prefix)
+            meta.pop(PENDING_KEY, None)
+            entry.meta = meta
+    # Só o meta muda; bulk_update não passa por save() nem pelos dados derivados
+    TimeEntry.objects.bulk_update(entries, ['meta'], batch_size=BATCH_SIZE)
+    SnapshotJob.objects.filter(entry_id__in=entry_ids).delete()
+    return len(entries)
+
+
+def pending_snapshot_ids(limit, max_attempts=None):
+    from . import jobs
+    from .models import SnapshotJob
+
+    max_attempts = jobs.MAX_ATTEMPTS if max_attempts is None else max_attempts
+    jobs_queryset = SnapshotJob.objects.filter(attempts__lt=max_attempts).order_by('created_at')
+    return jobs_queryset.values_list('entry_id', flat=True)[:limit]
+
+
+def requeue_pending_snapshots():
+    """Modo `thread`: põe de volta na fila os trabalhos gravados no banco e avisa dos que esgotaram as tentativas"""
+    from . import jobs
+
+    for entry_id in list(pending_snapshot_ids(None)):
+        jobs.dispatch(('speedrun_snapshot', entry_id), compute_snapshot, entry_id)
+    failed = failed_snapshot_jobs().count()
+    if failed:
+        logger.warning('%s snapshots de speedrun esgotaram as tentativas; veja `run_jobs --failed`', failed)
+
+
+def failed_snapshot_jobs():
+    """Trabalhos que falharam `jobs.MAX_ATTEMPTS` vezes e saíram da fila"""
+    from . import jobs
+    from .models import SnapshotJob
+
+    return SnapshotJob.objects.filter(attempts__gte=jobs.MAX_ATTEMPTS).order_by('created_at')
+
+
+def retry_failed_snapshots():
+    """Zera as tentativas dos trabalhos esgotados, que voltam para a fila; devolve quantos"""
+    return failed_snapshot_jobs().update(attempts=0, last_error='')
+
+
+def _before_q(end_at, entry_id):
+    return Q(end_at__lt=end_at) | Q(end_at=end_at, entry_id__lt=entry_id)
+
+
+def _after_q(end_at, entry_id):
+    return Q(end_at__gt=end_at) | Q(end_at=end_at, entry_id__gt=entry_id)
+
+
+def _insert(category_id, entry_id, end_at, seconds):
+    from .models import SpeedrunPrefix
+
+    rows = SpeedrunPrefix.objects.filter(category_id=category_id)
+    previous = rows.filter(_before_q(end_at, entry_id)).order_by('-end_at', '-entry_id').first()
+    SpeedrunPrefix.objects.create(
+        category_id=category_id,
+        entry_id=entry_id,
+        end_at=end_at,
+        duration_seconds=seconds,
+        cum_count=(previous.cum_count if previous else 0) + 1,
+        cum_seconds=(previous.cum_seconds if previous else 0) + seconds,
+        cum_min=min(previous.cum_min, seconds) if previous else seconds,
+    )
+    # Entradas inseridas fora de ordem deslocam o sufixo (normalmente vazio)
+    rows.filter(_after_q(end_at, entry_id)).update(
+        cum_count=F('cum_count') + 1,
+        cum_seconds=F('cum_seconds') + seconds,
+        cum_min=Least('cum_min', Value(seconds)),
+    )
+
+
+def _recompute_suffix_min(category_id, end_at, entry_id):
+    from .models import SpeedrunPrefix
+
+    rows = SpeedrunPrefix.objects.filter(category_id=category_id)
+    previous = rows.filter(_before_q(end_at, entry_id)).order_by('-end_at', '-entry_id').first()
+    running_min = previous.cum_min if previous else None
+    changed = []
+    for row in rows.filter(_after_q(end_at, entry_id)).order_by('end_at', 'entry_id').iterator(chunk_size=BATCH_SIZE):
+        running_min = row.duration_seconds if running_min is None else min(running_min, row.duration_seconds)
+        if row.cum_min != running_min:
+            row.cum_min = running_min
+            changed.append(row)
+    SpeedrunPrefix.objects.bulk_update(changed, ['cum_min'], batch_size=BATCH_SIZE)
+
+
+def _remove(entry_id):
+    from .models import SpeedrunPrefix
+
+    for row in list(SpeedrunPrefix.objects.filter(entry_id=entry_id)):
+        row.delete()
+        suffix = SpeedrunPrefix.objects.filter(category_id=row.category_id).filter(
+            _after_q(row.end_at, row.entry_id)
+        )
+        suffix.update(
+            cum_count=F('cum_count') - 1,
+            cum_seconds=F('cum_seconds') - row.duration_seconds,
+        )
+        if suffix.filter(cum_min=row.duration_seconds).exists():
+            _recompute_suffix_min(row.category_id, row.end_at, row.entry_id)
+
+
+def apply_entry_change(old_state, new_state):
+    """Mantém o índice de prefixos (mesmo contrato de `rollups.apply_entry_change`)"""
+    if rollups.duration_key(old_state) == rollups.duration_key(new_state):
+        return
+    if old_state is not None:
+        _remove(old_state.entry_id)
+    if new_state is not None:
+        for ancestor_id in hierarchy.ancestor_ids(new_state.category_id):
+            _insert(ancestor_id, new_state.entry_id, new_state.end_at, new_state.duration_seconds)
+
+
+def _rebuild_category(category_id, since=None):
+    """Regrava o índice da categoria; com `since`, só as linhas de `end_at >= since`,
+    continuando os acumulados da última linha anterior"""
+    from .models import SpeedrunPrefix, TimeEntry
+
+    rows = SpeedrunPrefix.objects.filter(category_id=category_id)
+    entries = TimeEntry.objects.filter(hierarchy.subtree_q(category_id), end_at__isnull=False)
+    count = total = 0
+    minimum = None
+    if since is not None:
+        previous = (
+            rows.filter(end_at__lt=since)
+            .order_by('-end_at', '-entry_id')
+            .values_list('cum_count', 'cum_seconds', 'cum_min')
+            .first()
+        )
+        if previous is not None:
+            count, total, minimum = previous
+        rows = rows.filter(end_at__gte=since)
+        entries = entries.filter(end_at__gte=since)
+    rows.delete()
+
+    batch = []
+    for entry_id, end_at, seconds in entries.order_by('end_at', 'id').values_list(
+        'id', 'end_at', 'duration_seconds'
+    ).iterator(chunk_size=BATCH_SIZE):
+        count += 1
+        total += seconds
+        minimum = seconds if minimum is None else min(minimum, seconds)
+        batch.append(SpeedrunPrefix(
+            category_id=category_id, entry_id=entry_id, end_at=end_at,
+            duration_seconds=seconds, cum_count=count, cum_seconds=total, cum_min=minimum,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            SpeedrunPrefix.objects.bulk_create(batch)
+            batch = []
+    SpeedrunPrefix.objects.bulk_create(batch)
+
+
+def refresh_categories(category_ids, include_ancestors=True):
+    """Reconstrói do zero o índice das categorias (e, por padrão, das ancestrais)"""
+    category_ids = {pk for pk in category_ids if pk is not None}
+    if include_ancestors:
+        category_ids = hierarchy.with_ancestors(category_ids)
+
+    with transaction.atomic():
+        for category_id in category_ids:
+            _rebuild_category(category_id)
+
+
+def apply_entries_change(old_states, new_states):
+    """Versão em lote de `apply_entry_change`, para escritas em massa.
+
+    As linhas anteriores à primeira entrada alterada não mudam: cada categoria
+    afetada (com as ancestrais) é regravada só a partir do menor `end_at`
+    entre os estados de antes e de depois das entradas dela.
+    """
+    removed, added = rollups.changed_states(old_states, new_states)
+    ancestors = hierarchy.ancestors_by_category(state.category_id for state in removed + added)
+    since = {}
+    for state in removed + added:
+        for pk in ancestors[state.category_id]:
+            since[pk] = min(since.get(pk, state.end_at), state.end_at)
+    with transaction.atomic():
+        for category_id, end_at in since.items():
+            _rebuild_category(category_id, since=end_at)
+
+
+def rebuild(apps=django_apps, write_snapshots=False):
+    """Reconstrói o índice inteiro numa única passada ordenada por `end_at`.
+
+    Com `write_snapshots=True`, recalcula também `meta['speedrun_snapshot']`
+    de todas as entradas finalizadas na mesma passada. Retorna o número de
+    entradas processadas.
+    """
+    Category = apps.get_model('core', 'Category')
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    SpeedrunPrefix = apps.get_model('core', 'SpeedrunPrefix')
+
+    ancestors = hierarchy.ancestor_map(Category.objects.values_list('id', 'parent_id'))
+
+    running = {}  # category_id -> [count, seconds, min]
+    prefix_batch = []
+    snapshot_batch = []
+    processed = 0
+
+    def flush(force=False):
+        nonlocal prefix_batch, snapshot_batch
+        if prefix_batch and (force or len(prefix_batch) >= BATCH_SIZE):
+            SpeedrunPrefix.objects.bulk_create(prefix_batch)
+            prefix_batch = []
+        if snapshot_batch and (force or len(snapshot_batch) >= BATCH_SIZE):
+            TimeEntry.objects.bulk_update(snapshot_batch, ['meta'])
+            snapshot_batch = []
+
+    def process_group(group):
+        # Entradas com o mesmo end_at não se comparam entre si (end_at__lt)
+        if write_snapshots:
+            for entry_id, category_id, end_at, seconds, meta in group:
+                count, total, minimum = running.get(category_id, (0, 0, 0))
+                meta = dict(meta or {})
+                meta['speedrun_snapshot'] = snapshot_from_prefix(seconds, count, total, minimum)
+                meta.pop(PENDING_KEY, None)
+                snapshot_batch.append(TimeEntry(id=entry_id, meta=meta))
+        for entry_id, category_id, end_at, seconds, _meta in group:
+            for ancestor_id in ancestors.get(category_id, []):
+                state = running.setdefault(ancestor_id, [0, 0, seconds])
+                state[0] += 1
+                state[1] += seconds
+                state[2] = min(state[2], seconds)
+                prefix_batch.append(SpeedrunPrefix(
+                    category_id=ancestor_id, entry_id=entry_id, end_at=end_at,
+                    duration_seconds=seconds, cum_count=state[0], cum_seconds=state[1], cum_min=state[2],
+                ))
+        flush()
+
+    fields = ['id', 'category_id', 'end_at', 'duration_seconds', 'meta']
+    entries = (
+        TimeEntry.objects.filter(end_at__isnull=False)
+        .order_by('end_at', 'id')
+        .values_list(*fields)
+    )
+    with transaction.atomic():
+        SpeedrunPrefix.objects.all().delete()
+        group = []
+        for row in entries.iterator(chunk_size=BATCH_SIZE):
+            if group and group[0][2] != row[2]:
+                process_group(group)
+                group = []
+            group.append(row)
+            processed += 1
+        if group:
+            process_group(group)
+        flush(force=True)
+        if write_snapshots:
+            # Todos os snapshots foram recalculados; a fila fica vazia
+            apps.get_model('core', 'SnapshotJob').objects.all().delete()
+            versioning.bump_version()
+    return processed
@@ -0,0 +1,254 @@
+"""Sincronização incremental para clientes offline (`/api/sync/`).
+
+O log `core_changelog` (model ChangeLog) guarda a última mudança de cada
+categoria, task, tag e entrada. Quem o grava são triggers do banco, criados
+pela migração 0010 com sua própria cópia do SQL (mudar o esquema do log pede
+uma migração nova), e não o código da aplicação: assim entram também as
+exclusões em cascata, os UPDATE em massa, a importação em lote e os inserts
+diretos nas tabelas de tags. Os triggers das tabelas intermediárias
+(`core_timeentry_tags` e `core_task_default_tags`) registram uma alteração da
+entrada ou da task dona da ligação.
+
+Cada escrita apaga a linha do objeto e insere outra, com id maior: o id é o
+cursor, monotônico, e o log tem no máximo uma linha por objeto (exclusões
+ficam como marcas `deleted`), então não precisa de limpeza e `since=0`
+devolve o estado completo. No PostgreSQL os triggers tomam um advisory lock
+da transação antes de gerar o id, para que a ordem dos ids seja a ordem dos
+commits e um cursor nunca pule uma transação que confirmou depois. O custo
+é que as transações que escrevem nessas tabelas ficam em fila umas das
+outras do primeiro write até o commit (ver o cenário `sync` do
+loadtest_timer); no SQLite as escritas já são serializadas e nada muda.
+
+`changes(since, limit)` lê o log depois do cursor e devolve as linhas atuais
+dos objetos alterados e os ids dos apagados. `apply_batch(mutations)` aplica
+numa transação as mutações enfileiradas pelo cliente, pelos mesmos
+serializers da API, e `push(batch_id, mutations)` torna o envio idempotente
+com SyncBatch.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from rest_framework import serializers
+
+from . import events, timer
+from .models import Category, ChangeLog, SyncBatch, Tag, Task, TimeEntry
+from .serializers import CategorySerializer, TagSerializer, TaskSerializer, TimeEntrySerializer
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+# Nome no log -> model, chave da resposta, colunas lidas, serializer e
+# ligações m2m (campo, coluna do dono e coluna da tag na tabela intermediária)
+Tracked = namedtuple('Tracked', 'model key columns serializer links')
+Link = namedtuple('Link', 'field owner_column tag_column')
+
+TRACKED = {
+    'category': Tracked(
+        Category, 'categories',
+        ('id', 'name', 'parent_id', 'path', 'properties', 'icon', 'created_at', 'updated_at'),
+        CategorySerializer, (),
+    ),
+    'tag': Tracked(Tag, 'tags', ('id', 'name', 'color', 'created_at'), TagSerializer, ()),
+    'task': Tracked(
+        Task, 'tasks',
+        ('id', 'name', 'description', 'category_id', 'properties', 'created_at', 'updated_at'),
+        TaskSerializer, (Link('default_tags', 'task_id', 'tag_id'),),
+    ),
+    'entry': Tracked(
+        TimeEntry, 'entries',
+        ('id', 'category_id', 'task_id', 'start_at', 'end_at', 'duration_seconds', 'note', 'meta',
+         'created_at', 'updated_at'),
+        TimeEntrySerializer, (Link('tags', 'timeentry_id', 'tag_id'),),
+    ),
+}
+
+# Campos de `data` que referenciam outros objetos (e podem vir como client_id)
+REFERENCES = {
+    'category': {'parent': 'category'},
+    'tag': {},
+    'task': {'category': 'category', 'default_tags': 'tag'},
+    'entry': {'category': 'category', 'task': 'task', 'tags': 'tag'},
+}
+
+
+def latest_cursor():
+    return ChangeLog.objects.aggregate(cursor=Max('id'))['cursor'] or 0
+
+
+def _rows(tracked, ids):
+    """Linhas atuais dos objetos, no formato da API (FKs como ids, datas em ISO)"""
+    datetime_field = serializers.DateTimeField()
+    rows = []
+    for values in tracked.model.objects.filter(id__in=ids).order_by('id').values(*tracked.columns):
+        row = {}
+        for column, value in values.items():
+            if isinstance(value, datetime):
+                value = datetime_field.to_representation(value)
+            row[column[:-3] if column.endswith('_id') and column != 'id' else column] = value
+        rows.append(row)
+    for link in tracked.links:
+        tag_ids = {}
+        through = getattr(tracked.model, link.field).through
+        pairs = through.objects.filter(**{f'{link.owner_column}__in': ids}).values_list(
+            link.owner_column, link.tag_column
+        ).order_by(link.owner_column, link.tag_column)
+        for owner_id, tag_id in pairs:
+            tag_ids.setdefault(owner_id, []).append(tag_id)
+        for row in rows:
+            row[link.field] = tag_ids.get(row['id'], [])
+    return rows
+
+
+def changes(since, limit=DEFAULT_LIMIT):
+    """Mudanças depois do cursor `since`, até `limit` linhas do log.
+
+    Um cursor maior que o último (banco recriado ou restaurado) devolve
+    `reset` e recomeça do zero: o cliente deve descartar a cópia local.
+    """
+    reset = since > latest_cursor()
+    if reset:
+        since = 0
+    log = list(
+        ChangeLog.objects.filter(id__gt=since).order_by('id').values_list('id', 'model', 'object_id', 'deleted')[:limit + 1]
+    )
+    more = len(log) > limit
+    log = log[:limit]
+
+    updated = {name: [] for name in TRACKED}
+    deleted = {name: [] for name in TRACKED}
+    for _id, name, object_id, is_deleted in log:
+        (deleted if is_deleted else updated)[name].append(object_id)
+
+    response = {
+        'cursor': log[-1][0] if log else since,
+        'more': more,
+        'reset': reset,
+        'changes': {},
+        'deleted': {},
+    }
+    for name, tracked in TRACKED.items():
+        # Um objeto apagado depois da leitura do log some daqui; a marca vem no próximo cursor
+        response['changes'][tracked.key] = _rows(tracked, updated[name]) if updated[name] else []
+        response['deleted'][tracked.key] = deleted[name]
+    return response
+
+
+class BatchError(Exception):
+    """Mutação inválida: o lote inteiro é desfeito"""
+    def __init__(self, index, errors):
+        super().__init__(index, errors)
+        self.index = index
+        self.errors = errors
+
+
+def _resolve(value, model, client_ids):
+    """Id do servidor para `value`, que pode ser o client_id de um create anterior do lote"""
+    if isinstance(value, str) and (model, value) in client_ids:
+        return client_ids[(model, value)]
+    return value
+
+
+def _resolve_data(name, data, client_ids):
+    data = dict(data)
+    for field, model in REFERENCES[name].items():
+        if field not in data:
+            continue
+        value = data[field]
+        if isinstance(value, list):
+            data[field] = [_resolve(item, model, client_ids) for item in value]
+        else:
+            data[field] = _resolve(value, model, client_ids)
+    return data
+
+
+def _tag_ids(index, field, value):
+    if not isinstance(value, list) or not all(isinstance(tag_id, int) for tag_id in value):
+        raise BatchError(index, {field: ['Envie uma lista de ids de tags']})
+    tag_ids = set(value)
+    missing = tag_ids - set(Tag.objects.filter(id__in=tag_ids).values_list('id', flat=True))
+    if missing:
+        raise BatchError(index, {field: [f'Tags inexistentes: {sorted(missing)}']})
+    return tag_ids
+
+
+def _apply(index, mutation, client_ids, touched):
+    name, op = mutation['model'], mutation['op']
+    tracked = TRACKED[name]
+    result = {'index': index, 'model': name}
+
+    instance = None
+    if op != 'create':
+        object_id = _resolve(mutation['id'], name, client_ids)
+        if not isinstance(object_id, int):
+            raise BatchError(index, {'id': [f'Id ou client_id desconhecido: {mutation["id"]}']})
+        result['id'] = object_id
+        instance = tracked.model.objects.filter(pk=object_id).first()
+        if instance is None:
+            # Apagado no servidor: a exclusão vence e o cliente recebe a marca no próximo pull
+            result['status'] = 'missing'
+            return result
+        if name == 'entry':
+            touched['running'] = touched['running'] or instance.end_at is None
+
+    if op == 'delete':
+        if name == 'entry':
+            touched['deleted'].append(instance.id)
+        instance.delete()
+        result['status'] = 'deleted'
+        return result
+
+    data = _resolve_data(name, mutation['data'], client_ids)
+    links = [link for link in tracked.links if link.field in data]
+    tag_ids = {link.field: _tag_ids(index, link.field, data.pop(link.field)) for link in links}
+    serializer = tracked.serializer(instance, data=data, partial=op == 'update')
+    if not serializer.is_valid():
+        raise BatchError(index, serializer.errors)
+    instance = serializer.save()
+    for link in links:
+        getattr(instance, link.field).set(tag_ids[link.field])
+
+    if op == 'create' and mutation.get('client_id'):
+        client_ids[(name, mutation['client_id'])] = instance.id
+        result['client_id'] = mutation['client_id']
+    if name == 'entry':
+        touched['created' if op == 'create' else 'updated'].append(instance.id)
+        touched['running'] = touched['running'] or instance.end_at is None
+    result['id'] = instance.id
+    result['status'] = 'created' if op == 'create' else 'updated'
+    return result
+
+
+def apply_batch(mutations):
+    """Aplica as mutações em ordem numa transação; BatchError desfaz todas"""
+    client_ids = {}
+    touched = {'created': [], 'updated': [], 'deleted': [], 'running': False}
+    with transaction.atomic():
+        results = [_apply(index, mutation, client_ids, touched) for index, mutation in enumerate(mutations)]
+    for action in ('created', 'updated', 'deleted'):
+        if touched[action]:
+            events.entries_changed(action, touched[action])
+    if touched['running']:
+        events.timer_changed(timer.running_entry())
+    return {'results': results}
+
+
+def push(batch_id, mutations):
+    """apply_batch idempotente: um batch_id já aplicado devolve a resposta gravada"""
+    if not batch_id:
+        return apply_batch(mutations)
+    stored = SyncBatch.objects.filter(pk=batch_id).values_list('response', flat=True).first()
+    if stored is not None:
+        return stored
+    try:
+        with transaction.atomic():
+            response = {'batch_id': batch_id, **apply_batch(mutations)}
+            SyncBatch.objects.create(batch_id=batch_id, response=response)
+    except IntegrityError:
+        # Mesmo lote enviado duas vezes ao mesmo tempo: vale o que confirmou primeiro
+        stored = SyncBatch.objects.filter(pk=batch_id).values_list('response', flat=True).first()
+        if stored is None:
+            raise
+        return stored
+    return response
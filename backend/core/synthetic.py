@@ -0,0 +1,194 @@
+"""Histórico sintético para testes de escala e benchmarks.
+
+Gera uma árvore de categorias com profundidade e ramificação configuráveis,
+tasks nas folhas, tags e um volume grande de entradas finalizadas. As
+distribuições imitam um uso real: poucas categorias e tags concentram a
+maior parte das sessões (pesos de Zipf), as sessões começam mais em horário
+comercial, as durações seguem uma log-normal e a maioria das entradas tem
+zero a duas tags.
+
+Tudo é gravado numa transação (as entradas e tags por `executemany`, em
+lotes gerados com NumPy) e os dados derivados são reconstruídos no final,
+como na importação colunar.
+"""
+import json
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import derived
+from .models import Category, Tag, Task, TimeEntry
+
+BATCH_SIZE = 5000
+LEVEL_NAMES = ['Área', 'Projeto', 'Módulo', 'Tema', 'Tópico']
+TAG_COLORS = ['#EF4444', '#F59E0B', '#10B981', '#3B82F6', '#8B5CF6', '#EC4899', '#C084FC', '#14B8A6']
+# Peso relativo de cada hora local para o início de uma sessão
+HOUR_WEIGHTS = np.array([
+    1, 0.5, 0.3, 0.2, 0.2, 0.5, 2, 4, 8, 10, 10, 9, 6, 8, 10, 10, 9, 7, 5, 5, 6, 5, 3, 2,
+])
+TAG_COUNT_WEIGHTS = np.array([0.35, 0.4, 0.18, 0.07])
+MIN_DURATION = 60
+MAX_DURATION = 6 * 3600
+
+
+def _zipf_weights(count, exponent=1.1):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _create_categories(roots, branching, depth):
+    """Cria a árvore nível a nível; devolve (todas, folhas)"""
+    level = [
+        Category(name=f'{LEVEL_NAMES[0]} {index + 1}', path=f'/{LEVEL_NAMES[0]} {index + 1}')
+        for index in range(roots)
+    ]
+    level = Category.objects.bulk_create(level)
+    categories = list(level)
+    for depth_index in range(1, depth):
+        name = LEVEL_NAMES[min(depth_index, len(LEVEL_NAMES) - 1)]
+        children = [
+            Category(name=f'{name} {index + 1}', parent=parent, path=f'{parent.path}/{name} {index + 1}')
+            for parent in level
+            for index in range(branching)
+        ]
+        level = Category.objects.bulk_create(children, batch_size=BATCH_SIZE)
+        categories.extend(level)
+    return categories, level
+
+
+def _day_starts(last_day, days):
+    """Início (época UTC, em segundos) da meia-noite local de cada um dos últimos `days` dias"""
+    return np.array([
+        int(timezone.make_aware(datetime.combine(last_day - timedelta(days=offset + 1), dt_time.min)).timestamp())
+        for offset in range(days)
+    ], dtype=np.int64)
+
+
+def _insert_entries(ids, category_ids, task_ids, starts, durations):
+    """INSERT em lote direto no cursor: o bulk_create do ORM domina o tempo com milhões de linhas"""
+    table = connection.ops.quote_name(TimeEntry._meta.db_table)
+    adapt = connection.ops.adapt_datetimefield_value
+    now = adapt(timezone.now())
+    meta = json.dumps({})
+    rows = [
+        (
+            entry_id, category_id, task_id if task_id >= 0 else None,
+            adapt(datetime.fromtimestamp(start, tz=dt_timezone.utc)),
+            adapt(datetime.fromtimestamp(start + duration, tz=dt_timezone.utc)),
+            duration, '', meta, now, now,
+        )
+        for entry_id, category_id, task_id, start, duration in zip(
+            ids.tolist(), category_ids.tolist(), task_ids.tolist(), starts.tolist(), durations.tolist()
+        )
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (id, category_id, task_id, start_at, end_at, duration_seconds, note, meta, '
+            f'created_at, updated_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def _insert_links(links):
+    table = connection.ops.quote_name(TimeEntry.tags.through._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {table} (timeentry_id, tag_id) VALUES (%s, %s)', links)
+
+
+def _reset_sequence():
+    # Os ids das entradas foram gravados explicitamente
+    with connection.cursor() as cursor:
+        for statement in connection.ops.sequence_reset_sql(no_style(), [TimeEntry]):
+            cursor.execute(statement)
+
+
+def generate(entries=100000, roots=4, branching=3, depth=4, tags=30, tasks_per_category=3, days=730, seed=0,
+             replace=False, progress=None):
+    """Gera o histórico e devolve a contagem de linhas criadas por tabela"""
+    rng = np.random.default_rng(seed)
+    today = timezone.localtime()
+
+    with transaction.atomic():
+        if replace:
+            TimeEntry.objects.all().delete()
+            Task.objects.all().delete()
+            Category.objects.all().delete()
+            Tag.objects.all().delete()
+        elif Category.objects.exists() or Tag.objects.exists():
+            raise ValueError('O banco já tem dados; use replace=True para substituí-los')
+
+        categories, leaves = _create_categories(roots, branching, depth)
+        tag_objects = Tag.objects.bulk_create([
+            Tag(name=f'tag-{index + 1}', color=TAG_COLORS[index % len(TAG_COLORS)]) for index in range(tags)
+        ])
+        tasks = Task.objects.bulk_create([
+            Task(name=f'Task {index + 1}', category=category)
+            for category in leaves
+            for index in range(tasks_per_category)
+        ], batch_size=BATCH_SIZE)
+        tasks_by_category = {}
+        for task in tasks:
+            tasks_by_category.setdefault(task.category_id, []).append(task.id)
+
+        # Quase todas as sessões são em folhas; algumas ficam nas categorias intermediárias
+        leaf_ids = {category.id for category in leaves}
+        pool = leaves + [category for category in categories if category.id not in leaf_ids]
+        pool_ids = np.array([category.id for category in pool], dtype=np.int64)
+        pool_weights = _zipf_weights(len(pool))
+        # Tasks de cada categoria do pool numa matriz preenchida com -1
+        task_table = np.full((len(pool), max(1, tasks_per_category)), -1, dtype=np.int64)
+        task_counts = np.zeros(len(pool), dtype=np.int64)
+        for index, category in enumerate(pool):
+            category_tasks = tasks_by_category.get(category.id, [])
+            task_table[index, :len(category_tasks)] = category_tasks
+            task_counts[index] = len(category_tasks)
+        tag_ids = np.array([tag.id for tag in tag_objects], dtype=np.int64)
+        log_tag_weights = np.log(_zipf_weights(len(tag_ids))) if len(tag_ids) else None
+        day_starts = _day_starts(today.date(), days)
+        hour_weights = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+
+        next_id = (TimeEntry.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        created_links = 0
+        for offset in range(0, entries, BATCH_SIZE):
+            size = min(BATCH_SIZE, entries - offset)
+            ids = np.arange(next_id + offset, next_id + offset + size, dtype=np.int64)
+            category_index = rng.choice(len(pool), size=size, p=pool_weights)
+            starts = (
+                day_starts[rng.integers(0, days, size=size)]
+                + rng.choice(24, size=size, p=hour_weights) * 3600
+                + rng.integers(0, 3600, size=size)
+            )
+            durations = np.clip(rng.lognormal(np.log(2400), 0.8, size=size), MIN_DURATION, MAX_DURATION).astype(np.int64)
+            counts = task_counts[category_index]
+            picks = (rng.random(size) * np.maximum(counts, 1)).astype(np.int64)
+            task_ids = np.where(
+                (counts > 0) & (rng.random(size) < 0.7), task_table[category_index, np.minimum(picks, task_table.shape[1] - 1)], -1
+            )
+            _insert_entries(ids, pool_ids[category_index], task_ids, starts, durations)
+
+            if len(tag_ids):
+                tag_counts = np.minimum(rng.choice(len(TAG_COUNT_WEIGHTS), size=size, p=TAG_COUNT_WEIGHTS), len(tag_ids))
+                # Amostragem ponderada sem reposição (Gumbel top-k): as k maiores chaves de cada linha
+                keys = log_tag_weights + rng.gumbel(size=(size, len(tag_ids)))
+                top = np.argsort(-keys, axis=1)[:, :len(TAG_COUNT_WEIGHTS) - 1]
+                chosen = np.arange(top.shape[1]) < tag_counts[:, None]
+                links = list(zip(np.repeat(ids, chosen.sum(axis=1)).tolist(), tag_ids[top[chosen]].tolist()))
+                _insert_links(links)
+                created_links += len(links)
+
+            if progress is not None:
+                progress(offset + size, entries)
+
+        _reset_sequence()
+        derived.rebuild_all()
+
+    return {
+        'categories': len(categories),
+        'tasks': len(tasks),
+        'tags': len(tag_objects),
+        'entries': entries,
+        'entry_tags': created_links,
+    }
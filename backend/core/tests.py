@@ -0,0 +1,991 @@
+import asyncio
+import datetime as dt
+import io
+import json
+import re
+import statistics
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from datetime import timedelta
+from unittest import mock
+
+import pyarrow.parquet as pq
+from asgiref.sync import async_to_sync
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import analytics, bulk, columnar, compact, derived, events, exporters, hierarchy, jobs, metrics, ranges, results, speedrun, versioning
+from .models import (
+    Category, CategoryClosure, CategoryRollup, ChangeLog, DailyBucket, SnapshotJob, SpeedrunPrefix, Tag, Task, TimeEntry,
+)
+
+
+class EntryTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Trabalho')
+        self.other_category = Category.objects.create(name='Estudo')
+
+    def make_entry(self, category=None, hours_ago=2, **kwargs):
+        start_at = timezone.now() - timedelta(hours=hours_ago)
+        return TimeEntry.objects.create(
+            category=category or self.category, start_at=start_at, end_at=start_at + timedelta(minutes=30), **kwargs
+        )
+
+
+class BulkSelectionTests(EntryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.entries = [self.make_entry() for _ in range(3)]
+        self.other = self.make_entry(self.other_category)
+
+    def test_empty_filter_is_rejected(self):
+        for body in ({'filter': {}}, {'filter': {'include_descendants': '1'}}, {}):
+            response = self.client.post('/api/entries/bulk_delete/', body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(TimeEntry.objects.count(), 4)
+
+    def test_empty_filter_is_rejected_on_update(self):
+        response = self.client.post(
+            '/api/entries/bulk_update/', {'filter': {}, 'shift_seconds': 60}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_filter_is_rejected(self):
+        response = self.client.post('/api/entries/bulk_delete/', {'filter': {'categoria': 1}}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(TimeEntry.objects.count(), 4)
+
+    def test_filter_deletes_only_selection(self):
+        response = self.client.post(
+            '/api/entries/bulk_delete/', {'filter': {'category': self.category.id}}, format='json'
+        )
+        self.assertEqual(response.json(), {'deleted': 3})
+        self.assertEqual(list(TimeEntry.objects.values_list('id', flat=True)), [self.other.id])
+
+    def test_all_requires_explicit_flag(self):
+        response = self.client.post('/api/entries/bulk_delete/', {'ids': [self.other.id], 'all': True}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/entries/bulk_delete/', {'all': True}, format='json')
+        self.assertEqual(response.json(), {'deleted': 4})
+        self.assertFalse(TimeEntry.objects.exists())
+
+
+class BulkDerivedDataTests(EntryTestCase):
+    """As escritas em massa aplicam diferenças; o resultado deve ser o de uma reconstrução"""
+
+    def setUp(self):
+        super().setUp()
+        self.child = Category.objects.create(name='Reuniões', parent=self.category)
+        self.tags = [Tag.objects.create(name=name) for name in ('foco', 'casa')]
+        self.entries = [
+            self.make_entry(self.child if index % 3 == 0 else self.category, hours_ago=index * 5 + 1)
+            for index in range(12)
+        ]
+        for entry in self.entries[::2]:
+            entry.tags.add(self.tags[0])
+
+    def derived_rows(self):
+        return (
+            # Rollups zerados ficam no banco; as leituras usam entry_count > 0
+            sorted(CategoryRollup.objects.filter(entry_count__gt=0).values_list(
+                'category_id', 'entry_count', 'total_seconds', 'min_seconds', 'max_seconds', 'sum_squares',
+                'first_entry_id',
+            )),
+            sorted(SpeedrunPrefix.objects.values_list(
+                'category_id', 'entry_id', 'cum_count', 'cum_seconds', 'cum_min',
+            )),
+            sorted(DailyBucket.objects.values_list(
+                'day', 'category_id', 'task_id', 'tag_id', 'total_seconds', 'entry_count',
+            ), key=repr),
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.derived_rows()
+        derived.rebuild_all()
+        self.assertEqual(incremental, self.derived_rows())
+
+    def selection(self, entries):
+        return TimeEntry.objects.filter(id__in=[entry.id for entry in entries])
+
+    def test_update(self):
+        changes = {'shift_seconds': 0, 'shift_start_seconds': 0, 'shift_end_seconds': 0,
+                   'add_tag_ids': [], 'remove_tag_ids': []}
+        bulk.update_entries(self.selection(self.entries[2:7]), {
+            **changes, 'category_id': self.other_category.id, 'shift_end_seconds': -300,
+        })
+        bulk.update_entries(self.selection(self.entries[5:]), {
+            **changes, 'shift_seconds': 86400, 'add_tag_ids': [self.tags[1].id], 'remove_tag_ids': [self.tags[0].id],
+        })
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        bulk.delete_entries(self.selection(self.entries[::3] + self.entries[4:6]))
+        self.assertMatchesRebuild()
+
+    def test_import(self):
+        start_at = timezone.now() - timedelta(hours=30)
+        created, errors = bulk.import_entries([
+            {'category_id': category.id, 'start_at': (start_at + timedelta(hours=index)).isoformat(),
+             'end_at': (start_at + timedelta(hours=index, minutes=index + 5)).isoformat(),
+             'tag_ids': [tag.id for tag in self.tags[:index % 3]]}
+            for index, category in enumerate([self.child, self.category, self.other_category] * 2)
+        ])
+        self.assertEqual((created, errors), (6, []))
+        self.assertMatchesRebuild()
+
+
+class RunningTimerTests(EntryTestCase):
+    def start(self, **data):
+        return self.client.post('/api/entries/start_timer/', {'category_id': self.category.id, **data}, format='json')
+
+    def test_start_swaps_running_timer(self):
+        first = self.start().json()
+        second = self.start(note='segundo').json()
+        running = TimeEntry.objects.filter(end_at__isnull=True)
+        self.assertEqual(list(running.values_list('id', flat=True)), [second['id']])
+        self.assertIsNotNone(TimeEntry.objects.get(id=first['id']).end_at)
+
+    def test_database_rejects_second_running_entry(self):
+        TimeEntry.objects.create(category=self.category, start_at=timezone.now())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TimeEntry.objects.create(category=self.category, start_at=timezone.now())
+
+    def test_api_rejects_second_running_entry(self):
+        self.start()
+        response = self.client.post(
+            '/api/entries/', {'category': self.category.id, 'start_at': timezone.now().isoformat()}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('end_at', response.json())
+
+    def test_stop(self):
+        entry = self.start().json()
+        response = self.client.post('/api/entries/stop_timer/', {'entry_id': entry['id']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(TimeEntry.objects.filter(end_at__isnull=True).exists())
+        response = self.client.post('/api/entries/stop_timer/', {'entry_id': entry['id']}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+class DailyBucketTests(EntryTestCase):
+    def test_key_is_unique_with_null_task_and_tag(self):
+        entry = self.make_entry()
+        bucket = DailyBucket.objects.get(category=self.category, task__isnull=True, tag__isnull=True)
+        self.assertEqual((bucket.total_seconds, bucket.entry_count), (1800, 1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailyBucket.objects.create(day=bucket.day, category=self.category, total_seconds=entry.duration_seconds)
+
+    def test_entries_of_same_key_share_a_row(self):
+        tag = Tag.objects.create(name='foco')
+        for _ in range(2):
+            self.make_entry().tags.add(tag)
+        rows = DailyBucket.objects.order_by('tag_id').values_list('tag_id', 'total_seconds', 'entry_count')
+        self.assertCountEqual(rows, [(None, 3600, 2), (tag.id, 3600, 2)])
+
+
+class SyncTests(EntryTestCase):
+    def pull(self, since, **params):
+        response = self.client.get('/api/sync/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_state_and_cursor(self):
+        entry = self.make_entry()
+        state = self.pull(0)
+        self.assertEqual({row['id'] for row in state['changes']['categories']}, {self.category.id, self.other_category.id})
+        self.assertEqual([row['id'] for row in state['changes']['entries']], [entry.id])
+        self.assertFalse(state['more'])
+        self.assertEqual(self.pull(state['cursor'])['changes']['entries'], [])
+
+    def test_update_moves_object_past_cursor(self):
+        entry = self.make_entry()
+        cursor = self.pull(0)['cursor']
+        entry.note = 'editada'
+        entry.save()
+        changes = self.pull(cursor)
+        self.assertGreater(changes['cursor'], cursor)
+        self.assertEqual([row['note'] for row in changes['changes']['entries']], ['editada'])
+        # Uma linha por objeto no log
+        self.assertEqual(ChangeLog.objects.filter(model='entry', object_id=entry.id).count(), 1)
+
+    def test_tag_link_is_an_entry_change(self):
+        entry = self.make_entry()
+        tag = Tag.objects.create(name='foco')
+        cursor = self.pull(0)['cursor']
+        entry.tags.add(tag)
+        self.assertEqual(self.pull(cursor)['changes']['entries'][0]['tags'], [tag.id])
+
+    def test_cascade_delete_leaves_tombstones(self):
+        task = Task.objects.create(name='Relatório', category=self.category)
+        entry = self.make_entry(task=task)
+        entry.tags.add(Tag.objects.create(name='foco'))
+        cursor = self.pull(0)['cursor']
+        category_id = self.category.id
+        self.category.delete()
+        changes = self.pull(cursor)
+        self.assertEqual(changes['deleted']['categories'], [category_id])
+        self.assertEqual(changes['deleted']['tasks'], [task.id])
+        self.assertEqual(changes['deleted']['entries'], [entry.id])
+        self.assertEqual(changes['changes']['entries'], [])
+        # since=0 não devolve os apagados como alterados
+        state = self.pull(0)
+        self.assertNotIn(entry.id, [row['id'] for row in state['changes']['entries']])
+        self.assertIn(entry.id, state['deleted']['entries'])
+
+    def test_paging_and_reset(self):
+        for index in range(5):
+            Tag.objects.create(name=f'tag{index}')
+        first = self.pull(0, limit=3)
+        self.assertTrue(first['more'])
+        rest = self.pull(first['cursor'], limit=10)
+        self.assertFalse(rest['more'])
+        tags = first['changes']['tags'] + rest['changes']['tags']
+        self.assertEqual(len(tags), 5)
+        self.assertTrue(self.pull(rest['cursor'] + 1000)['reset'])
+
+    def test_push_with_client_ids_and_replay(self):
+        start_at = timezone.now() - timedelta(hours=1)
+        batch = {'batch_id': 'lote-1', 'mutations': [
+            {'op': 'create', 'model': 'task', 'client_id': 't1', 'data': {'name': 'Offline', 'category': self.category.id}},
+            {'op': 'create', 'model': 'entry', 'client_id': 'e1', 'data': {
+                'category': self.category.id, 'task': 't1', 'start_at': start_at.isoformat(),
+                'end_at': (start_at + timedelta(minutes=10)).isoformat(),
+            }},
+            {'op': 'update', 'model': 'entry', 'id': 'e1', 'data': {'note': 'offline'}},
+            {'op': 'delete', 'model': 'entry', 'id': 999999},
+        ]}
+        response = self.client.post('/api/sync/', batch, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'created', 'updated', 'missing'])
+        entry = TimeEntry.objects.get(id=results[1]['id'])
+        self.assertEqual((entry.task_id, entry.note, entry.duration_seconds), (results[0]['id'], 'offline', 600))
+
+        replay = self.client.post('/api/sync/', batch, format='json')
+        self.assertEqual(replay.json(), response.json())
+        self.assertEqual(TimeEntry.objects.count(), 1)
+
+    def test_push_is_atomic(self):
+        response = self.client.post('/api/sync/', {'mutations': [
+            {'op': 'create', 'model': 'tag', 'data': {'name': 'nova'}},
+            {'op': 'create', 'model': 'entry', 'data': {'category': 'desconhecida'}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['index'], 1)
+        self.assertFalse(Tag.objects.filter(name='nova').exists())
+
+
+class SearchIndexTests(EntryTestCase):
+    def search(self, query):
+        response = self.client.get('/api/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in response.json()['results']]
+
+    def test_task_rename_updates_index(self):
+        task = Task.objects.create(name='Planejamento', category=self.category)
+        entry = self.make_entry(task=task, note='reunião semanal')
+        self.assertEqual(self.search('planej'), [entry.id])
+        self.assertEqual(self.search('reuniao'), [entry.id])
+
+        response = self.client.patch(f'/api/tasks/{task.id}/', {'name': 'Retrospectiva'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.search('retrosp'), [entry.id])
+        self.assertEqual(self.search('planej'), [])
+
+    def test_deleted_entry_leaves_results(self):
+        entry = self.make_entry(note='revisão de código')
+        entry.delete()
+        self.assertEqual(self.search('revisao'), [])
+
+
+class ExportTests(EntryTestCase):
+    def test_csv_export(self):
+        for _ in range(3):
+            self.make_entry(note='exportada')
+        response = self.client.get('/api/entries/export_csv/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(all(line.endswith('exportada') for line in lines[1:]))
+
+    def test_async_iterator_batches_chunks(self):
+        async def collect(chunks):
+            return [chunk async for chunk in exporters.aiter_chunks(chunks, size=2)]
+
+        self.assertEqual(async_to_sync(collect)(iter(['a', 'b', 'c'])), ['ab', 'c'])
+        self.assertEqual(async_to_sync(collect)(iter([b'x', b'y'])), [b'xy'])
+        self.assertEqual(async_to_sync(collect)(iter([])), [])
+
+
+class VersioningTests(EntryTestCase):
+    def test_write_changes_etag(self):
+        response = self.client.get('/api/entries/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/entries/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_entry()
+        self.assertEqual(self.client.get('/api/entries/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_counters_only_move_forward(self):
+        key = 'teste:contador'
+        before, = versioning.read_counters([key])
+        versioning.advance_counters([key])
+        after, = versioning.read_counters([key])
+        self.assertGreater(after, before)
+
+
+class AnalyticsTests(EntryTestCase):
+    def setUp(self):
+        super().setUp()
+        analytics._cache.clear()
+        self.tag = Tag.objects.create(name='foco')
+        self.entries = []
+        for index, hours_ago in enumerate((3, 27, 50, 51, 75, 200)):
+            category = self.category if index % 2 else self.other_category
+            entry = self.make_entry(category, hours_ago=hours_ago)
+            entry.end_at = entry.start_at + timedelta(minutes=10 * (index + 1))
+            entry.save()
+            if index % 3 == 0:
+                entry.tags.add(self.tag)
+            self.entries.append(entry)
+
+    def assertWindowMatchesDatabase(self):
+        window = analytics.load_window()
+        fresh = analytics._read_window()
+        self.assertEqual(window.ids.tolist(), fresh.ids.tolist())
+        self.assertEqual(window.durations.tolist(), fresh.durations.tolist())
+        self.assertEqual(window.local_seconds.tolist(), fresh.local_seconds.tolist())
+        self.assertEqual(window.category_ids.tolist(), fresh.category_ids.tolist())
+        for tag_id in fresh.tag_ids.tolist():
+            self.assertEqual(window.mask(tag_id=tag_id).tolist(), fresh.mask(tag_id=tag_id).tolist())
+
+    def test_reports_match_plain_python(self):
+        TimeEntry.objects.create(category=self.category, start_at=timezone.now())
+        entries = list(TimeEntry.objects.filter(end_at__isnull=False))
+        durations = sorted(entry.duration_seconds for entry in entries)
+        summary = self.client.get('/api/analytics/percentiles/').json()
+        self.assertEqual(summary['total_entries'], len(durations))
+        self.assertEqual((summary['min'], summary['max']), (durations[0], durations[-1]))
+        self.assertAlmostEqual(summary['mean'], statistics.mean(durations))
+        self.assertAlmostEqual(summary['percentiles']['50'], statistics.median(durations))
+
+        cells = Counter()
+        per_day = defaultdict(int)
+        for entry in entries:
+            local = timezone.localtime(entry.start_at)
+            cells[local.weekday(), local.hour] += 1
+            per_day[local.date().isoformat()] += entry.duration_seconds
+        counts = self.client.get('/api/analytics/heatmap/').json()['entry_count']
+        self.assertEqual(
+            {(weekday, hour): count for weekday, row in enumerate(counts) for hour, count in enumerate(row) if count},
+            dict(cells),
+        )
+        days = self.client.get('/api/analytics/daily/', {'window': 1}).json()['days']
+        self.assertEqual({day['day']: day['total_seconds'] for day in days if day['total_seconds']}, per_day)
+
+        tagged = self.client.get('/api/analytics/percentiles/', {'tag': 'foco', 'category': self.other_category.id})
+        self.assertEqual(tagged.json()['total_entries'], len([
+            entry for entry in entries if entry.category_id == self.other_category.id and self.tag in entry.tags.all()
+        ]))
+
+    def test_window_applies_only_changed_entries(self):
+        analytics.load_window()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entries[0].delete()
+            self.entries[1].tags.add(self.tag)
+            self.entries[3].tags.remove(self.tag)
+            self.entries[2].end_at = None
+            self.entries[2].save()
+            self.make_entry(self.other_category, hours_ago=5).tags.add(self.tag)
+        self.assertWindowMatchesDatabase()
+
+    def test_unknown_tag_reloads_window(self):
+        analytics.load_window()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entries[1].tags.add(Tag.objects.create(name='nova'))
+        self.assertWindowMatchesDatabase()
+        self.assertEqual(self.client.get('/api/analytics/percentiles/', {'tag': 'nova'}).json()['total_entries'], 1)
+
+    def test_invalid_parameters_are_rejected(self):
+        for path, params in (
+            ('/api/analytics/percentiles/', {'category': 'abc'}),
+            ('/api/analytics/daily/', {'window': 'abc'}),
+            ('/api/analytics/daily/', {'window': 0}),
+            ('/api/analytics/daily/', {'window': -3}),
+        ):
+            response = self.client.get(path, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(next(iter(params)), response.json())
+
+
+class JobTests(EntryTestCase):
+    def make_pending(self):
+        entry = self.make_entry(meta={speedrun.PENDING_KEY: True})
+        SnapshotJob.objects.create(entry=entry)
+        return entry
+
+    def test_queue_ignores_repeated_key(self):
+        queue = jobs.WorkQueue(max_workers=1, retry_delay=0)
+        release = threading.Event()
+        calls = []
+        self.assertTrue(queue.submit('chave', lambda: (release.wait(5), calls.append(1))))
+        self.assertFalse(queue.submit('chave', calls.append, 2))
+        release.set()
+        self.assertTrue(queue.wait())
+        self.assertEqual(calls, [1])
+        self.assertTrue(queue.submit('chave', calls.append, 3))
+        self.assertTrue(queue.wait())
+        self.assertEqual(calls, [1, 3])
+
+    def test_queue_retries_failures(self):
+        queue = jobs.WorkQueue(max_workers=1, max_attempts=3, retry_delay=0)
+        calls = []
+
+        def flaky(fail_times):
+            calls.append(fail_times)
+            if len(calls) <= fail_times:
+                raise RuntimeError('falha')
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            queue.submit('instável', flaky, 2)
+            self.assertTrue(queue.wait())
+        self.assertEqual(len(calls), 3)
+        calls.clear()
+        with self.assertLogs('core.jobs', 'ERROR') as logs:
+            queue.submit('sempre', flaky, 10)
+            self.assertTrue(queue.wait())
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(logs.records), 3)
+
+    def test_exhausted_jobs_leave_queue_until_retried(self):
+        entry = self.make_pending()
+        with mock.patch.object(speedrun, 'build_speedrun_snapshot', side_effect=RuntimeError('falha')):
+            for _attempt in range(jobs.MAX_ATTEMPTS):
+                self.assertEqual(list(speedrun.pending_snapshot_ids(10)), [entry.id])
+                with self.assertRaises(RuntimeError):
+                    speedrun.compute_snapshot(entry.id)
+        self.assertEqual(list(speedrun.pending_snapshot_ids(10)), [])
+        self.assertEqual([job.last_error for job in speedrun.failed_snapshot_jobs()], ['falha'])
+
+        self.assertEqual(speedrun.retry_failed_snapshots(), 1)
+        self.assertEqual(list(speedrun.pending_snapshot_ids(10)), [entry.id])
+        speedrun.compute_snapshot(entry.id)
+        entry.refresh_from_db()
+        self.assertNotIn(speedrun.PENDING_KEY, entry.meta)
+        self.assertIn('speedrun_snapshot', entry.meta)
+        self.assertFalse(SnapshotJob.objects.exists())
+
+    @override_settings(BACKGROUND_JOBS='sync')
+    def test_requeue_processes_jobs_left_in_database(self):
+        entries = [self.make_pending() for _ in range(2)]
+        speedrun.requeue_pending_snapshots()
+        self.assertFalse(SnapshotJob.objects.exists())
+        for entry in entries:
+            entry.refresh_from_db()
+            self.assertNotIn(speedrun.PENDING_KEY, entry.meta)
+
+    @override_settings(VERSIONS_CACHE_BACKEND='locmem')
+    def test_run_jobs_requires_shared_versions(self):
+        with self.assertRaises(CommandError):
+            call_command('run_jobs', '--once')
+
+
+class HierarchyTests(EntryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.child = Category.objects.create(name='Backend', parent=self.category)
+        self.leaf = Category.objects.create(name='API', parent=self.child)
+        self.make_entry(self.leaf)
+
+    def assertClosureMatchesParents(self):
+        parents = dict(Category.objects.values_list('id', 'parent_id'))
+        expected = set()
+        for category_id in parents:
+            current, depth = category_id, 0
+            while current is not None:
+                expected.add((current, category_id, depth))
+                current, depth = parents[current], depth + 1
+        self.assertEqual(set(CategoryClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth')), expected)
+
+    def test_move_rewrites_paths_closure_and_rollups(self):
+        response = self.client.patch(
+            f'/api/categories/{self.child.id}/', {'parent': self.other_category.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.path, '/Estudo/Backend/API')
+        self.assertClosureMatchesParents()
+        self.assertEqual(sorted(hierarchy.ancestor_ids(self.leaf.id)), sorted(
+            [self.other_category.id, self.child.id, self.leaf.id]
+        ))
+        self.assertEqual(TimeEntry.objects.filter(hierarchy.subtree_q(self.other_category.id)).count(), 1)
+        self.assertEqual(TimeEntry.objects.filter(hierarchy.subtree_q(self.category.id)).count(), 0)
+        rollups = dict(CategoryRollup.objects.values_list('category_id', 'entry_count'))
+        self.assertEqual(rollups.get(self.category.id, 0), 0)
+        self.assertEqual(rollups[self.other_category.id], 1)
+
+    def test_rename_rewrites_descendant_paths(self):
+        self.category.name = 'Emprego'
+        self.category.save()
+        self.assertEqual(
+            list(Category.objects.filter(parent__isnull=False).values_list('path', flat=True)),
+            ['/Emprego/Backend', '/Emprego/Backend/API'],
+        )
+        self.assertClosureMatchesParents()
+
+    def test_move_into_own_subtree_is_rejected(self):
+        for parent in (self.leaf, self.category):
+            response = self.client.patch(f'/api/categories/{self.category.id}/', {'parent': parent.id}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('parent', response.json())
+        self.child.parent = self.leaf
+        with self.assertRaises(ValueError):
+            self.child.save()
+        self.assertClosureMatchesParents()
+
+
+class CategoryTreeTests(EntryTestCase):
+    def test_etag_follows_category_writes_only(self):
+        Category.objects.create(name='Backend', parent=self.category)
+        response = self.client.get('/api/categories/tree/')
+        etag = response['ETag']
+        self.assertEqual(
+            [(node['name'], [child['name'] for child in node['children']]) for node in response.json()],
+            [('Estudo', []), ('Trabalho', ['Backend'])],
+        )
+        self.assertEqual(self.client.get('/api/categories/tree/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(
+            '/api/categories/tree/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        ).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_entry()
+        self.assertEqual(self.client.get('/api/categories/tree/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Frontend', parent=self.category)
+        response = self.client.get('/api/categories/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([child['name'] for child in response.json()[1]['children']], ['Backend', 'Frontend'])
+
+    def test_tree_is_built_with_one_query(self):
+        Category.objects.create(name='API', parent=Category.objects.create(name='Backend', parent=self.category))
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.client.get('/api/categories/tree/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/categories/tree/')
+
+
+class ColumnarTests(EntryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tag = Tag.objects.create(name='foco', color='#ff0000')
+        child = Category.objects.create(name='Backend', parent=self.category, properties={'cor': 'azul'})
+        task = Task.objects.create(name='API', category=child, properties={'prioridade': 1})
+        task.default_tags.add(self.tag)
+        self.make_entry(child, task=task, note='revisão', meta={'origem': 'teste'}).tags.add(self.tag)
+        self.make_entry(self.other_category, hours_ago=30)
+        TimeEntry.objects.create(category=self.other_category, start_at=timezone.now())
+
+    def snapshot(self):
+        return {
+            'tags': list(Tag.objects.order_by('id').values()),
+            'categories': list(Category.objects.order_by('id').values()),
+            'tasks': list(Task.objects.order_by('id').values()),
+            'task_tags': sorted(Task.default_tags.through.objects.values_list('task_id', 'tag_id')),
+            'entries': list(TimeEntry.objects.order_by('id').values()),
+            'entry_tags': sorted(TimeEntry.tags.through.objects.values_list('timeentry_id', 'tag_id')),
+        }
+
+    def test_round_trip_keeps_every_row(self):
+        before = self.snapshot()
+        rollups = sorted(CategoryRollup.objects.filter(entry_count__gt=0).values_list('category_id', 'entry_count'))
+        for file_format in columnar.FILE_FORMATS:
+            with tempfile.TemporaryDirectory() as directory:
+                counts = columnar.export_all(directory, file_format)
+                self.assertEqual(counts['entries'], 3)
+                with self.assertRaises(ValueError):
+                    columnar.import_all(directory)
+                columnar.import_all(directory, replace=True)
+            self.assertEqual(self.snapshot(), before, file_format)
+            self.assertEqual(sorted(
+                CategoryRollup.objects.filter(entry_count__gt=0).values_list('category_id', 'entry_count')
+            ), rollups)
+        self.assertGreater(Tag.objects.create(name='depois').id, before['tags'][-1]['id'])
+
+    def test_api_export_is_readable(self):
+        response = self.client.get('/api/entries/export_columnar/', {'table': 'entries'})
+        self.assertEqual(response.status_code, 200)
+        table = pq.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.column_names, [name for name, _type in columnar.TABLES['entries'][1]] + ['tag_ids'])
+        self.assertEqual(sorted(table.column('tag_ids').to_pylist(), key=len), [[], [], [self.tag.id]])
+        self.assertEqual(self.client.get('/api/entries/export_columnar/', {'table': 'users'}).status_code, 400)
+
+
+class DayRangeTests(EntryTestCase):
+    def make_local_entry(self, *args):
+        start_at = timezone.make_aware(dt.datetime(*args))
+        return TimeEntry.objects.create(
+            category=self.category, start_at=start_at, end_at=start_at + timedelta(minutes=10)
+        )
+
+    def test_days_are_local_and_inclusive(self):
+        last_second = self.make_local_entry(2024, 3, 9, 23, 59, 59)
+        midnight = self.make_local_entry(2024, 3, 10, 0, 0)
+        next_midnight = self.make_local_entry(2024, 3, 11, 0, 0)
+        # 02:59 UTC do dia 10 ainda é dia 9 em São Paulo (UTC-3)
+        self.assertEqual(last_second.start_at.astimezone(dt.timezone.utc).day, 10)
+
+        def ids(**params):
+            response = self.client.get('/api/entries/', params)
+            self.assertEqual(response.status_code, 200)
+            return sorted(entry['id'] for entry in response.json()['results'])
+
+        self.assertEqual(ids(**{'from': '2024-03-10', 'to': '2024-03-10'}), [midnight.id])
+        self.assertEqual(ids(**{'to': '2024-03-09'}), [last_second.id])
+        self.assertEqual(ids(**{'from': '2024-03-10'}), [midnight.id, next_midnight.id])
+        self.assertEqual(ids(**{'from': '2024-03-11', 'to': '2024-03-10'}), [])
+
+    def test_bounds_match_local_date_across_dst_change(self):
+        # Em 2018-11-04 o horário de verão começou à meia-noite: o dia local começa às 01:00 (-02)
+        entries = [
+            self.make_local_entry(2018, 11, 3, 23, 30),
+            self.make_local_entry(2018, 11, 4, 1, 30),
+            self.make_local_entry(2018, 11, 4, 23, 30),
+            self.make_local_entry(2018, 11, 5, 0, 30),
+        ]
+        lower, upper = ranges.datetime_bounds(dt.date(2018, 11, 4), dt.date(2018, 11, 4))
+        self.assertEqual(lower.astimezone(dt.timezone.utc), dt.datetime(2018, 11, 4, 3, 0, tzinfo=dt.timezone.utc))
+        self.assertEqual(upper.astimezone(dt.timezone.utc), dt.datetime(2018, 11, 5, 2, 0, tzinfo=dt.timezone.utc))
+        for day in (dt.date(2018, 11, 3), dt.date(2018, 11, 4), dt.date(2018, 11, 5)):
+            self.assertEqual(
+                list(ranges.filter_range(TimeEntry.objects.order_by('id'), day, day)),
+                list(TimeEntry.objects.filter(start_at__date=day).order_by('id')),
+                day,
+            )
+        self.assertEqual(
+            list(ranges.filter_range(TimeEntry.objects.order_by('id'), dt.date(2018, 11, 4), None)), entries[1:]
+        )
+
+    def test_invalid_dates_are_rejected(self):
+        for params in ({'from': '2024-13-01'}, {'to': 'ontem'}, {'from': '2024-02-30'}):
+            response = self.client.get('/api/entries/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(next(iter(params)), response.json())
+
+
+class CursorPaginationTests(EntryTestCase):
+    def setUp(self):
+        super().setUp()
+        start_at = timezone.now() - timedelta(hours=10)
+        # Três entradas com o mesmo start_at: o desempate é pelo id
+        self.entries = [
+            TimeEntry.objects.create(
+                category=self.category, start_at=start_at + timedelta(hours=hours),
+                end_at=start_at + timedelta(hours=hours, minutes=5),
+            )
+            for hours in (0, 1, 1, 1, 2, 3, 4)
+        ]
+
+    def expected_ids(self):
+        return list(TimeEntry.objects.order_by('-start_at', '-id').values_list('id', flat=True))
+
+    def walk(self, between_pages=None, **params):
+        ids, cursor = [], None
+        while True:
+            query = {'pagination': 'cursor', 'page_size': 3, **params}
+            if cursor:
+                query['cursor'] = cursor
+            page = self.client.get('/api/entries/', query).json()
+            results = page['results']
+            # A listagem compacta é colunar
+            ids.extend(results['columns']['id'] if 'columns' in results else [entry['id'] for entry in results])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return ids
+            if between_pages:
+                between_pages()
+                between_pages = None
+
+    def test_pages_follow_start_at_and_id(self):
+        self.assertEqual(self.walk(), self.expected_ids())
+        self.assertEqual(self.walk(view='compact'), self.expected_ids())
+
+    def test_writes_between_pages_do_not_shift_rows(self):
+        expected = self.expected_ids()
+
+        def write():
+            self.make_entry(hours_ago=0)
+            TimeEntry.objects.filter(id=expected[0]).delete()
+
+        # A entrada nova fica antes do cursor; a apagada já tinha sido lida
+        self.assertEqual(self.walk(between_pages=write), expected)
+
+    def test_count_and_invalid_cursor(self):
+        page = self.client.get('/api/entries/', {'pagination': 'cursor', 'page_size': 3, 'count': 1}).json()
+        self.assertEqual(page['count'], len(self.entries))
+        self.assertIn('pagination=cursor', page['next'])
+        self.assertNotIn('count', self.client.get('/api/entries/', {'pagination': 'cursor'}).json())
+        self.assertEqual(self.client.get('/api/entries/', {'cursor': 'inválido'}).status_code, 404)
+
+
+class EventTests(EntryTestCase):
+    def published(self, publish):
+        messages = []
+        for call in publish.call_args_list:
+            header, data = call.args[0].strip().split('\n')
+            messages.append((header.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+        return messages
+
+    # O snapshot do speedrun fica na fila do banco, sem thread nem evento próprio
+    @override_settings(BACKGROUND_JOBS='db')
+    def test_timer_and_entry_writes_publish_after_commit(self):
+        with mock.patch.object(events.broadcaster, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    '/api/entries/start_timer/', {'category_id': self.category.id}, format='json'
+                )
+            entry_id = response.json()['id']
+            self.assertEqual([(event, data.get('ids', data.get('id'))) for event, data in self.published(publish)], [
+                ('entry', [entry_id]), ('timer', entry_id),
+            ])
+            self.assertEqual(self.published(publish)[0][1]['action'], 'created')
+
+            publish.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/entries/stop_timer/', {'entry_id': entry_id}, format='json')
+            self.assertEqual(self.published(publish), [
+                ('entry', {'action': 'updated', 'ids': [entry_id]}), ('timer', None),
+            ])
+
+            publish.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(f'/api/entries/{entry_id}/')
+            self.assertEqual(self.published(publish), [('entry', {'action': 'deleted', 'ids': [entry_id]})])
+
+    def test_rolled_back_write_publishes_nothing(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                events.entries_changed('created', [1])
+                transaction.set_rollback(True)
+            events.entries_changed('deleted', [])
+        self.assertEqual(callbacks, [])
+
+    def test_broadcaster_delivers_from_other_threads_and_drops_oldest(self):
+        broadcaster = events.Broadcaster()
+
+        async def receive():
+            subscription = broadcaster.subscribe()
+            _loop, queue = subscription
+            thread = threading.Thread(target=lambda: [broadcaster.publish(str(n)) for n in range(events.QUEUE_SIZE + 1)])
+            thread.start()
+            thread.join()
+            # As entregas agendadas com call_soon_threadsafe rodam na próxima volta do loop
+            while queue.qsize() < events.QUEUE_SIZE:
+                await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            broadcaster.unsubscribe(subscription)
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+
+        received = async_to_sync(receive)()
+        self.assertEqual(received, [str(n) for n in range(1, events.QUEUE_SIZE + 1)])
+
+    def test_stream_starts_with_timer_state(self):
+        running = TimeEntry.objects.create(category=self.category, start_at=timezone.now())
+
+        async def first_event():
+            response = await AsyncClient().get('/api/events/')
+            chunks = response.streaming_content
+            try:
+                return response['Content-Type'], await chunks.__anext__()
+            finally:
+                await chunks.aclose()
+
+        content_type, chunk = async_to_sync(first_event)()
+        self.assertEqual(content_type, 'text/event-stream')
+        header, data = chunk.decode().strip().split('\n')
+        self.assertEqual(header, 'event: timer')
+        self.assertEqual(json.loads(data.removeprefix('data: '))['id'], running.id)
+        self.assertEqual(self.client.get('/api/events/').status_code, 501)
+
+
+@override_settings(REQUEST_METRICS=True)
+class MetricsTests(EntryTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        cache.clear()
+
+    def timings(self, response):
+        return {
+            match['name']: (float(match['dur']), match['desc'])
+            for match in re.finditer(r'(?P<name>\w+);dur=(?P<dur>[\d.]+)(?:;desc="(?P<desc>[^"]*)")?', response['Server-Timing'])
+        }
+
+    def test_server_timing_counts_queries(self):
+        self.make_entry()
+        timings = self.timings(self.client.get('/api/categories/tree/'))
+        self.assertEqual(set(timings), {'db', 'serialize', 'render', 'app', 'total'})
+        self.assertEqual(timings['db'][1], '1 consultas')
+        self.assertLessEqual(timings['db'][0] + timings['render'][0], timings['total'][0] + 0.2)
+
+        # Views assíncronas fazem as consultas em outra thread, com o mesmo coletor
+        response = self.client.post('/api/entries/start_timer/', {'category_id': self.category.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(self.timings(response)['db'][1], '0 consultas')
+
+    def test_prometheus_report_per_route(self):
+        for _request in range(3):
+            self.client.get('/api/categories/tree/')
+        self.client.get('/api/entries/')
+        report = self.client.get('/api/_metrics').content.decode()
+        self.assertIn('# TYPE felixo_request_duration_seconds summary', report)
+        self.assertIn('felixo_request_queries_count{route="category-tree",method="GET"} 3', report)
+        self.assertIn('felixo_request_queries{route="category-tree",method="GET",quantile="0.5"} 0', report)
+        self.assertIn('felixo_request_queries_sum{route="category-tree",method="GET"} 1', report)
+        self.assertIn('route="timeentry-list",method="GET"', report)
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_disabled_metrics(self):
+        response = self.client.get('/api/categories/tree/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 404)
+
+
+class CompactListTests(EntryTestCase):
+    def setUp(self):
+        super().setUp()
+        tag = Tag.objects.create(name='foco')
+        child = Category.objects.create(name='Backend', parent=self.category)
+        task = Task.objects.create(name='API', category=child)
+        self.make_entry(child, task=task, note='revisão').tags.add(tag, Tag.objects.create(name='revisão'))
+        self.make_entry(hours_ago=5)
+        TimeEntry.objects.create(category=self.other_category, start_at=timezone.now())
+
+    def test_columns_match_full_listing(self):
+        full = self.client.get('/api/entries/').json()['results']
+        page = self.client.get('/api/entries/', {'view': 'compact', 'fields': ','.join(
+            (*compact.DEFAULT_FIELDS, 'speedrun_dynamic')
+        )}).json()
+        self.assertEqual(page['count'], len(full))
+        columns = page['results']['columns']
+        for name in (*compact.DEFAULT_FIELDS, 'speedrun_dynamic'):
+            expected = [
+                [tag['id'] for tag in entry['tags']] if name == 'tags' else entry[name]
+                for entry in full
+            ]
+            self.assertEqual(columns[name], expected, name)
+
+    def test_rows_layout_and_field_selection(self):
+        page = self.client.get(
+            '/api/entries/', {'view': 'compact', 'layout': 'rows', 'fields': 'is_running,id,id'}
+        ).json()['results']
+        self.assertEqual(page['fields'], ['is_running', 'id'])
+        self.assertEqual(
+            page['rows'], [[entry.end_at is None, entry.id] for entry in TimeEntry.objects.order_by('-start_at', '-id')]
+        )
+
+    def test_invalid_options_are_rejected(self):
+        for params in ({'fields': 'id,meta'}, {'layout': 'tabela'}):
+            response = self.client.get('/api/entries/', {'view': 'compact', **params})
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(next(iter(params)), response.json())
+
+    def test_query_count_does_not_grow_with_page(self):
+        for hours_ago in range(6, 30):
+            self.make_entry(hours_ago=hours_ago)
+        # COUNT, página, tags, categorias e tasks
+        with self.assertNumQueries(5):
+            self.client.get('/api/entries/', {'view': 'compact'})
+
+
+class ResultsCacheTests(EntryTestCase):
+    def setUp(self):
+        super().setUp()
+        caches[results.CACHE_ALIAS].clear()
+        self.child = Category.objects.create(name='Backend', parent=self.category)
+        # Dias fixos: o teste não depende da hora em que roda
+        self.today = dt.date(2024, 5, 15)
+        self.computed = Counter()
+
+    def cached(self, endpoint, generations):
+        def compute():
+            self.computed[endpoint] += 1
+            return self.computed[endpoint]
+        return results.cached(endpoint, {}, generations, compute)
+
+    def read_all(self):
+        """Consulta as janelas e categorias; devolve quais foram recalculadas"""
+        before = Counter(self.computed)
+        week_ago = self.today - timedelta(days=7)
+        self.cached('hoje', results.window_generations(self.today, self.today))
+        self.cached('semana_passada', results.window_generations(week_ago, week_ago + timedelta(days=1)))
+        self.cached('aberta', results.window_generations(None, self.today))
+        self.cached('trabalho', results.category_generations(self.category.id))
+        self.cached('estudo', results.category_generations(self.other_category.id))
+        return {endpoint for endpoint in self.computed if self.computed[endpoint] != before[endpoint]}
+
+    def write(self, category, day, minutes=30):
+        start_at = timezone.make_aware(dt.datetime.combine(day, dt.time(12)))
+        with self.captureOnCommitCallbacks(execute=True):
+            return TimeEntry.objects.create(
+                category=category, start_at=start_at, end_at=start_at + timedelta(minutes=minutes)
+            )
+
+    def test_entry_write_invalidates_only_its_day_and_subtree(self):
+        self.read_all()
+        self.assertEqual(self.read_all(), set())
+
+        self.write(self.child, self.today)
+        self.assertEqual(self.read_all(), {'hoje', 'aberta', 'trabalho'})
+
+        self.write(self.other_category, self.today - timedelta(days=6))
+        self.assertEqual(self.read_all(), {'semana_passada', 'aberta', 'estudo'})
+
+    def test_rolled_back_write_keeps_results(self):
+        self.read_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.make_entry(self.child)
+                transaction.set_rollback(True)
+        self.assertEqual(self.read_all(), set())
+
+    def test_bulk_and_tag_writes_stay_targeted(self):
+        entry = self.write(self.other_category, self.today - timedelta(days=30))
+        tagged = self.write(self.child, self.today)
+        # Criar a tag muda a versão dos nomes, que entra em todas as chaves
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(name='foco')
+        self.read_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.delete_entries(TimeEntry.objects.filter(id=entry.id))
+        self.assertEqual(self.read_all(), {'aberta', 'estudo'})
+        # As estatísticas por categoria não dependem das tags
+        with self.captureOnCommitCallbacks(execute=True):
+            tagged.tags.add(tag)
+        self.assertEqual(self.read_all(), {'hoje', 'aberta'})
+
+    def test_tree_change_invalidates_everything(self):
+        self.read_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.child.parent = self.other_category
+            self.child.save()
+        self.assertEqual(self.read_all(), {'hoje', 'semana_passada', 'aberta', 'trabalho', 'estudo'})
+
+    def test_stats_follow_writes(self):
+        params = {'from': self.today.isoformat(), 'to': self.today.isoformat()}
+        first = self.client.get('/api/entries/stats_summary/', params).json()
+        self.write(self.child, self.today)
+        second = self.client.get('/api/entries/stats_summary/', params).json()
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.client.get('/api/entries/stats_summary/', params).json(), second)
+        stats = self.client.get(f'/api/categories/{self.category.id}/stats/').json()
+        self.assertEqual(stats['total_entries'], 1)
@@ -0,0 +1,90 @@
+"""Operações do timer (iniciar, parar, consultar o que está rodando).
+
+São funções síncronas com as escritas numa transação; as views assíncronas
+de `async_views` as chamam via `sync_to_async`, pois o ORM do Django 4.2 não
+tem transações assíncronas.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import events, speedrun
+from .models import TimeEntry
+from .serializers import TimeEntrySerializer
+
+# Tentativas de troca quando outro cliente inicia um timer ao mesmo tempo
+START_ATTEMPTS = 3
+
+
+def running_queryset():
+    # Sem ordenação (nem first(), que ordena por id): com no máximo uma
+    # linha, a consulta lê só o índice parcial entry_single_running
+    queryset = TimeEntry.objects.filter(end_at__isnull=True).order_by()
+    return queryset.select_related('category', 'task').prefetch_related('tags')
+
+
+def running_entry():
+    return next(iter(running_queryset()), None)
+
+
+def serialize(entry):
+    return TimeEntrySerializer(entry).data if entry is not None else None
+
+
+def start(data):
+    """Para o timer rodando e inicia um novo com os dados validados, numa única transação.
+
+    O índice único `entry_single_running` garante no máximo um timer rodando:
+    se outro cliente iniciar um timer entre a leitura e o INSERT, o INSERT
+    falha e a troca é refeita, parando o timer do outro cliente.
+    """
+    for attempt in range(START_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return _swap(data)
+        except IntegrityError:
+            if attempt == START_ATTEMPTS - 1 or not TimeEntry.objects.filter(end_at__isnull=True).exists():
+                raise
+
+
+def _swap(data):
+    now = timezone.now()
+    # Trava a linha no PostgreSQL; no SQLite a transação já começa com a trava de escrita
+    for entry in TimeEntry.objects.filter(end_at__isnull=True).order_by().select_for_update():
+        _finish(entry, now)
+        events.entries_changed('updated', [entry.id])
+
+    entry = TimeEntry.objects.create(
+        category_id=data['category_id'],
+        task_id=data.get('task_id'),
+        start_at=now,
+        note=data.get('note', '')
+    )
+    if data.get('tag_ids'):
+        entry.tags.set(data['tag_ids'])
+
+    events.entries_changed('created', [entry.id])
+    events.timer_changed(entry)
+    return entry
+
+
+def _finish(entry, end_at):
+    # save() calcula a duração e atualiza os dados derivados; o snapshot vai para a fila
+    entry.end_at = end_at
+    entry.meta = {**(entry.meta or {}), speedrun.PENDING_KEY: True}
+    entry.save()
+    speedrun.schedule_snapshot(entry)
+
+
+@transaction.atomic
+def stop(entry_id):
+    """Finaliza a entrada rodando `entry_id` num único save; devolve None se ela já parou.
+
+    O snapshot do speedrun é calculado em segundo plano.
+    """
+    entry = TimeEntry.objects.filter(id=entry_id, end_at__isnull=True).select_for_update().first()
+    if entry is None:
+        return None
+    _finish(entry, timezone.now())
+    events.entries_changed('updated', [entry.id])
+    events.timer_changed(None)
+    return entry
@@ -1,13 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'categories', views.CategoryViewSet)
 router.register(r'tasks', views.TaskViewSet)
 router.register(r'tags', views.TagViewSet)
 router.register(r'entries', views.TimeEntryViewSet)
+router.register(r'analytics', views.AnalyticsViewSet, basename='analytics')
+router.register(r'search', views.SearchViewSet, basename='search')
+router.register(r'sync', views.SyncViewSet, basename='sync')
 
 urlpatterns = [
+    path('api/_metrics', views.request_metrics, name='metrics'),
+    path('api/events/', views.event_stream, name='event-stream'),
+    # Endpoints do timer em views assíncronas; antes do router, cuja rota `entries/<pk>/` também casaria
+    path('api/entries/running/', async_views.running, name='timeentry-running'),
+    path('api/entries/start_timer/', async_views.start_timer, name='timeentry-start-timer'),
+    path('api/entries/stop_timer/', async_views.stop_timer, name='timeentry-stop-timer'),
     path('api/', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""Versões de dados para chaves de cache e ETags.
+
+Cada namespace tem um contador no cache `versions` que avança depois do
+commit de qualquer escrita. O cache precisa ser o mesmo para todos os
+processos que escrevem (workers do servidor, `run_jobs`, comandos de
+manutenção); ver VERSIONS_CACHE_* nas settings. Os valores vêm do relógio
+(sempre maiores que o anterior), então um ETag emitido antes de reiniciar o
+servidor ou de um contador ser descartado nunca coincide com dados novos, e
+dois processos que avançam o mesmo contador ao mesmo tempo gravam valores
+diferentes do que havia, sem depender de um incremento atômico do backend.
+
+O namespace `data` é incrementado junto com todos os outros e também nas
+escritas de tasks e tags, que não têm namespace próprio: é a versão de tudo
+o que a API lê. Cada incremento grava também o horário, usado no
+`Last-Modified`. `conditional` aplica os dois a uma view: um GET com o ETag
+ou a data atuais recebe 304 antes de a view rodar, sem consultas ao banco.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+CACHE_ALIAS = 'versions'
+KEY_PREFIX = 'data_version'
+DATA = 'data'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def read_counters(keys):
+    """Valores dos contadores (na ordem de `keys`), criando os que faltam com o relógio"""
+    cache = _cache()
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def advance_counters(keys):
+    """Troca cada contador por um valor maior que o atual e que o relógio"""
+    cache = _cache()
+    current = cache.get_many(keys)
+    now = time.time_ns()
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, timeout=None)
+
+
+def _key(namespace):
+    return f'{KEY_PREFIX}:{namespace}'
+
+
+def get_version(namespace):
+    return read_counters([_key(namespace)])[0]
+
+
+def get_modified(namespace):
+    """Horário (época, em segundos) do último incremento do namespace"""
+    key = f'{_key(namespace)}:modified'
+    cache = _cache()
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, time.time(), timeout=None)
+        modified = cache.get(key)
+    return modified
+
+
+def _bump(namespace):
+    keys = [_key(name) for name in {namespace, DATA}]
+    advance_counters(keys)
+    now = time.time()
+    _cache().set_many({f'{key}:modified': now for key in keys}, timeout=None)
+
+
+def bump_version(namespace=DATA):
+    """Invalida o namespace (e `data`) assim que a transação atual for confirmada"""
+    transaction.on_commit(lambda: _bump(namespace))
+
+
+def conditional(*namespaces):
+    """Decorator de métodos de viewsets: ETag e Last-Modified das versões dos namespaces.
+
+    O ETag depende só das versões; a URL (com os filtros) já separa as
+    respostas no cache do cliente. `no-cache` faz o navegador revalidar
+    sempre, em vez de reaproveitar a resposta por heurística do Last-Modified.
+    """
+    namespaces = namespaces or (DATA,)
+
+    def etag(request, *args, **kwargs):
+        return '-'.join(f'{namespace}.{get_version(namespace)}' for namespace in namespaces)
+
+    def last_modified(request, *args, **kwargs):
+        return datetime.fromtimestamp(max(get_modified(namespace) for namespace in namespaces), tz=dt_timezone.utc)
+
+    return method_decorator([cache_control(no_cache=True), condition(etag_func=etag, last_modified_func=last_modified)])
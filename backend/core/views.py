@@ -1,16 +1,26 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db.models import Sum, Q
 from django.utils import timezone
-from django.db.models import Sum, Count, Q
 from datetime import datetime, timedelta
-import csv
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+import asyncio
 import logging
+import tempfile
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from . import (
+    analytics, buckets, bulk, columnar, compact, events, exporters, hierarchy, metrics, ranges, results, rollups, search,
+    sync, timer, versioning,
+)
 from .models import Category, Task, Tag, TimeEntry
+from .pagination import EntryPagination
 from .serializers import (
-    CategorySerializer, TaskSerializer, TagSerializer, 
-    TimeEntrySerializer, TimerStartSerializer, TimerStopSerializer
+    CategorySerializer, TaskSerializer, TagSerializer, SyncBatchSerializer,
+    TimeEntrySerializer, TimeEntryBulkUpdateSerializer, TimeEntrySelectionSerializer, build_category_tree
 )
 
 logger = logging.getLogger(__name__)
@@ -34,39 +44,51 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def stats(self, request, pk=None):
         """Estatísticas específicas da categoria"""
         category = self.get_object()
-        
-        # Buscar todas as entradas desta categoria e subcategorias
-        entries = TimeEntry.objects.filter(
-            category__path__startswith=category.path,
-            end_at__isnull=False
-        )
-        
-        if not entries.exists():
-            return Response({
+        return Response(results.cached(
+            'category_stats', {'id': category.id}, results.category_generations(category.id),
+            lambda: self._stats(category), namespaces=(),
+        ))
+
+    def _stats(self, category):
+        stats = rollups.get_subtree_stats(category.id)
+
+        if stats['total_entries'] == 0:
+            return {
                 'total_entries': 0,
                 'avg_duration': 0,
                 'min_duration': 0,
                 'max_duration': 0,
                 'total_time': 0
-            })
-        
-        durations = entries.values_list('duration_seconds', flat=True)
-        
-        return Response({
-            'total_entries': entries.count(),
-            'avg_duration': sum(durations) / len(durations),
-            'min_duration': min(durations),
-            'max_duration': max(durations),
-            'total_time': sum(durations),
-            'recent_avg': sum(list(durations)[-10:]) / min(10, len(durations))  # Últimas 10 sessões
-        })
+            }
+
+        # Últimas 10 sessões da subárvore
+        recent = list(
+            TimeEntry.objects.filter(hierarchy.subtree_q(category.id), end_at__isnull=False)
+            .order_by('-end_at')
+            .values_list('duration_seconds', flat=True)[:10]
+        )
+
+        return {
+            'total_entries': stats['total_entries'],
+            'avg_duration': stats['avg_duration'],
+            'min_duration': stats['min_duration'],
+            'max_duration': stats['max_duration'],
+            'stddev_duration': stats['stddev_duration'],
+            'total_time': stats['total_seconds'],
+            'recent_avg': sum(recent) / len(recent) if recent else 0
+        }
 
     @action(detail=False, methods=['get'])
+    @versioning.conditional('categories')
     def tree(self, request):
         """Retorna árvore completa de categorias"""
-        root_categories = Category.objects.filter(parent=None)
-        serializer = self.get_serializer(root_categories, many=True)
-        return Response(serializer.data)
+        cache_key = f'category_tree:{versioning.get_version("categories")}'
+        tree = cache.get(cache_key)
+        if tree is None:
+            with metrics.serializing():
+                tree = build_category_tree()
+            cache.set(cache_key, tree, timeout=None)
+        return Response(tree)
 
 class TaskViewSet(viewsets.ModelViewSet):
     queryset = Task.objects.all()
@@ -83,266 +105,373 @@ class TagViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+def filter_entries(queryset, params):
+    """Filtros da listagem (`from`, `to`, `category`, `include_descendants`, `tag`)"""
+    # Filtros por data (limites semiabertos, usam o índice de start_at)
+    from_day, to_day = ranges.day_range(params)
+    queryset = ranges.filter_range(queryset, from_day, to_day)
+
+    # Filtros por categoria e tag
+    category_id = params.get('category')
+    include_descendants = params.get('include_descendants')
+    tag_name = params.get('tag')
+
+    if category_id:
+        include_descendants_flag = str(include_descendants).lower() in ('1', 'true', 'yes')
+        if include_descendants_flag:
+            queryset = queryset.filter(hierarchy.subtree_q(category_id))
+        else:
+            queryset = queryset.filter(category_id=category_id)
+    if tag_name:
+        queryset = queryset.filter(tags__name=tag_name)
+
+    return queryset
+
 class TimeEntryViewSet(viewsets.ModelViewSet):
     queryset = TimeEntry.objects.all()
     serializer_class = TimeEntrySerializer
+    pagination_class = EntryPagination
 
     def get_queryset(self):
         queryset = TimeEntry.objects.select_related('category', 'task').prefetch_related('tags')
-        
-        # Filtros por data
-        from_date = self.request.query_params.get('from')
-        to_date = self.request.query_params.get('to')
-        
-        if from_date:
-            queryset = queryset.filter(start_at__date__gte=from_date)
-        if to_date:
-            queryset = queryset.filter(start_at__date__lte=to_date)
-            
-        # Filtros por categoria e tag
-        category_id = self.request.query_params.get('category')
-        include_descendants = self.request.query_params.get('include_descendants')
-        tag_name = self.request.query_params.get('tag')
-        
-        if category_id:
-            include_descendants_flag = str(include_descendants).lower() in ('1', 'true', 'yes')
-            if include_descendants_flag:
-                category = Category.objects.filter(id=category_id).first()
-                if category:
-                    queryset = queryset.filter(category__path__startswith=category.path)
-                else:
-                    queryset = queryset.none()
-            else:
-                queryset = queryset.filter(category_id=category_id)
-        if tag_name:
-            queryset = queryset.filter(tags__name=tag_name)
-            
-        return queryset
+        return filter_entries(queryset, self.request.query_params)
 
-    def _classify_speedrun(self, current_seconds, avg_duration, min_duration, total_entries, is_first=False):
-        if is_first or total_entries <= 1 or avg_duration <= 0:
-            return {
-                'status': 'first',
-                'label': 'Primeira sessao',
-                'ratio_percent': 100,
-            }
+    @versioning.conditional()
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('view') != 'compact':
+            return super().list(request, *args, **kwargs)
+        # Colunas pedidas com .values() e tags da página numa consulta, sem ModelSerializer
+        fields, layout = compact.parse_options(request.query_params)
+        queryset = compact.select(filter_entries(TimeEntry.objects.all(), request.query_params), fields)
+        page = self.paginate_queryset(queryset)
+        with metrics.serializing():
+            data = compact.render(page, fields, layout)
+        return self.get_paginated_response(data)
 
-        ratio = current_seconds / avg_duration
-        ratio_percent = int(round(ratio * 100))
-
-        if current_seconds <= min_duration:
-            status = 'record'
-            label = 'Recorde'
-        elif ratio <= 0.90:
-            status = 'fast'
-            label = 'Bom ritmo'
-        elif ratio <= 1.10:
-            status = 'normal'
-            label = 'Na media'
-        elif ratio <= 1.35:
-            status = 'slow'
-            label = 'Abaixo da media'
-        else:
-            status = 'very_slow'
-            label = 'Bem abaixo da media'
+    def perform_create(self, serializer):
+        entry = serializer.save()
+        events.entries_changed('created', [entry.id])
+        if entry.end_at is None:
+            events.timer_changed(entry)
 
-        return {
-            'status': status,
-            'label': label,
-            'ratio_percent': ratio_percent,
-        }
+    def perform_update(self, serializer):
+        was_running = serializer.instance.end_at is None
+        entry = serializer.save()
+        events.entries_changed('updated', [entry.id])
+        if entry.end_at is None:
+            events.timer_changed(entry)
+        elif was_running:
+            events.timer_changed(None)
 
-    def _build_speedrun_snapshot(self, entry):
-        current_seconds = int(entry.duration_seconds or 0)
-        comparison_entries = TimeEntry.objects.filter(
-            category__path__startswith=entry.category.path,
-            end_at__isnull=False,
-            end_at__lt=entry.end_at,
-        ).exclude(id=entry.id)
-        durations = list(comparison_entries.values_list('duration_seconds', flat=True))
-        compared_entries = len(durations)
-
-        if compared_entries == 0:
-            baseline = self._classify_speedrun(
-                current_seconds=current_seconds,
-                avg_duration=0,
-                min_duration=0,
-                total_entries=1,
-                is_first=True,
-            )
-            return {
-                **baseline,
-                'current_seconds': current_seconds,
-                'avg_duration': 0,
-                'min_duration': 0,
-                'total_entries': 1,
-                'compared_entries': 0,
-            }
+    def perform_destroy(self, instance):
+        was_running = instance.end_at is None
+        entry_id = instance.id
+        instance.delete()
+        events.entries_changed('deleted', [entry_id])
+        if was_running:
+            events.timer_changed(None)
 
-        avg_duration = sum(durations) / compared_entries
-        min_duration = min(durations)
-        total_entries = compared_entries + 1
-        baseline = self._classify_speedrun(
-            current_seconds=current_seconds,
-            avg_duration=avg_duration,
-            min_duration=min_duration,
-            total_entries=total_entries,
-        )
-        return {
-            **baseline,
-            'current_seconds': current_seconds,
-            'avg_duration': round(avg_duration),
-            'min_duration': int(min_duration),
-            'total_entries': int(total_entries),
-            'compared_entries': int(compared_entries),
-        }
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Importa entradas em massa (JSON {"entries": [...]} ou arquivo CSV em `file`)"""
+        upload = request.FILES.get('file')
+        if upload is not None:
+            rows = bulk.parse_csv(upload.read().decode('utf-8-sig'))
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            rows = request.data.get('entries')
+        if not isinstance(rows, list):
+            return Response({'error': 'Envie uma lista de entradas ou um arquivo CSV'},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=False, methods=['get'])
-    def running(self, request):
-        """Retorna entry que está rodando atualmente"""
-        running_entry = TimeEntry.objects.filter(end_at__isnull=True).first()
-        if running_entry:
-            serializer = self.get_serializer(running_entry)
-            return Response(serializer.data)
-        return Response(None)
+        created, errors = bulk.import_entries(rows)
+        if errors:
+            return Response({'created': 0, 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'created': created, 'errors': []}, status=status.HTTP_201_CREATED)
+
+    def _selection(self, data):
+        if 'ids' in data:
+            return TimeEntry.objects.filter(id__in=data['ids'])
+        if data['all']:
+            return TimeEntry.objects.all()
+        return filter_entries(TimeEntry.objects.all(), data['filter'])
 
     @action(detail=False, methods=['post'])
-    def start_timer(self, request):
-        """Inicia um novo timer"""
-        # Para qualquer timer rodando
-        TimeEntry.objects.filter(end_at__isnull=True).update(end_at=timezone.now())
-        
-        serializer = TimerStartSerializer(data=request.data)
-        if serializer.is_valid():
-            data = serializer.validated_data
-            
-            entry = TimeEntry.objects.create(
-                category_id=data['category_id'],
-                task_id=data.get('task_id'),
-                start_at=timezone.now(),
-                note=data.get('note', '')
-            )
-            
-            # Adicionar tags
-            if data.get('tag_ids'):
-                entry.tags.set(data['tag_ids'])
-            
-            response_serializer = TimeEntrySerializer(entry)
-            return Response(response_serializer.data, status=status.HTTP_201_CREATED)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    def bulk_update(self, request):
+        """Altera categoria, task, tags e horários das entradas selecionadas (`ids`, `filter` ou `all`)"""
+        serializer = TimeEntryBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = bulk.update_entries(self._selection(serializer.validated_data), serializer.validated_data)
+        return Response({'updated': updated})
 
     @action(detail=False, methods=['post'])
-    def stop_timer(self, request):
-        """Para o timer atual"""
-        serializer = TimerStopSerializer(data=request.data)
-        if serializer.is_valid():
-            entry_id = serializer.validated_data['entry_id']
-            try:
-                entry = TimeEntry.objects.get(id=entry_id, end_at__isnull=True)
-                entry.stop()
-                meta = dict(entry.meta or {})
-                meta['speedrun_snapshot'] = self._build_speedrun_snapshot(entry)
-                entry.meta = meta
-                entry.save()
-                response_serializer = TimeEntrySerializer(entry)
-                return Response(response_serializer.data)
-            except TimeEntry.DoesNotExist:
-                return Response({'error': 'Timer não encontrado ou já parado'}, 
-                              status=status.HTTP_404_NOT_FOUND)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    def bulk_delete(self, request):
+        """Apaga as entradas selecionadas (`ids`, `filter` ou `all`)"""
+        serializer = TimeEntrySelectionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        deleted = bulk.delete_entries(self._selection(serializer.validated_data))
+        return Response({'deleted': deleted})
 
     @action(detail=False, methods=['get'])
+    @versioning.conditional()
     def stats_summary(self, request):
-        """Estatísticas resumidas por período"""
-        from_date = request.query_params.get('from')
-        to_date = request.query_params.get('to')
-        
-        queryset = TimeEntry.objects.filter(end_at__isnull=False)
-        
-        if from_date:
-            queryset = queryset.filter(start_at__date__gte=from_date)
-        if to_date:
-            queryset = queryset.filter(start_at__date__lte=to_date)
-        
+        """Estatísticas resumidas por período (lidas dos baldes diários)"""
+        from_day, to_day = ranges.day_range(request.query_params)
+        return Response(results.cached(
+            'stats_summary', {'from': from_day, 'to': to_day}, results.window_generations(from_day, to_day),
+            lambda: self._stats_summary(from_day, to_day),
+        ))
+
+    def _stats_summary(self, from_day, to_day):
+        totals = buckets.totals_queryset(from_day, to_day)
+
         # Tempo por categoria
-        category_stats = queryset.values('category__path').annotate(
-            total_seconds=Sum('duration_seconds'),
-            entry_count=Count('id')
-        ).order_by('-total_seconds')
-        
+        category_stats = totals.values('category__path').annotate(
+            seconds=Sum('total_seconds'),
+            count=Sum('entry_count')
+        ).order_by('-seconds')
+
         # Tempo por tag
-        tag_stats = queryset.filter(tags__isnull=False).values('tags__name').annotate(
-            total_seconds=Sum('duration_seconds'),
-            entry_count=Count('id')
-        ).order_by('-total_seconds')
-        
+        tag_stats = buckets.tags_queryset(from_day, to_day).values('tag__name').annotate(
+            seconds=Sum('total_seconds'),
+            count=Sum('entry_count')
+        ).order_by('-seconds')
+
         # Estatísticas gerais
-        total_time = queryset.aggregate(Sum('duration_seconds'))['duration_seconds__sum'] or 0
-        total_entries = queryset.count()
+        overall = totals.aggregate(seconds=Sum('total_seconds'), count=Sum('entry_count'))
+        total_time = overall['seconds'] or 0
+        total_entries = overall['count'] or 0
         avg_session = total_time / total_entries if total_entries > 0 else 0
-        
-        return Response({
+
+        return {
             'total_seconds': total_time,
             'total_entries': total_entries,
             'avg_session_seconds': avg_session,
-            'total_seconds_by_category': list(category_stats),
-            'total_seconds_by_tag': list(tag_stats)
-        })
+            'total_seconds_by_category': [
+                {'category__path': row['category__path'], 'total_seconds': row['seconds'], 'entry_count': row['count']}
+                for row in category_stats
+            ],
+            'total_seconds_by_tag': [
+                {'tags__name': row['tag__name'], 'total_seconds': row['seconds'], 'entry_count': row['count']}
+                for row in tag_stats
+            ]
+        }
 
     @action(detail=False, methods=['get'])
+    @versioning.conditional()
     def top_tasks(self, request):
-        """Top N tasks por tempo"""
+        """Top N tasks por tempo (lidas dos baldes diários)"""
         limit = int(request.query_params.get('limit', 10))
-        from_date = request.query_params.get('from')
-        to_date = request.query_params.get('to')
-        
-        queryset = TimeEntry.objects.filter(end_at__isnull=False, task__isnull=False)
-        
-        if from_date:
-            queryset = queryset.filter(start_at__date__gte=from_date)
-        if to_date:
-            queryset = queryset.filter(start_at__date__lte=to_date)
-        
-        top_tasks = queryset.values('task__name', 'task__category__path').annotate(
-            total_seconds=Sum('duration_seconds'),
-            entry_count=Count('id')
-        ).order_by('-total_seconds')[:limit]
-        
-        return Response(list(top_tasks))
+        from_day, to_day = ranges.day_range(request.query_params)
+        return Response(results.cached(
+            'top_tasks', {'from': from_day, 'to': to_day, 'limit': limit}, results.window_generations(from_day, to_day),
+            lambda: self._top_tasks(from_day, to_day, limit),
+        ))
 
-    @action(detail=False, methods=['get'])
-    def export_csv(self, request):
-        """Exporta entries em CSV"""
-        from_date = request.query_params.get('from')
-        to_date = request.query_params.get('to')
-        
+    def _top_tasks(self, from_day, to_day, limit):
+        top_tasks = buckets.totals_queryset(from_day, to_day).filter(task__isnull=False).values(
+            'task__name', 'task__category__path'
+        ).annotate(
+            seconds=Sum('total_seconds'),
+            count=Sum('entry_count')
+        ).order_by('-seconds')[:limit]
+
+        return [
+            {
+                'task__name': row['task__name'],
+                'task__category__path': row['task__category__path'],
+                'total_seconds': row['seconds'],
+                'entry_count': row['count'],
+            }
+            for row in top_tasks
+        ]
+
+    def _stream_export(self, request, lines, content_type, filename):
+        """Resposta em streaming; sob ASGI o conteúdo vai por um iterador assíncrono (ver core.exporters)"""
         queryset = self.get_queryset()
-        if from_date:
-            queryset = queryset.filter(start_at__date__gte=from_date)
-        if to_date:
-            queryset = queryset.filter(start_at__date__lte=to_date)
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="time_entries.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Data', 'Categoria', 'Task', 'Início', 'Fim', 'Duração (min)', 'Tags', 'Nota'])
-        
-        for entry in queryset:
-            tags = ', '.join([tag.name for tag in entry.tags.all()])
-            duration_min = entry.duration_seconds / 60 if entry.duration_seconds else 0
-            
-            writer.writerow([
-                entry.start_at.date(),
-                entry.category.path,
-                entry.task.name if entry.task else '',
-                entry.start_at.strftime('%H:%M'),
-                entry.end_at.strftime('%H:%M') if entry.end_at else '',
-                f"{duration_min:.1f}",
-                tags,
-                entry.note
-            ])
-        
+        chunks = lines(exporters.iter_entries(queryset))
+
+        if request.query_params.get('compress') == 'gzip':
+            chunks = exporters.gzip_stream(chunks)
+            content_type = 'application/gzip'
+            filename = f'{filename}.gz'
+        if isinstance(request._request, ASGIRequest):
+            chunks = exporters.aiter_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
+
+    @action(detail=False, methods=['get'])
+    def export_csv(self, request):
+        """Exporta entries em CSV (streaming; ?compress=gzip para .csv.gz)"""
+        return self._stream_export(request, exporters.csv_lines, 'text/csv', 'time_entries.csv')
+
+    @action(detail=False, methods=['get'])
+    def export_ndjson(self, request):
+        """Exporta entries em NDJSON, um objeto por linha (?compress=gzip para .ndjson.gz)"""
+        return self._stream_export(
+            request, exporters.ndjson_lines, 'application/x-ndjson', 'time_entries.ndjson'
+        )
+
+    @action(detail=False, methods=['get'])
+    def export_columnar(self, request):
+        """Exporta uma tabela em Parquet ou Arrow (?table=entries|categories|tasks|tags&file_format=parquet|arrow)"""
+        table = request.query_params.get('table', 'entries')
+        file_format = request.query_params.get('file_format', 'parquet')
+        if table not in columnar.TABLES or file_format not in columnar.FILE_FORMATS:
+            return Response({'error': 'Tabela ou formato inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Os filtros da listagem valem para as entradas
+        queryset = self.get_queryset() if table == 'entries' else None
+        sink = tempfile.TemporaryFile()
+        columnar.write_table(table, sink, file_format, queryset=queryset)
+        sink.seek(0)
+        filename = f'{table}{columnar.FILE_FORMATS[file_format]}'
+        return FileResponse(sink, as_attachment=True, filename=filename, content_type='application/octet-stream')
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """Relatórios calculados em NumPy sobre as entradas finalizadas (ver core.analytics)
+
+    Filtros: from/to, category (com a subárvore, salvo include_descendants=0) e tag.
+    """
+
+    def _select(self, request):
+        params = request.query_params
+        from_day, to_day = ranges.day_range(params)
+        include_descendants = str(params.get('include_descendants', '1')).lower() in ('1', 'true', 'yes')
+        window, mask = analytics.select(
+            from_day, to_day,
+            category_id=ranges.parse_int(params.get('category'), 'category'),
+            include_descendants=include_descendants,
+            tag_name=params.get('tag'),
+        )
+        return window, mask, from_day, to_day
+
+    @action(detail=False, methods=['get'])
+    def percentiles(self, request):
+        """Percentis, média, mínimo e máximo das durações"""
+        window, mask, _from_day, _to_day = self._select(request)
+        return Response(analytics.percentiles(window, mask))
+
+    @action(detail=False, methods=['get'])
+    def heatmap(self, request):
+        """Tempo por dia da semana × hora local de início"""
+        window, mask, _from_day, _to_day = self._select(request)
+        return Response(analytics.heatmap(window, mask))
+
+    @action(detail=False, methods=['get'])
+    def daily(self, request):
+        """Total por dia com média móvel (?window=7)"""
+        window, mask, from_day, to_day = self._select(request)
+        days = min(ranges.parse_int(request.query_params.get('window'), 'window', minimum=1) or 7, 365)
+        return Response(analytics.rolling(window, mask, days, from_day, to_day))
+
+    @action(detail=False, methods=['get'])
+    def streaks(self, request):
+        """Sequência atual e a mais longa de dias com atividade"""
+        window, mask, _from_day, _to_day = self._select(request)
+        return Response(analytics.streaks(window, mask, timezone.localdate()))
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """Busca textual nas notas e nas tasks das entradas (ver core.search)
+
+    `q` com as palavras buscadas (prefixos valem: "reun" acha "reunião") e os
+    filtros da listagem de entradas: from/to, category, include_descendants e tag.
+    """
+    PAGE_SIZE = 50
+
+    def list(self, request):
+        params = request.query_params
+        query = params.get('q', '')
+        if not search.parse_query(query):
+            return Response({'error': 'Informe o texto buscado em `q`'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = max(int(params.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        queryset = filter_entries(TimeEntry.objects.all(), params)
+        total, hits = search.search(query, queryset, self.PAGE_SIZE, (page - 1) * self.PAGE_SIZE)
+        entry_ids = [entry_id for entry_id, _score, _snippet in hits]
+        entries = TimeEntry.objects.select_related('category', 'task').in_bulk(entry_ids)
+        results = []
+        for entry_id, score, snippet in hits:
+            entry = entries[entry_id]
+            results.append({
+                'id': entry.id,
+                'score': round(score, 4),
+                'snippet': snippet,
+                'note': entry.note,
+                'category': entry.category_id,
+                'category_name': entry.category.path,
+                'task': entry.task_id,
+                'task_name': entry.task.name if entry.task else None,
+                'start_at': entry.start_at,
+                'end_at': entry.end_at,
+                'duration_seconds': entry.duration_seconds,
+            })
+        return Response({'count': total, 'page': page, 'page_size': self.PAGE_SIZE, 'results': results})
+
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """Sincronização incremental de clientes offline (ver core.sync)
+
+    GET com `since` (cursor da última resposta, 0 na primeira vez) e `limit`
+    devolve as mudanças; POST aplica um lote de mutações numa transação.
+    """
+
+    def list(self, request):
+        try:
+            since = max(int(request.query_params.get('since', 0)), 0)
+            limit = int(request.query_params.get('limit', sync.DEFAULT_LIMIT))
+        except ValueError:
+            return Response({'error': '`since` e `limit` devem ser inteiros'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sync.changes(since, min(max(limit, 1), sync.MAX_LIMIT)))
+
+    def create(self, request):
+        serializer = SyncBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            response = sync.push(serializer.validated_data.get('batch_id'), serializer.validated_data['mutations'])
+        except sync.BatchError as error:
+            return Response({'index': error.index, 'errors': error.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(response)
+
+
+async def event_stream(request):
+    """Eventos do timer e das entradas via Server-Sent Events (requer servidor ASGI)"""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Eventos em tempo real exigem o servidor ASGI (uvicorn timetracker.asgi:application)'},
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
+
+    async def stream():
+        subscription = events.broadcaster.subscribe()
+        _loop, queue = subscription
+        try:
+            # Estado inicial: a única consulta feita por conexão
+            yield events.format_event('timer', await sync_to_async(lambda: timer.serialize(timer.running_entry()))())
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), events.KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+        finally:
+            events.broadcaster.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def request_metrics(request):
+    """Quantis de tempo e de consultas por rota no formato do Prometheus"""
+    if not settings.REQUEST_METRICS:
+        raise Http404
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
+from core.events import CancelOnDisconnect
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'timetracker.settings')
 
-application = get_asgi_application()
+application = CancelOnDisconnect(get_asgi_application())
+
+from core import jobs  # noqa: E402 (depois do setup feito por get_asgi_application)
+
+jobs.start()
+
+# Em desenvolvimento o servidor ASGI também serve os estáticos (admin), como o runserver
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
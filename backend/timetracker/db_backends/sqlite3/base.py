@@ -0,0 +1,94 @@
+"""SQLite com PRAGMAs de conexão e modo de transação configuráveis.
+
+O backend padrão do Django 4.2 abre as transações com `BEGIN` (DEFERRED):
+duas escritas concorrentes começam lendo e, quando a segunda tenta subir
+para escrita, o SQLite devolve "database is locked" na hora, sem esperar
+o `busy_timeout`. Com `transaction_mode` IMMEDIATE a trava de escrita é
+pedida no início da transação e a segunda espera a vez.
+
+`OPTIONS` aceita, além dos argumentos de `sqlite3.connect`:
+
+- `pragmas`: dicionário aplicado em cada conexão nova (journal_mode,
+  synchronous, busy_timeout, mmap_size...);
+- `transaction_mode`: DEFERRED, IMMEDIATE ou EXCLUSIVE.
+
+São as mesmas opções que o Django ganhou nativamente na versão 5.1
+(`init_command` e `transaction_mode`).
+"""
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+# Uma trava por arquivo de banco, compartilhada pelas threads do processo
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def _write_lock(name):
+    with _write_locks_guard:
+        return _write_locks.setdefault(name, threading.Lock())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        self.transaction_mode = kwargs.pop('transaction_mode', None)
+        if self.transaction_mode is not None:
+            self.transaction_mode = self.transaction_mode.upper()
+            if self.transaction_mode not in TRANSACTION_MODES:
+                raise ImproperlyConfigured(
+                    f'transaction_mode inválido: {self.transaction_mode}; use {", ".join(TRANSACTION_MODES)}'
+                )
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            return super()._start_transaction_under_autocommit()
+        # O busy handler do SQLite espera dormindo (até 100 ms por tentativa)
+        # e deixa a trava ociosa entre escritas; entre threads do mesmo
+        # processo, a fila fica nesta trava, que passa a vez na hora
+        if self.transaction_mode != 'DEFERRED':
+            lock = _write_lock(self.settings_dict['NAME'])
+            if not lock.acquire(timeout=self.pragmas.get('busy_timeout', 5000) / 1000):
+                raise OperationalError('database is locked')
+            self._held_write_lock = lock
+        try:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        except Exception:
+            self._release_write_lock()
+            raise
+
+    def _release_write_lock(self):
+        lock = getattr(self, '_held_write_lock', None)
+        if lock is not None:
+            self._held_write_lock = None
+            lock.release()
+
+    def _commit(self):
+        try:
+            super()._commit()
+        finally:
+            self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            self._release_write_lock()
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -21,6 +22,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista para medir a requisição inteira; some quando REQUEST_METRICS=False
+    'core.metrics.RequestMetricsMiddleware',
+    # Antes dos demais para comprimir a resposta final; ver COMPRESSION_* abaixo
+    'core.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -51,13 +56,149 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'timetracker.wsgi.application'
 
-DATABASES = {
+# Perfil do banco: DB_ENGINE=sqlite (padrão) ou postgresql.
+# DB_CONN_MAX_AGE mantém a conexão aberta entre requisições (segundos; 0
+# fecha ao fim de cada uma). Com uvicorn cada requisição roda numa thread
+# própria e as conexões persistentes não são reaproveitadas: no PostgreSQL,
+# use um pool externo (PgBouncer) e DB_CONN_MAX_AGE=0.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgresql':
+    # Requer o driver: pip install "psycopg[binary]"
+    # Os triggers do log de sincronização (core.sync, migração 0010) tomam um
+    # advisory lock para que o cursor siga a ordem dos commits: transações que
+    # escrevem em categorias, tasks, tags ou entradas esperam umas pelas outras
+    # até o commit. Mantenha essas transações curtas (medido no cenário `sync`
+    # do loadtest_timer).
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='felixo'),
+            'USER': config('DB_USER', default='felixo'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+        }
+    }
+    # WAL deixa leituras e a escrita andarem juntas, synchronous=NORMAL só
+    # sincroniza o disco nos checkpoints e BEGIN IMMEDIATE faz as escritas
+    # concorrentes esperarem até DB_SQLITE_BUSY_TIMEOUT ms em vez de falharem.
+    if config('DB_SQLITE_TUNED', default=True, cast=bool):
+        DATABASES['default'].update({
+            'ENGINE': 'timetracker.db_backends.sqlite3',
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'pragmas': {
+                    'journal_mode': 'WAL',
+                    'synchronous': 'NORMAL',
+                    'busy_timeout': config('DB_SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+                    'mmap_size': config('DB_SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+                },
+            },
+        })
+else:
+    raise ImproperlyConfigured(f'DB_ENGINE desconhecido: {DB_ENGINE}; use sqlite ou postgresql')
+
+# Cache local do processo (árvore de categorias e versões de dados).
+# Com vários processos, use um backend compartilhado para que as
+# invalidações sejam vistas por todos.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'felixo-time-tracker',
     }
 }
 
+# Cache de resultados das estatísticas (core/results.py): `locmem` (padrão,
+# por processo), `file` (diretório em RESULTS_CACHE_LOCATION, compartilhado
+# entre processos da mesma máquina), `redis` (qualquer servidor compatível em
+# RESULTS_CACHE_LOCATION; requer o pacote `redis`) ou `none` para desligar.
+# Acima de RESULTS_CACHE_MAX_ENTRIES os menos usados são descartados e cada
+# resultado vale por RESULTS_CACHE_TIMEOUT segundos.
+RESULTS_CACHE_BACKEND = config('RESULTS_CACHE_BACKEND', default='locmem')
+RESULTS_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'felixo-results'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.results_cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'none': ('django.core.cache.backends.dummy.DummyCache', ''),
+}
+if RESULTS_CACHE_BACKEND not in RESULTS_CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f'RESULTS_CACHE_BACKEND desconhecido: {RESULTS_CACHE_BACKEND}; use {", ".join(RESULTS_CACHE_BACKENDS)}'
+    )
+CACHES['results'] = {
+    'BACKEND': RESULTS_CACHE_BACKENDS[RESULTS_CACHE_BACKEND][0],
+    'LOCATION': config('RESULTS_CACHE_LOCATION', default=RESULTS_CACHE_BACKENDS[RESULTS_CACHE_BACKEND][1]),
+    'TIMEOUT': config('RESULTS_CACHE_TIMEOUT', default=300, cast=int),
+}
+if RESULTS_CACHE_BACKEND in ('locmem', 'file'):
+    # No Redis o descarte fica com a política de memória do servidor (allkeys-lru)
+    CACHES['results']['OPTIONS'] = {'MAX_ENTRIES': config('RESULTS_CACHE_MAX_ENTRIES', default=2000, cast=int)}
+
+# Trabalhos em segundo plano (snapshot de speedrun ao parar o timer):
+# 'thread' usa um pool de threads no processo, 'db' só grava a fila no banco
+# para o comando `run_jobs` (vários processos) e 'sync' executa na hora.
+BACKGROUND_JOBS = config('BACKGROUND_JOBS', default='thread')
+BACKGROUND_JOB_WORKERS = config('BACKGROUND_JOB_WORKERS', default=2, cast=int)
+
+# Versões dos dados (ETags e chaves de cache, core/versioning.py) e gerações
+# do cache de resultados. Todos os processos que escrevem precisam enxergar o
+# mesmo cache, senão um servidor responde 304 ou serve resultados antigos
+# depois de escritas feitas em outro processo: `locmem` só vale com um único
+# processo (o padrão de desenvolvimento); `file` e `redis` como acima. O
+# padrão acompanha RESULTS_CACHE_BACKEND quando ele é compartilhado.
+VERSIONS_CACHE_BACKEND = config(
+    'VERSIONS_CACHE_BACKEND', default=RESULTS_CACHE_BACKEND if RESULTS_CACHE_BACKEND in ('file', 'redis') else 'locmem'
+)
+VERSIONS_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'felixo-versions'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.versions_cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/2'),
+}
+if VERSIONS_CACHE_BACKEND not in VERSIONS_CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f'VERSIONS_CACHE_BACKEND desconhecido: {VERSIONS_CACHE_BACKEND}; use {", ".join(VERSIONS_CACHE_BACKENDS)}'
+    )
+if VERSIONS_CACHE_BACKEND == 'locmem' and BACKGROUND_JOBS == 'db':
+    raise ImproperlyConfigured(
+        "BACKGROUND_JOBS='db' roda os trabalhos em outro processo: use VERSIONS_CACHE_BACKEND file ou redis"
+    )
+if VERSIONS_CACHE_BACKEND == 'locmem' and RESULTS_CACHE_BACKEND in ('file', 'redis'):
+    raise ImproperlyConfigured(
+        'Com o cache de resultados compartilhado, as versões também precisam ser: '
+        'use VERSIONS_CACHE_BACKEND file ou redis'
+    )
+CACHES['versions'] = {
+    'BACKEND': VERSIONS_CACHE_BACKENDS[VERSIONS_CACHE_BACKEND][0],
+    'LOCATION': config('VERSIONS_CACHE_LOCATION', default=VERSIONS_CACHE_BACKENDS[VERSIONS_CACHE_BACKEND][1]),
+    # Os contadores não expiram. Há um por dia com entradas (gerações `day:`);
+    # um contador descartado volta com o relógio e só invalida o que dependia dele
+    'TIMEOUT': None,
+}
+if VERSIONS_CACHE_BACKEND in ('locmem', 'file'):
+    CACHES['versions']['OPTIONS'] = {'MAX_ENTRIES': config('VERSIONS_CACHE_MAX_ENTRIES', default=20000, cast=int)}
+
+# Compressão das respostas (gzip, ou brotli com o pacote `brotli` instalado)
+# a partir de COMPRESSION_MIN_SIZE bytes; abaixo disso não compensa
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_GZIP_LEVEL = config('COMPRESSION_GZIP_LEVEL', default=6, cast=int)
+COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', default=5, cast=int)
+
+# Métricas por requisição (cabeçalho Server-Timing e /api/_metrics).
+# REQUEST_METRICS_WINDOW é quantas requisições por rota entram nos quantis.
+REQUEST_METRICS = config('REQUEST_METRICS', default=DEBUG, cast=bool)
+REQUEST_METRICS_WINDOW = config('REQUEST_METRICS_WINDOW', default=1000, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -79,7 +220,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'core.metrics.JSONRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50,
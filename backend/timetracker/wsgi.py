@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'timetracker.settings')
 
 application = get_wsgi_application()
+
+from core import jobs  # noqa: E402 (depois do setup feito por get_wsgi_application)
+
+jobs.start()
@@ -33,6 +33,7 @@ function App() {
     isRunning, 
     startTimer, 
     stopTimer, 
+    lastEntryEvent,
     refreshTimer 
   } = useTimer();
 
@@ -256,7 +257,8 @@ function App() {
               </div>
               
               <TimeHistory 
-                refreshTrigger={refreshTrigger} 
+                refreshTrigger={refreshTrigger}
+                entryEvent={lastEntryEvent}
                 categories={categories}
                 selectedCategory={selectedCategory}
               />
@@ -268,6 +270,7 @@ function App() {
               <div className="xl:col-span-2">
                 <TimeHistory 
                   refreshTrigger={refreshTrigger}
+                  entryEvent={lastEntryEvent}
                   categories={categories}
                   selectedCategory={selectedCategory}
                 />
@@ -281,6 +284,7 @@ function App() {
           {activeTab === 'history' && (
             <TimeHistory 
               refreshTrigger={refreshTrigger}
+              entryEvent={lastEntryEvent}
               categories={categories}
               selectedCategory={selectedCategory}
             />
@@ -296,6 +300,7 @@ function App() {
                
               <TimeHistory 
                 refreshTrigger={refreshTrigger}
+                entryEvent={lastEntryEvent}
                 categories={categories}
                 selectedCategory={selectedManagerCategory}
               />
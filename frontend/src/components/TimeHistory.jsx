@@ -6,6 +6,9 @@ import { EditEntryModal } from './EditEntryModal';
 import { formatDate, formatTime, formatDurationShort, getTagColor } from '../utils/helpers';
 import { timeEntryAPI } from '../services/api';
 
+// Acima disso, entradas alteradas fora da primeira página recarregam o histórico do início
+const MAX_REFETCHED_ENTRIES = 20;
+
 export const TimeEntryItem = ({ entry, onEdit, onDelete }) => {
   const speedrunSnapshot = entry?.meta?.speedrun_snapshot || null;
   const speedrunDynamic = entry?.speedrun_dynamic || null;
@@ -88,8 +91,16 @@ export const TimeEntryItem = ({ entry, onEdit, onDelete }) => {
           </div>
         </div>
 
-        {!entry.is_running && (speedrunSnapshotStyle || speedrunDynamicStyle) && (
+        {!entry.is_running && (speedrunSnapshotStyle || speedrunDynamicStyle || entry.speedrun_snapshot_pending) && (
           <div className="space-y-1 text-xs">
+            {!speedrunSnapshotStyle && entry.speedrun_snapshot_pending && (
+              <div className="flex flex-wrap items-center gap-2">
+                <span className="inline-flex items-center rounded-full border px-2 py-0.5 bg-zinc-500/10 text-zinc-400 border-zinc-500/30">
+                  Na época: calculando...
+                </span>
+              </div>
+            )}
+
             {speedrunSnapshotStyle && (
               <div className="flex flex-wrap items-center gap-2">
                 <span className={`inline-flex items-center rounded-full border px-2 py-0.5 ${speedrunSnapshotStyle.className}`}>
@@ -158,38 +169,67 @@ export const TimeEntryItem = ({ entry, onEdit, onDelete }) => {
   );
 };
 
-export const TimeEntriesHistory = ({ refreshTrigger = 0, categories = [], selectedCategory = null }) => {
-  const [entries, setEntries] = useState([]);
+export const TimeEntriesHistory = ({ refreshTrigger = 0, entryEvent = null, categories = [], selectedCategory = null }) => {
   const [loading, setLoading] = useState(true);
   const [groupedEntries, setGroupedEntries] = useState({});
   const [editingEntry, setEditingEntry] = useState(null);
   const [showEditModal, setShowEditModal] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const requestSeqRef = useRef(0);
+  // Entradas carregadas e cursor mais recentes, lidos pelas respostas assíncronas
+  const entriesRef = useRef([]);
+  const nextCursorRef = useRef(null);
+  const handledTriggerRef = useRef(refreshTrigger);
+  const handledEventRef = useRef(entryEvent);
   const filterLabel = selectedCategory?.path || 'Todas as categorias';
   const cardClassName = 'overflow-hidden flex flex-col max-h-[78vh]';
 
+  const groupByDate = (list) => {
+    const grouped = {};
+    list.forEach((entry) => {
+      const date = formatDate(entry.start_at);
+      if (!grouped[date]) {
+        grouped[date] = [];
+      }
+      grouped[date].push(entry);
+    });
+    return grouped;
+  };
+
+  // Mesma ordem da API: início mais recente primeiro, id maior nos empates
+  const compareEntries = (a, b) => new Date(b.start_at) - new Date(a.start_at) || b.id - a.id;
+
+  const showEntries = (list, cursor) => {
+    entriesRef.current = list;
+    nextCursorRef.current = cursor;
+    setNextCursor(cursor);
+    setGroupedEntries(groupByDate(list));
+  };
+
+  const matchesFilter = (entry) => (
+    !selectedCategory?.path
+    || entry.category_name === selectedCategory.path
+    || entry.category_name?.startsWith(`${selectedCategory.path}/`)
+  );
+
+  const getParams = () => {
+    // Paginação por cursor: o custo de cada página não cresce com a profundidade do histórico
+    const params = { pagination: 'cursor' };
+    if (selectedCategory?.id) {
+      params.category = selectedCategory.id;
+      params.include_descendants = 1;
+    }
+    return params;
+  };
+
   const fetchEntries = async () => {
     const requestId = ++requestSeqRef.current;
     setLoading(true);
     try {
-      const params = selectedCategory?.id
-        ? { category: selectedCategory.id, include_descendants: 1 }
-        : {};
-      const response = await timeEntryAPI.getAll(params);
+      const response = await timeEntryAPI.getAll(getParams());
       if (requestId !== requestSeqRef.current) return;
-      const nextEntries = response.data.results || response.data;
-      setEntries(nextEntries);
-
-      const grouped = {};
-      nextEntries.forEach((entry) => {
-        const date = formatDate(entry.start_at);
-        if (!grouped[date]) {
-          grouped[date] = [];
-        }
-        grouped[date].push(entry);
-      });
-      if (requestId !== requestSeqRef.current) return;
-      setGroupedEntries(grouped);
+      showEntries(response.data.results || response.data, response.data.next_cursor || null);
     } catch (error) {
       if (requestId !== requestSeqRef.current) return;
       console.error('Erro ao carregar histórico:', error);
@@ -199,6 +239,98 @@ export const TimeEntriesHistory = ({ refreshTrigger = 0, categories = [], select
     }
   };
 
+  // Relê só a primeira página e troca o trecho que ela cobre, mantendo as páginas
+  // seguintes já carregadas pelo cursor (e a rolagem). Devolve os ids relidos.
+  const refreshFirstPage = async () => {
+    const requestId = requestSeqRef.current;
+    const response = await timeEntryAPI.getAll(getParams());
+    if (requestId !== requestSeqRef.current) return null;
+    const firstPage = response.data.results;
+    const firstIds = new Set(firstPage.map((entry) => entry.id));
+    const boundary = firstPage[firstPage.length - 1];
+    const current = entriesRef.current;
+    if (!response.data.next_cursor || !boundary) {
+      showEntries(firstPage, null);
+      return firstIds;
+    }
+    const rest = current.filter((entry) => !firstIds.has(entry.id) && compareEntries(boundary, entry) < 0);
+    const last = current[current.length - 1];
+    const loadedBeyond = last && compareEntries(boundary, last) < 0;
+    showEntries([...firstPage, ...rest], loadedBeyond ? nextCursorRef.current : response.data.next_cursor);
+    return firstIds;
+  };
+
+  // Entradas alteradas (aqui, em outra aba ou em outro cliente)
+  const applyEntryChange = async ({ action, ids = [] }) => {
+    if (action === 'deleted') {
+      const removed = new Set(ids);
+      showEntries(entriesRef.current.filter((entry) => !removed.has(entry.id)), nextCursorRef.current);
+      return;
+    }
+    try {
+      const loadedIds = new Set(entriesRef.current.map((entry) => entry.id));
+      const firstIds = await refreshFirstPage();
+      if (!firstIds) return;
+      // Entradas já carregadas além da primeira página são relidas uma a uma;
+      // edições em massa recarregam o histórico do início
+      const deepIds = ids.filter((id) => loadedIds.has(id) && !firstIds.has(id));
+      if (deepIds.length > MAX_REFETCHED_ENTRIES) {
+        fetchEntries();
+        return;
+      }
+      if (deepIds.length === 0) return;
+      const requestId = requestSeqRef.current;
+      const responses = await Promise.allSettled(deepIds.map((id) => timeEntryAPI.get(id)));
+      if (requestId !== requestSeqRef.current) return;
+      const fresh = new Map();
+      responses.forEach((response, index) => {
+        if (response.status === 'fulfilled') {
+          fresh.set(deepIds[index], matchesFilter(response.value.data) ? response.value.data : null);
+        } else if (response.reason?.response?.status === 404) {
+          fresh.set(deepIds[index], null);
+        }
+      });
+      const kept = entriesRef.current.filter((entry) => !fresh.has(entry.id));
+      // A última carregada marca o cursor: o que passou para depois dela volta com a próxima página
+      const last = entriesRef.current[entriesRef.current.length - 1];
+      const updated = [...fresh.values()].filter((entry) => (
+        entry && (!nextCursorRef.current || !last || compareEntries(entry, last) <= 0)
+      ));
+      showEntries([...kept, ...updated].sort(compareEntries), nextCursorRef.current);
+    } catch (error) {
+      console.error('Erro ao atualizar histórico:', error);
+    }
+  };
+
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    const requestId = requestSeqRef.current;
+    setLoadingMore(true);
+    try {
+      const response = await timeEntryAPI.getAll({ ...getParams(), cursor: nextCursor });
+      if (requestId !== requestSeqRef.current) return;
+      const loadedIds = new Set(entriesRef.current.map((entry) => entry.id));
+      const merged = [
+        ...entriesRef.current,
+        ...response.data.results.filter((entry) => !loadedIds.has(entry.id)),
+      ];
+      showEntries(merged, response.data.next_cursor || null);
+    } catch (error) {
+      if (requestId !== requestSeqRef.current) return;
+      console.error('Erro ao carregar mais histórico:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const handleScroll = (event) => {
+    const { scrollTop, scrollHeight, clientHeight } = event.currentTarget;
+    if (scrollHeight - scrollTop - clientHeight < 200) {
+      loadMore();
+    }
+  };
+
+  // Troca de filtro: recarrega do início
   useEffect(() => {
     const timeoutId = setTimeout(() => {
       fetchEntries();
@@ -208,7 +340,20 @@ export const TimeEntriesHistory = ({ refreshTrigger = 0, categories = [], select
       requestSeqRef.current += 1;
       clearTimeout(timeoutId);
     };
-  }, [refreshTrigger, selectedCategory?.id]);
+  }, [selectedCategory?.id]);
+
+  // Timer iniciado ou parado nesta aba: só o topo do histórico muda
+  useEffect(() => {
+    if (refreshTrigger === handledTriggerRef.current) return;
+    handledTriggerRef.current = refreshTrigger;
+    refreshFirstPage().catch((error) => console.error('Erro ao atualizar histórico:', error));
+  }, [refreshTrigger]);
+
+  useEffect(() => {
+    if (!entryEvent || entryEvent === handledEventRef.current) return;
+    handledEventRef.current = entryEvent;
+    applyEntryChange(entryEvent);
+  }, [entryEvent]);
 
   const handleEdit = (entry) => {
     setEditingEntry(entry);
@@ -216,14 +361,16 @@ export const TimeEntriesHistory = ({ refreshTrigger = 0, categories = [], select
   };
 
   const handleEditSuccess = () => {
-    fetchEntries();
+    if (editingEntry) {
+      applyEntryChange({ action: 'updated', ids: [editingEntry.id] });
+    }
   };
 
   const handleDelete = async (entry) => {
     if (window.confirm('Tem certeza que deseja excluir esta entrada?')) {
       try {
         await timeEntryAPI.delete(entry.id);
-        fetchEntries();
+        applyEntryChange({ action: 'deleted', ids: [entry.id] });
       } catch (error) {
         console.error('Erro ao excluir entrada:', error);
       }
@@ -255,7 +402,7 @@ export const TimeEntriesHistory = ({ refreshTrigger = 0, categories = [], select
         </p>
       </CardHeader>
 
-      <CardContent className="overflow-x-hidden overflow-y-auto">
+      <CardContent className="overflow-x-hidden overflow-y-auto" onScroll={handleScroll}>
         {Object.keys(groupedEntries).length === 0 ? (
           <div className="text-center py-8 text-zinc-400">
             <Clock size={48} className="mx-auto mb-4 opacity-50" />
@@ -302,6 +449,14 @@ export const TimeEntriesHistory = ({ refreshTrigger = 0, categories = [], select
                 </div>
               </div>
             ))}
+
+            {nextCursor && (
+              <div className="text-center">
+                <Button variant="ghost" size="sm" onClick={loadMore} disabled={loadingMore}>
+                  {loadingMore ? 'Carregando...' : 'Carregar mais'}
+                </Button>
+              </div>
+            )}
           </div>
         )}
       </CardContent>
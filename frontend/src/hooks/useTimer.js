@@ -1,32 +1,38 @@
 import { useState, useEffect, useCallback } from 'react';
-import { timeEntryAPI } from '../services/api';
+import { timeEntryAPI, EVENTS_URL } from '../services/api';
 
 export const useTimer = () => {
   const [currentEntry, setCurrentEntry] = useState(null);
   const [elapsedTime, setElapsedTime] = useState(0);
   const [isRunning, setIsRunning] = useState(false);
 
+  const [lastEntryEvent, setLastEntryEvent] = useState(null);
+
+  const applyRunningEntry = useCallback((entry) => {
+    if (entry) {
+      setCurrentEntry(entry);
+      setIsRunning(true);
+      
+      // Calcular tempo decorrido
+      const startTime = new Date(entry.start_at);
+      const now = new Date();
+      const elapsed = Math.floor((now - startTime) / 1000);
+      setElapsedTime(elapsed);
+    } else {
+      setCurrentEntry(null);
+      setIsRunning(false);
+      setElapsedTime(0);
+    }
+  }, []);
+
   const fetchRunningEntry = useCallback(async () => {
     try {
       const response = await timeEntryAPI.getRunning();
-      if (response.data) {
-        setCurrentEntry(response.data);
-        setIsRunning(true);
-        
-        // Calcular tempo decorrido
-        const startTime = new Date(response.data.start_at);
-        const now = new Date();
-        const elapsed = Math.floor((now - startTime) / 1000);
-        setElapsedTime(elapsed);
-      } else {
-        setCurrentEntry(null);
-        setIsRunning(false);
-        setElapsedTime(0);
-      }
+      applyRunningEntry(response.data);
     } catch (error) {
       console.error('Erro ao buscar timer ativo:', error);
     }
-  }, []);
+  }, [applyRunningEntry]);
 
   const startTimer = async (data) => {
     try {
@@ -74,10 +80,30 @@ export const useTimer = () => {
     };
   }, [isRunning, currentEntry]);
 
-  // Verificar timer ativo ao montar o componente
+  // Estado do timer por push (SSE): a conexão envia o estado atual e cada mudança,
+  // mantendo as abas sincronizadas sem polling. Sem o canal, consulta uma vez ao montar.
   useEffect(() => {
-    fetchRunningEntry();
-  }, [fetchRunningEntry]);
+    if (typeof EventSource === 'undefined') {
+      fetchRunningEntry();
+      return undefined;
+    }
+
+    const source = new EventSource(EVENTS_URL);
+    source.addEventListener('timer', (event) => {
+      applyRunningEntry(JSON.parse(event.data));
+    });
+    source.addEventListener('entry', (event) => {
+      setLastEntryEvent(JSON.parse(event.data));
+    });
+    source.onerror = () => {
+      // Servidor sem ASGI responde 501 e o navegador não reconecta
+      if (source.readyState === EventSource.CLOSED) {
+        fetchRunningEntry();
+      }
+    };
+
+    return () => source.close();
+  }, [applyRunningEntry, fetchRunningEntry]);
 
   return {
     currentEntry,
@@ -85,6 +111,7 @@ export const useTimer = () => {
     isRunning,
     startTimer,
     stopTimer,
+    lastEntryEvent,
     refreshTimer: fetchRunningEntry
   };
 };
\ No newline at end of file
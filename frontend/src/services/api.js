@@ -2,6 +2,9 @@ import axios from 'axios';
 
 const API_BASE_URL = 'http://localhost:8000/api';
 
+// Server-Sent Events do backend (timer e alterações de entradas)
+export const EVENTS_URL = `${API_BASE_URL}/events/`;
+
 const api = axios.create({
   baseURL: API_BASE_URL,
   headers: {
@@ -34,9 +37,11 @@ export const tagAPI = {
 
 export const timeEntryAPI = {
   getAll: (params) => api.get('/entries/', { params }),
+  get: (id) => api.get(`/entries/${id}/`),
   create: (data) => api.post('/entries/', data),
   update: (id, data) => api.put(`/entries/${id}/`, data),
   delete: (id) => api.delete(`/entries/${id}/`),
+  bulkCreate: (entries) => api.post('/entries/bulk/', { entries }),
   getRunning: () => api.get('/entries/running/'),
   startTimer: (data) => api.post('/entries/start_timer/', data),
   stopTimer: (data) => api.post('/entries/stop_timer/', data),
@@ -46,6 +51,16 @@ export const timeEntryAPI = {
     params, 
     responseType: 'blob' 
   }),
+  exportNDJSON: (params) => api.get('/entries/export_ndjson/', {
+    params,
+    responseType: 'blob'
+  }),
+};
+
+// Sincronização incremental: mudanças depois do cursor e envio de mutações em lote
+export const syncAPI = {
+  pull: (since, limit) => api.get('/sync/', { params: { since, limit } }),
+  push: (batchId, mutations) => api.post('/sync/', { batch_id: batchId, mutations }),
 };
 
 export default api;
\ No newline at end of file
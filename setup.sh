@@ -68,7 +68,7 @@ cd ..
 echo "✅ Configuração concluída!"
 echo ""
 echo "🚀 Para iniciar o projeto:"
-echo "1. Backend: cd backend && python manage.py runserver"
+echo "1. Backend: cd backend && python -m uvicorn timetracker.asgi:application --reload --port 8000"
 echo "2. Frontend: cd frontend && npm run dev"
 echo ""
 echo "🌐 URLs:"
@@ -133,7 +133,11 @@ def main():
         npm_cmd = ensure_frontend_setup(frontend_dir)
 
         print_step("Iniciando backend Django...")
-        backend_process = spawn_process([str(venv_python), "manage.py", "runserver"], cwd=backend_dir)
+        # Servidor ASGI: necessário para os eventos em tempo real (/api/events/)
+        backend_process = spawn_process(
+            [str(venv_python), "-m", "uvicorn", "timetracker.asgi:application", "--reload", "--port", "8000"],
+            cwd=backend_dir,
+        )
         processes.append(backend_process)
 
         print_step("Aguardando backend inicializar...")